@@ -2,7 +2,7 @@ from django.contrib import admin
 from import_export.admin import ImportExportModelAdmin
 from .models import (
     Professor, Curso, Aluno, Presenca, Pagamento, 
-    Matricula, MensagemPadrao, Doacao, PagamentoProfessor
+    Matricula, MensagemPadrao, Doacao, PagamentoProfessor, ResumoMensal, MensagemSaida
 )
 from .resources import AlunoResource, MatriculaResource
 
@@ -36,4 +36,12 @@ admin.site.register(Presenca)
 admin.site.register(Pagamento)
 admin.site.register(PagamentoProfessor)
 admin.site.register(MensagemPadrao)
-admin.site.register(Doacao)
\ No newline at end of file
+admin.site.register(Doacao)
+admin.site.register(ResumoMensal)
+
+@admin.register(MensagemSaida)
+class MensagemSaidaAdmin(admin.ModelAdmin):
+    list_display = ('campanha', 'aluno', 'telefone', 'status', 'tentativas', 'enviar_a_partir_de', 'enviada_em')
+    list_filter = ('status', 'campanha')
+    search_fields = ('telefone', 'aluno__user__first_name', 'aluno__user__username')
+    list_select_related = ('aluno__user',)
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class AcademiaConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'academia'
+
+    def ready(self):
+        # Liga os signals (resumo mensal etc.)
+        from . import signals  # noqa: F401
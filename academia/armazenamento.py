@@ -0,0 +1,175 @@
+import hashlib
+import io
+import os
+import tempfile
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# =======================================================
+# ARMAZENAMENTO DOS COMPROVANTES (ENDEREÇADO PELO CONTEÚDO)
+# O mesmo comprovante costuma subir duas vezes (o aluno em "Meus Pagamentos"
+# e a secretaria no lançamento manual). Aqui cada conteúdo é gravado UMA vez,
+# em cas/<sha256>, e o nome que o Django guarda no banco
+# (comprovantes/recibo.jpg) é um hardlink para ele.
+#
+# A contagem de referências é a do próprio sistema de arquivos (st_nlink):
+# apagar um comprovante (inclusive pelo django_cleanup) só remove aquele
+# nome; o conteúdo em cas/ sai quando não sobra nenhum nome apontando para ele.
+# Se o sistema de arquivos não aceitar hardlink, grava uma cópia normal.
+# =======================================================
+
+PASTA_CAS = 'cas'
+
+# Fotos de comprovante maiores que isso (px no maior lado) são reduzidas ao entrar
+LADO_MAXIMO = getattr(settings, 'COMPROVANTES_LADO_MAXIMO', 2000)
+QUALIDADE_JPEG = getattr(settings, 'COMPROVANTES_QUALIDADE_JPEG', 85)
+
+
+def sha256_dos_bytes(dados):
+    return hashlib.sha256(dados).hexdigest()
+
+
+def sha256_do_arquivo(caminho):
+    sha = hashlib.sha256()
+    with open(caminho, 'rb') as arquivo:
+        for bloco in iter(lambda: arquivo.read(64 * 1024), b''):
+            sha.update(bloco)
+    return sha.hexdigest()
+
+
+def comprimir(nome, dados):
+    # Reduz fotos grandes (JPEG/PNG/WebP) e tira o EXIF. Mantém o formato
+    # original (a extensão do nome continua valendo) e só troca se ficar menor.
+    # PDFs e outros arquivos passam como vieram.
+    try:
+        imagem = Image.open(io.BytesIO(dados))
+        formato = imagem.format
+        if formato not in ('JPEG', 'PNG', 'WEBP'):
+            return dados
+        imagem.load()
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+        return dados
+
+    imagem = ImageOps.exif_transpose(imagem)
+    imagem.thumbnail((LADO_MAXIMO, LADO_MAXIMO), Image.LANCZOS)
+
+    opcoes = {'optimize': True}
+    if formato == 'JPEG':
+        imagem = imagem.convert('RGB')
+        opcoes.update(quality=QUALIDADE_JPEG, progressive=True)
+    elif formato == 'WEBP':
+        opcoes['quality'] = QUALIDADE_JPEG
+
+    buffer = io.BytesIO()
+    imagem.save(buffer, formato, **opcoes)
+    comprimido = buffer.getvalue()
+    return comprimido if len(comprimido) < len(dados) else dados
+
+
+class ArmazenamentoPorConteudo(FileSystemStorage):
+
+    def caminho_cas(self, sha, nome):
+        extensao = os.path.splitext(nome)[1].lower()
+        return os.path.join(PASTA_CAS, sha[:2], sha + extensao)
+
+    def referencias(self, name):
+        # Quantos nomes (comprovantes) apontam para o mesmo conteúdo
+        caminho = self.path(name)
+        if not os.path.exists(caminho):
+            return 0
+        return max(os.stat(caminho).st_nlink - 1, 1)
+
+    def _gravar_cas(self, sha, nome, dados):
+        # Grava o conteúdo em cas/ (se ainda não existir) de forma atômica
+        destino = self.path(self.caminho_cas(sha, nome))
+        if os.path.exists(destino):
+            return destino
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        fd, temporario = tempfile.mkstemp(dir=os.path.dirname(destino))
+        try:
+            with os.fdopen(fd, 'wb') as arquivo:
+                arquivo.write(dados)
+            if self.file_permissions_mode is not None:
+                os.chmod(temporario, self.file_permissions_mode)
+            os.replace(temporario, destino)
+        except BaseException:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            raise
+        return destino
+
+    def _ligar(self, origem, name):
+        # Cria `name` como hardlink de `origem` (ou cópia, se não der).
+        # Devolve o nome usado (outro, se `name` já existir).
+        while True:
+            caminho = self.path(name)
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+            try:
+                os.link(origem, caminho)
+                return name
+            except FileExistsError:
+                name = self.get_available_name(name)
+            except OSError:
+                # Sistema de arquivos sem hardlink: grava uma cópia comum
+                with open(origem, 'rb') as arquivo:
+                    return super()._save(name, File(arquivo))
+
+    def _save(self, name, content):
+        content.seek(0)
+        dados = comprimir(name, content.read())
+        sha = sha256_dos_bytes(dados)
+        origem = self._gravar_cas(sha, name, dados)
+        return self._ligar(origem, name)
+
+    def delete(self, name):
+        caminho = self.path(name)
+        conteudo = None
+        if os.path.exists(caminho) and os.stat(caminho).st_nlink > 1:
+            conteudo = self.path(self.caminho_cas(sha256_do_arquivo(caminho), name))
+        super().delete(name)
+        # Último nome apontando para o conteúdo: libera o espaço em cas/
+        if conteudo and os.path.exists(conteudo) and os.stat(conteudo).st_nlink == 1:
+            os.remove(conteudo)
+
+    def incorporar(self, name, comprimir_imagem=False):
+        # Traz um arquivo antigo (gravado antes deste armazenamento) para o cas/.
+        # Devolve quantos bytes deixaram de ocupar espaço.
+        caminho = self.path(name)
+        if not os.path.exists(caminho):
+            return 0
+        tamanho_antes = os.path.getsize(caminho)
+        if os.stat(caminho).st_nlink > 1:
+            return 0  # já está no cas/
+
+        with open(caminho, 'rb') as arquivo:
+            dados = arquivo.read()
+        if comprimir_imagem:
+            dados = comprimir(name, dados)
+        sha = sha256_dos_bytes(dados)
+        ja_existia = os.path.exists(self.path(self.caminho_cas(sha, name)))
+        origem = self._gravar_cas(sha, name, dados)
+
+        # Troca o arquivo pelo hardlink sem deixar um instante sem arquivo
+        temporario = caminho + '.cas-tmp'
+        if os.path.exists(temporario):
+            os.remove(temporario)  # sobra de uma execução interrompida
+        try:
+            os.link(origem, temporario)
+        except OSError:
+            return 0
+        os.replace(temporario, caminho)
+
+        if ja_existia:
+            return tamanho_antes  # duplicado: o arquivo inteiro foi economizado
+        return tamanho_antes - len(dados)
+
+
+def armazenamento_comprovantes():
+    # Usado como storage= nos campos de comprovante (callable: a migração não
+    # depende de como o armazenamento está configurado)
+    return _armazenamento
+
+
+_armazenamento = ArmazenamentoPorConteudo()
@@ -0,0 +1,121 @@
+import bisect
+import threading
+from django.core.cache import cache
+
+from .busca import tokens, so_digitos
+
+# =======================================================
+# AUTOCOMPLETAR (ÍNDICE DE PREFIXOS EM MEMÓRIA)
+# Em vez de mandar todos os alunos como <option>, os campos de busca pedem
+# os N primeiros resultados a um índice em memória: uma lista ordenada de
+# (chave, id) onde cada chave é uma palavra do nome/usuário ou o telefone.
+# Achar um prefixo é uma busca binária (bisect) nessa lista.
+#
+# O índice é montado na primeira busca e descartado quando um Aluno é salvo
+# ou apagado (signals). A versão fica no cache do Django: com um cache
+# compartilhado (arquivo/memcached), todos os processos percebem a mudança.
+# =======================================================
+
+CHAVE_VERSAO = 'autocompletar:alunos:versao'
+LIMITE_PADRAO = 20
+
+
+class IndicePrefixos:
+    def __init__(self, entradas, rotulos):
+        # entradas: lista ORDENADA de (chave, id); rotulos: {id: (ordem, texto)}
+        # Guardamos chaves e ids em listas separadas (mais compacto que tuplas)
+        self.chaves = [chave for chave, _ in entradas]
+        self.ids = [aluno_id for _, aluno_id in entradas]
+        self.rotulos = rotulos
+
+    def _ids_com_prefixo(self, prefixo):
+        inicio = bisect.bisect_left(self.chaves, prefixo)
+        fim = bisect.bisect_left(self.chaves, prefixo + '\uffff')
+        return set(self.ids[inicio:fim])
+
+    def buscar(self, termo, limite=LIMITE_PADRAO):
+        # Todas as palavras digitadas precisam ser começo de alguma chave do aluno.
+        # Números com 4+ dígitos também casam com o final do telefone.
+        encontrados = None
+        for token in tokens(termo):
+            ids = self._ids_com_prefixo(token)
+            if token.isdigit() and len(token) >= 4:
+                ids |= self._ids_com_prefixo('#' + token[::-1])
+            encontrados = ids if encontrados is None else encontrados & ids
+            if not encontrados:
+                return []
+        if encontrados is None:
+            return []
+        ordenados = sorted(encontrados, key=lambda aluno_id: self.rotulos[aluno_id][0])
+        return [(aluno_id, self.rotulos[aluno_id][1]) for aluno_id in ordenados[:limite]]
+
+
+def rotulo_aluno(first_name, username, nome_responsavel):
+    # Mesmo texto do AlunoModelChoiceField: "João da Silva - Resp: Maria"
+    responsavel = f" - Resp: {nome_responsavel}" if nome_responsavel else ""
+    return f"{first_name or username}{responsavel}"
+
+
+def montar_indice():
+    from .models import Aluno
+
+    entradas, rotulos = [], {}
+    linhas = Aluno.objects.values_list(
+        'id', 'user__first_name', 'user__username', 'telefone', 'nome_responsavel'
+    ).iterator(chunk_size=2000)
+    for aluno_id, first_name, username, telefone, nome_responsavel in linhas:
+        chaves = set(tokens(first_name)) | set(tokens(username))
+        fone = so_digitos(telefone)
+        if fone:
+            chaves.add(fone)
+            # Telefone invertido com '#' na frente para achar pelo final
+            chaves.add('#' + fone[::-1])
+        entradas.extend((chave, aluno_id) for chave in chaves)
+        rotulos[aluno_id] = ((first_name or username or '').lower(), rotulo_aluno(first_name, username, nome_responsavel))
+
+    entradas.sort()
+    return IndicePrefixos(entradas, rotulos)
+
+
+_indice = None
+_versao_indice = None
+_trava = threading.Lock()
+
+
+def _versao_atual():
+    versao = cache.get(CHAVE_VERSAO)
+    if versao is None:
+        cache.add(CHAVE_VERSAO, 1, timeout=None)
+        versao = cache.get(CHAVE_VERSAO, 1)
+    return versao
+
+
+def obter_indice():
+    global _indice, _versao_indice
+    # Trabalha sempre com a referência local: um invalidar_indice() em outra
+    # thread pode zerar o global entre a montagem e o return
+    versao = _versao_atual()
+    indice = _indice
+    if indice is None or _versao_indice != versao:
+        with _trava:
+            indice = _indice
+            if indice is None or _versao_indice != versao:
+                indice = montar_indice()
+                _indice, _versao_indice = indice, versao
+    return indice
+
+
+def invalidar_indice():
+    global _indice
+    with _trava:
+        _indice = None
+    try:
+        cache.incr(CHAVE_VERSAO)
+    except ValueError:
+        # Chave ainda não existe (ou expirou): começa uma versão nova
+        cache.set(CHAVE_VERSAO, 2, timeout=None)
+
+
+def buscar_alunos(termo, limite=LIMITE_PADRAO):
+    # [(id, rótulo), ...] dos primeiros `limite` alunos que batem com o termo
+    return obter_indice().buscar(termo, limite)
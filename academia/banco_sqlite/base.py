@@ -0,0 +1,143 @@
+import re
+import threading
+from contextlib import contextmanager, nullcontext
+from django.conf import settings
+from django.db.backends.sqlite3 import base as sqlite
+
+# =======================================================
+# SQLITE AJUSTADO PARA PRODUÇÃO (ENGINE 'academia.banco_sqlite')
+# É o backend sqlite3 do Django com três mudanças:
+#   1. toda conexão nova liga os PRAGMAs de produção:
+#        journal_mode=WAL   -> quem lê não espera quem escreve (e vice-versa)
+#        synchronous=NORMAL -> seguro com WAL e bem mais rápido que FULL
+#        cache_size / mmap_size (SQLITE_CACHE_MB / SQLITE_MMAP_MB)
+#        busy_timeout       -> espera a vez em vez de dar "database is locked"
+#        foreign_keys=ON    (o próprio Django já liga)
+#   2. trava de escrita no processo (SQLITE_TRAVA_ESCRITA): o SQLite só aceita
+#      um escritor por vez, e as threads do mesmo processo disputando o
+#      arquivo ficam no sleep-e-tenta-de-novo do busy_timeout. Com a trava,
+#      elas entram numa fila (threading.Lock) e cada uma escreve quando a
+#      anterior termina. Leituras fora de transação não passam pela trava.
+#      A trava é pega no BEGIN de toda transação (atomic) e em cada INSERT/
+#      UPDATE/DELETE fora de transação, e solta no COMMIT/ROLLBACK;
+#   3. nada disso vale para o banco em memória dos testes.
+#
+# Use junto com OPTIONS['transaction_mode'] = 'IMMEDIATE' (config/settings.py):
+# a transação pega o direito de escrever já no BEGIN, e o busy_timeout vale
+# para ela. No modo padrão (DEFERRED), uma transação que lê e depois escreve
+# recebe "database is locked" na hora, sem esperar, se outro escreveu no meio.
+#
+# Para comparar com o sqlite3 padrão: python manage.py medir_sqlite
+# =======================================================
+
+CACHE_MB = getattr(settings, 'SQLITE_CACHE_MB', 64)
+MMAP_MB = getattr(settings, 'SQLITE_MMAP_MB', 256)
+# Quanto tempo esperar a vez de escrever antes de desistir (segundos)
+ESPERA = getattr(settings, 'SQLITE_ESPERA', 20)
+TRAVA_ESCRITA = getattr(settings, 'SQLITE_TRAVA_ESCRITA', True)
+
+_ESCRITA = re.compile(r'^\s*(INSERT|UPDATE|DELETE|REPLACE|CREATE|DROP|ALTER)\b', re.IGNORECASE)
+
+# Uma trava por arquivo de banco, compartilhada pelas conexões do processo
+_travas = {}
+_travas_guarda = threading.Lock()
+
+
+def _trava_do_banco(nome):
+    with _travas_guarda:
+        return _travas.setdefault(str(nome), threading.Lock())
+
+
+class CursorComTrava(sqlite.SQLiteCursorWrapper):
+    # Escrita fora de transação: segura a trava só durante o comando
+    banco = None
+
+    def execute(self, query, params=None):
+        with self.banco.trava_para(query):
+            return super().execute(query, params)
+
+    def executemany(self, query, param_list):
+        with self.banco.trava_para(query):
+            return super().executemany(query, param_list)
+
+
+class DatabaseWrapper(sqlite.DatabaseWrapper):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.usa_trava = TRAVA_ESCRITA and not self.is_in_memory_db()
+        self.trava = _trava_do_banco(self.settings_dict['NAME']) if self.usa_trava else None
+        self.com_trava = False
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        if not self.is_in_memory_db():
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute(f'PRAGMA mmap_size = {int(MMAP_MB * 1024 * 1024)}')
+        conn.execute('PRAGMA synchronous = NORMAL')
+        # Negativo = tamanho em KiB (e não em páginas)
+        conn.execute(f'PRAGMA cache_size = -{int(CACHE_MB * 1024)}')
+        conn.execute(f'PRAGMA busy_timeout = {int(ESPERA * 1000)}')
+        return conn
+
+    def create_cursor(self, name=None):
+        cursor = self.connection.cursor(factory=CursorComTrava)
+        cursor.banco = self
+        return cursor
+
+    # ---------------------------------------------------
+    # Trava de escrita
+    # ---------------------------------------------------
+
+    def trava_para(self, query):
+        # Só escrita fora de transação (dentro dela a trava já veio no BEGIN)
+        if self.usa_trava and not self.com_trava and _ESCRITA.match(query):
+            return self._trava_do_comando()
+        return nullcontext()
+
+    @contextmanager
+    def _trava_do_comando(self):
+        self._pegar_trava()
+        try:
+            yield
+        finally:
+            self._soltar_trava()
+
+    def _pegar_trava(self):
+        if not self.trava.acquire(timeout=ESPERA):
+            raise sqlite.Database.OperationalError('database is locked (trava de escrita do processo)')
+        self.com_trava = True
+
+    def _soltar_trava(self, forcar=False):
+        # Só solta quando a transação acabou de verdade (um COMMIT que falhou mantém a vez)
+        if self.com_trava and (forcar or self.connection is None or not self.connection.in_transaction):
+            self.com_trava = False
+            self.trava.release()
+
+    def _start_transaction_under_autocommit(self):
+        if not self.usa_trava or self.com_trava:
+            return super()._start_transaction_under_autocommit()
+        with self.wrap_database_errors:
+            self._pegar_trava()
+        try:
+            super()._start_transaction_under_autocommit()
+        except BaseException:
+            self._soltar_trava()
+            raise
+
+    def _commit(self):
+        try:
+            return super()._commit()
+        finally:
+            self._soltar_trava()
+
+    def _rollback(self):
+        try:
+            return super()._rollback()
+        finally:
+            self._soltar_trava()
+
+    def _close(self):
+        try:
+            return super()._close()
+        finally:
+            self._soltar_trava(forcar=True)
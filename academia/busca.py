@@ -0,0 +1,207 @@
+import difflib
+from django.db import connection, OperationalError
+from django.db.models import F, Q, FloatField, Value, Case, When, ExpressionWrapper
+from django.db.models.expressions import RawSQL
+from unidecode import unidecode
+
+# =======================================================
+# BUSCA DE ALUNOS
+# O antigo busca_normalizada__contains vira LIKE '%termo%', que nenhum índice
+# B-tree consegue usar. Aqui cada banco usa o índice certo:
+#   - PostgreSQL: índice GIN com pg_trgm (LIKE indexado + similaridade p/ erros de digitação)
+#   - SQLite: tabela FTS5 "sombra" (academia_aluno_busca), atualizada no Aluno.save()
+#   - Outros: volta para o LIKE antigo
+# Todos aceitam vários termos (todos precisam bater), final de telefone e
+# devolvem o queryset anotado com `relevancia` (maior = mais relevante).
+# =======================================================
+
+TABELA_FTS = 'academia_aluno_busca'
+TABELA_VOCAB = 'academia_aluno_busca_vocab'
+
+# Similaridade mínima (0 a 1) para aceitar um nome digitado com erro
+SIMILARIDADE_MINIMA = 0.4
+# Quantos dígitos no mínimo para tratar o termo como final de telefone
+DIGITOS_TELEFONE = 4
+
+_fts_existe = {}
+
+
+def normalizar(texto):
+    # Mesma limpeza que o Aluno.save() faz no busca_normalizada
+    texto = (texto or '').strip()
+    # O Excel adora colocar o "espaço fantasma" (NBSP) \xa0
+    texto = texto.replace('\xa0', ' ').replace('%', '')
+    return unidecode(texto).lower()
+
+
+def tokens(termo):
+    # Quebra o termo em palavras e tira as aspas (que têm significado no FTS5)
+    return [t.replace('"', '') for t in normalizar(termo).split() if t.replace('"', '')]
+
+
+def so_digitos(texto):
+    return ''.join(filter(str.isdigit, str(texto or '')))
+
+
+def fts_disponivel():
+    if connection.vendor != 'sqlite':
+        return False
+    if connection.alias not in _fts_existe:
+        _fts_existe[connection.alias] = TABELA_FTS in connection.introspection.table_names()
+    return _fts_existe[connection.alias]
+
+
+# -------------------------------------------------------
+# Manutenção do índice FTS5 (só SQLite)
+# -------------------------------------------------------
+
+def _linha_indice(aluno):
+    return [aluno.pk, aluno.busca_normalizada or '', so_digitos(aluno.telefone)[::-1]]
+
+
+def indexar_aluno(aluno):
+    if not fts_disponivel():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABELA_FTS} WHERE rowid = %s", [aluno.pk])
+        cursor.execute(f"INSERT INTO {TABELA_FTS}(rowid, texto, fone_rev) VALUES (%s, %s, %s)", _linha_indice(aluno))
+
+
+def indexar_alunos(alunos):
+    # Versão em lote do indexar_aluno (a importação usa bulk_create, que não chama o save())
+    if not fts_disponivel():
+        return
+    linhas = [_linha_indice(aluno) for aluno in alunos if aluno.pk]
+    if not linhas:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {TABELA_FTS} WHERE rowid = %s", [[linha[0]] for linha in linhas])
+        cursor.executemany(f"INSERT INTO {TABELA_FTS}(rowid, texto, fone_rev) VALUES (%s, %s, %s)", linhas)
+
+
+def remover_do_indice(aluno_id):
+    if not fts_disponivel():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABELA_FTS} WHERE rowid = %s", [aluno_id])
+
+
+def reconstruir_indice(cursor, alunos):
+    # `alunos` é um iterável de (id, busca_normalizada, telefone); usado pelo gerador de massa (escala.py)
+    cursor.execute(f"DELETE FROM {TABELA_FTS}")
+    cursor.executemany(
+        f"INSERT INTO {TABELA_FTS}(rowid, texto, fone_rev) VALUES (%s, %s, %s)",
+        [(pk, texto or '', so_digitos(fone)[::-1]) for pk, texto, fone in alunos],
+    )
+
+
+# -------------------------------------------------------
+# SQLite (FTS5)
+# -------------------------------------------------------
+
+def _termos_parecidos(token):
+    # Tolerância a erro de digitação: procura no vocabulário do índice palavras
+    # com o mesmo começo e escolhe as mais parecidas
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT term FROM {TABELA_VOCAB} WHERE term >= %s AND term < %s",
+            [token[:2], token[:2] + '\uffff'],
+        )
+        vocabulario = [linha[0] for linha in cursor.fetchall()]
+    return difflib.get_close_matches(token, vocabulario, n=5, cutoff=0.75)
+
+
+def _existe_no_fts(expressao):
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT 1 FROM {TABELA_FTS} WHERE {TABELA_FTS} MATCH %s LIMIT 1", [expressao])
+        return cursor.fetchone() is not None
+
+
+def _expressao_fts(lista_tokens):
+    partes = []
+    for token in lista_tokens:
+        opcoes = [f'"{token}"*']
+        if token.isdigit() and len(token) >= DIGITOS_TELEFONE:
+            # Final de telefone: o telefone fica invertido na coluna fone_rev
+            opcoes.append(f'fone_rev : "{token[::-1]}"*')
+        elif len(token) >= 4 and not _existe_no_fts(opcoes[0]):
+            opcoes += [f'"{parecido}"' for parecido in _termos_parecidos(token)]
+        partes.append('(' + ' OR '.join(opcoes) + ')')
+    return ' AND '.join(partes)
+
+
+def _buscar_sqlite(queryset, lista_tokens):
+    expressao = _expressao_fts(lista_tokens)
+    tabela_aluno = queryset.model._meta.db_table
+    # bm25() é negativo (mais negativo = melhor), então invertemos o sinal
+    relevancia = RawSQL(
+        f"(SELECT -bm25({TABELA_FTS}) FROM {TABELA_FTS} "
+        f"WHERE {TABELA_FTS} MATCH %s AND {TABELA_FTS}.rowid = {tabela_aluno}.id)",
+        [expressao],
+        output_field=FloatField(),
+    )
+    return queryset.filter(
+        id__in=RawSQL(f"SELECT rowid FROM {TABELA_FTS} WHERE {TABELA_FTS} MATCH %s", [expressao])
+    ).annotate(relevancia=relevancia)
+
+
+# -------------------------------------------------------
+# PostgreSQL (pg_trgm)
+# -------------------------------------------------------
+
+def configurar_conexao(conexao):
+    # Limiar do operador %> (word_similarity) na conexão nova (signals.py)
+    with conexao.cursor() as cursor:
+        cursor.execute("SELECT set_config('pg_trgm.word_similarity_threshold', %s, false)", [str(SIMILARIDADE_MINIMA)])
+
+
+def _buscar_postgres(queryset, lista_tokens):
+    from django.contrib.postgres.lookups import TrigramWordSimilar
+    from django.contrib.postgres.search import TrigramWordSimilarity
+
+    pontuacoes = []
+    for token in lista_tokens:
+        similaridade = TrigramWordSimilarity(token, 'busca_normalizada')
+        if token.isdigit() and len(token) >= DIGITOS_TELEFONE:
+            # Números não têm tolerância a erro (telefone errado é outro telefone);
+            # quem termina com esses dígitos sobe no ranking
+            queryset = queryset.filter(busca_normalizada__contains=token)
+            pontuacoes.append(Case(When(telefone__endswith=token, then=Value(1.0)), default=Value(0.0), output_field=FloatField()))
+        else:
+            # Os dois lados do OR são operadores do índice GIN (LIKE e %>, que
+            # pega nomes digitados com erro): o Postgres junta as duas buscas no
+            # índice (BitmapOr) em vez de calcular a similaridade linha a linha.
+            # O limiar do %> é o SIMILARIDADE_MINIMA (configurar_conexao).
+            queryset = queryset.filter(
+                Q(busca_normalizada__contains=token) | Q(TrigramWordSimilar(F('busca_normalizada'), Value(token)))
+            )
+        pontuacoes.append(similaridade)
+
+    relevancia = pontuacoes[0]
+    for pontuacao in pontuacoes[1:]:
+        relevancia = relevancia + pontuacao
+    return queryset.annotate(relevancia=ExpressionWrapper(relevancia, output_field=FloatField()))
+
+
+# -------------------------------------------------------
+# Entrada principal
+# -------------------------------------------------------
+
+def buscar_alunos(queryset, termo):
+    lista_tokens = tokens(termo)
+    if not lista_tokens:
+        return queryset.annotate(relevancia=Value(0.0, output_field=FloatField()))
+
+    if connection.vendor == 'postgresql':
+        return _buscar_postgres(queryset, lista_tokens)
+
+    if fts_disponivel():
+        try:
+            return _buscar_sqlite(queryset, lista_tokens)
+        except OperationalError:
+            # Expressão que o FTS5 não entendeu: cai no LIKE simples
+            pass
+
+    for token in lista_tokens:
+        queryset = queryset.filter(busca_normalizada__contains=token)
+    return queryset.annotate(relevancia=Value(0.0, output_field=FloatField()))
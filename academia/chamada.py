@@ -0,0 +1,51 @@
+from django.db import transaction
+
+from .models import Matricula, Presenca
+from . import painel_professor
+
+# =======================================================
+# CHAMADA EM LOTE
+# A chamada inteira de uma turma (curso + data) é gravada de uma vez: uma
+# consulta para validar as matrículas e um INSERT ... ON CONFLICT DO UPDATE
+# (upsert) apoiado na restrição única (matricula, data_aula) da Presenca.
+# O bulk_create não dispara signals: o painel do professor é invalidado aqui.
+# =======================================================
+
+
+def registrar_chamada(curso, data_aula, marcacoes):
+    # `marcacoes` é {matricula_id: True/False}. Matrículas que não são desse
+    # curso (ou estão inativas) são ignoradas. Devolve quantas foram gravadas.
+    validas = set(
+        Matricula.objects.filter(
+            curso=curso, ativo=True, id__in=list(marcacoes)
+        ).values_list('id', flat=True)
+    )
+    presencas = [
+        Presenca(matricula_id=matricula_id, data_aula=data_aula, presente=presente)
+        for matricula_id, presente in marcacoes.items()
+        if matricula_id in validas
+    ]
+    if not presencas:
+        return 0
+
+    with transaction.atomic():
+        Presenca.objects.bulk_create(
+            presencas,
+            update_conflicts=True,
+            unique_fields=['matricula', 'data_aula'],
+            update_fields=['presente'],
+        )
+    painel_professor.invalidar_professor(curso.professor_id)
+    return len(presencas)
+
+
+def marcar_uma(matricula, data_aula, presente):
+    # Mesmo upsert para os botões de uma matrícula só (sem corrida entre
+    # professor e secretaria clicando ao mesmo tempo)
+    Presenca.objects.bulk_create(
+        [Presenca(matricula=matricula, data_aula=data_aula, presente=presente)],
+        update_conflicts=True,
+        unique_fields=['matricula', 'data_aula'],
+        update_fields=['presente'],
+    )
+    painel_professor.invalidar_curso(matricula.curso_id)
@@ -0,0 +1,138 @@
+from django.db.models import Exists, OuterRef, Prefetch, Q
+
+from .models import Aluno, Matricula, Pagamento
+from .periodo import Periodo
+
+# =======================================================
+# INADIMPLÊNCIA
+# O "quem não pagou" é um anti-join (NOT EXISTS) feito pelo banco, então a
+# lista inteira sai num número fixo de consultas, não importa quantos alunos.
+# =======================================================
+
+# Quantos meses para trás olhamos para dizer "deve X meses"
+MESES_HISTORICO = 12
+
+
+def _mes_str(mes):
+    # Pagamento.mes é guardado como texto com zero à esquerda ('01'..'12')
+    return str(mes).zfill(2)
+
+
+def _meses_para_tras(ano, mes, qtd):
+    # [(ano, mes), ...] começando no mês informado e voltando `qtd` meses
+    meses = []
+    for _ in range(qtd):
+        meses.append((ano, mes))
+        ano, mes = (ano - 1, 12) if mes == 1 else (ano, mes - 1)
+    return meses
+
+
+def _mes_mais_antigo(ano, mes, qtd):
+    # (ano, mes) de `qtd - 1` meses antes do mês informado (o fim da janela)
+    ano_antigo, indice = divmod(ano * 12 + mes - 1 - (qtd - 1), 12)
+    return ano_antigo, indice + 1
+
+
+def _pagamentos_entre(inicio, fim):
+    # Q dos pagamentos com (ano, mes) dentro de [inicio, fim]. O mês é texto com
+    # zero à esquerda, então a comparação de texto segue a ordem dos meses.
+    (ano_ini, mes_ini), (ano_fim, mes_fim) = inicio, fim
+    if ano_ini == ano_fim:
+        return Q(ano=ano_ini, mes__gte=_mes_str(mes_ini), mes__lte=_mes_str(mes_fim))
+    return (
+        Q(ano=ano_ini, mes__gte=_mes_str(mes_ini))
+        | Q(ano__gt=ano_ini, ano__lt=ano_fim)
+        | Q(ano=ano_fim, mes__lte=_mes_str(mes_fim))
+    )
+
+
+def alunos_inadimplentes(ano, mes, meses_atraso=1, excluir_bolsistas=True, somente_com_horario=True):
+    # QuerySet de Aluno sem pagamento confirmado nos últimos `meses_atraso` meses
+    # (contando o mês informado). Serve direto para .count() no dashboard.
+    matriculas_ativas = Matricula.objects.filter(aluno=OuterRef('pk'), ativo=True)
+    if somente_com_horario:
+        # Só quem já tem dia de aula definido entra na cobrança
+        matriculas_ativas = matriculas_ativas.exclude(dia_semana__isnull=True).exclude(dia_semana='')
+
+    alunos = Aluno.objects.filter(Exists(matriculas_ativas))
+
+    # Um NOT EXISTS só para a janela inteira: nenhum pagamento confirmado em
+    # nenhum dos meses (o tamanho da consulta não cresce com o atraso)
+    meses_atraso = max(meses_atraso, 1)
+    ano_antigo, mes_antigo = _mes_mais_antigo(ano, mes, meses_atraso)
+    pagou = Pagamento.objects.filter(
+        _pagamentos_entre((ano_antigo, mes_antigo), (ano, mes)), aluno=OuterRef('pk'), confirmado=True
+    )
+    alunos = alunos.filter(~Exists(pagou))
+
+    if meses_atraso > 1:
+        # Quem entrou depois do mês mais antigo da janela não pode dever todos esses meses
+        alunos = alunos.filter(data_matricula__lt=Periodo(ano_antigo, mes_antigo).fim)
+
+    if excluir_bolsistas:
+        alunos = alunos.filter(eh_bolsista=False)
+
+    return alunos
+
+
+def _contar_meses_em_atraso(meses, pagos, data_matricula):
+    # Meses seguidos sem pagamento, do mês atual para trás, parando na data de matrícula
+    total = 0
+    for ano_ref, mes_ref in meses:
+        if data_matricula and Periodo(ano_ref, mes_ref).fim <= data_matricula:
+            break
+        if (ano_ref, mes_ref) in pagos:
+            break
+        total += 1
+    return total
+
+
+def lista_inadimplentes(ano, mes, meses_atraso=1, excluir_bolsistas=True, somente_com_horario=True):
+    # Monta as linhas da Central de Cobrança em 3 consultas:
+    # alunos (+ usuário), matrículas ativas (+ curso) e meses pagos no histórico.
+    matriculas_prefetch = Prefetch(
+        'matricula_set',
+        queryset=Matricula.objects.filter(ativo=True).select_related('curso').only('aluno', 'curso', 'curso__nome'),
+        to_attr='matriculas_ativas',
+    )
+    alunos = list(
+        alunos_inadimplentes(ano, mes, meses_atraso, excluir_bolsistas, somente_com_horario)
+        .select_related('user')
+        .prefetch_related(matriculas_prefetch)
+        .order_by('user__first_name', 'user__username')
+    )
+    if not alunos:
+        return []
+
+    meses = _meses_para_tras(ano, mes, MESES_HISTORICO)
+    ano_mais_antigo = meses[-1][0]
+    pagos_por_aluno = {}
+    pagamentos = Pagamento.objects.filter(
+        aluno_id__in=[a.id for a in alunos], confirmado=True, ano__gte=ano_mais_antigo, ano__lte=ano
+    ).values_list('aluno_id', 'ano', 'mes')
+    for aluno_id, ano_pg, mes_pg in pagamentos:
+        pagos_por_aluno.setdefault(aluno_id, set()).add((ano_pg, int(mes_pg)))
+
+    lista = []
+    for aluno in alunos:
+        # 1. Prepara telefone
+        fone_limpo = ''.join(filter(str.isdigit, str(aluno.telefone or "")))
+
+        # 2. Nome do Aluno ([ALUNO]) e de Tratamento ([NOME]: responsável, se tiver)
+        nome_real_aluno = aluno.user.first_name or aluno.user.username
+        nome_tratamento = aluno.nome_responsavel or nome_real_aluno
+
+        # 3. Cursos ativos juntos com vírgula ([CURSO])
+        nome_cursos = ", ".join(m.curso.nome for m in aluno.matriculas_ativas)
+
+        lista.append({
+            'id': aluno.id,
+            'nome': nome_real_aluno,
+            'nome_tratamento': nome_tratamento,
+            'nome_aluno_msg': nome_real_aluno,
+            'nome_cursos': nome_cursos,
+            'telefone': aluno.telefone,
+            'fone_link': f"55{fone_limpo}" if fone_limpo else "",
+            'meses_em_atraso': _contar_meses_em_atraso(meses, pagos_por_aluno.get(aluno.id, set()), aluno.data_matricula),
+        })
+    return lista
@@ -0,0 +1,126 @@
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+from django.db import connections
+
+# =======================================================
+# MEDIÇÃO DE CONSULTAS SQL
+# O ColetorConsultas registra todas as consultas feitas dentro do bloco
+# (em todos os bancos configurados), com o tempo de cada uma:
+#
+#   with ColetorConsultas() as coletor:
+#       ...
+#   coletor.total, coletor.tempo_total, coletor.repetidas(), coletor.mais_lentas()
+#
+# Funciona com DEBUG=False (usa connection.execute_wrapper, não o
+# connection.queries). É o mesmo coletor do middleware (middleware.py) e dos
+# testes de orçamento (tests.py).
+#
+# "Repetidas" agrupa as consultas pela impressão digital (o SQL sem os
+# valores): a mesma consulta feita 30 vezes numa página é o sinal do N+1.
+# =======================================================
+
+# Quantas consultas mais lentas guardar no resumo
+QUANTIDADE_MAIS_LENTAS = 3
+# Tamanho máximo do SQL que vai para o log
+TAMANHO_SQL_LOG = 300
+
+_ESPACOS = re.compile(r'\s+')
+_TEXTOS = re.compile(r"'(?:[^']|'')*'")
+_NUMEROS = re.compile(r'\b\d+(?:\.\d+)?\b')
+_LISTAS_IN = re.compile(r'\bIN \((?:[^()]*)\)', re.IGNORECASE)
+
+
+def impressao_digital(sql):
+    # O SQL sem os valores: "... WHERE id = 3" e "... WHERE id = 7" são a mesma consulta
+    sql = _ESPACOS.sub(' ', sql).strip()
+    sql = _TEXTOS.sub('?', sql)
+    sql = _NUMEROS.sub('?', sql)
+    return _LISTAS_IN.sub('IN (...)', sql)
+
+
+class Consulta:
+    __slots__ = ('sql', 'duracao', 'banco', 'inicio')
+
+    def __init__(self, sql, duracao, banco, inicio=None):
+        self.sql = sql
+        self.duracao = duracao  # segundos
+        self.banco = banco
+        self.inicio = inicio    # time.perf_counter() no começo (linha do tempo do perfilador)
+
+
+class ColetorConsultas:
+    def __init__(self, bancos=None):
+        # bancos: aliases a observar (padrão: todos os do settings.DATABASES)
+        self.bancos = bancos
+        self.consultas = []
+        self._pilha = None
+
+    def __enter__(self):
+        self._pilha = ExitStack()
+        for conexao in connections.all():
+            if self.bancos is None or conexao.alias in self.bancos:
+                self._pilha.enter_context(conexao.execute_wrapper(self._registrar))
+        return self
+
+    def __exit__(self, *excecao):
+        self._pilha.close()
+        return False
+
+    def _registrar(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.consultas.append(Consulta(sql, time.perf_counter() - inicio, context['connection'].alias, inicio))
+
+    @property
+    def total(self):
+        return len(self.consultas)
+
+    @property
+    def tempo_total(self):
+        return sum(c.duracao for c in self.consultas)
+
+    def repetidas(self):
+        # {impressão digital: vezes} das consultas feitas mais de uma vez
+        contagem = Counter(impressao_digital(c.sql) for c in self.consultas)
+        return {sql: vezes for sql, vezes in contagem.most_common() if vezes > 1}
+
+    def mais_lentas(self, quantidade=QUANTIDADE_MAIS_LENTAS):
+        return sorted(self.consultas, key=lambda c: c.duracao, reverse=True)[:quantidade]
+
+    def resumo(self):
+        # Dicionário pronto para o log (JSON)
+        return {
+            'consultas': self.total,
+            'tempo_ms': round(self.tempo_total * 1000, 2),
+            'repetidas': [
+                {'sql': sql[:TAMANHO_SQL_LOG], 'vezes': vezes}
+                for sql, vezes in list(self.repetidas().items())[:QUANTIDADE_MAIS_LENTAS]
+            ],
+            'mais_lentas': [
+                {'sql': c.sql[:TAMANHO_SQL_LOG], 'ms': round(c.duracao * 1000, 2), 'banco': c.banco}
+                for c in self.mais_lentas()
+            ],
+        }
+
+
+# -------------------------------------------------------
+# Orçamento de consultas por view
+# -------------------------------------------------------
+
+def orcamento_consultas(maximo, como='staff'):
+    # Declara quantas consultas a view pode fazer. O middleware avisa no log
+    # quando ela passa disso e os testes (tests.py) falham.
+    # `como` diz com que usuário o teste abre a página ('staff' ou 'professor').
+    def decorador(view):
+        view.orcamento_consultas = maximo
+        view.orcamento_consultas_como = como
+        return view
+    return decorador
+
+
+def orcamento_da_view(view):
+    return getattr(view, 'orcamento_consultas', None)
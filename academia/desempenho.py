@@ -0,0 +1,169 @@
+import statistics
+import time
+import tracemalloc
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import Count, Q
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from .consultas import ColetorConsultas
+from .models import Aluno, Matricula, Pagamento, Presenca, Professor
+
+# =======================================================
+# MEDIÇÃO DE DESEMPENHO DAS TELAS (python manage.py medir_desempenho)
+# Abre as telas mais pesadas pelo Client de teste do Django, na base atual
+# (normalmente gerada com popular_escala), e mede para cada uma:
+#   - tempo (mediana de várias repetições, depois de uma de aquecimento);
+#   - quantidade de consultas SQL;
+#   - pico de memória do Python (tracemalloc, numa execução separada,
+#     porque o tracemalloc deixa a requisição mais lenta).
+# O resultado vai para um JSON e é comparado com a base de referência
+# guardada: passou da tolerância, é regressão.
+# =======================================================
+
+USUARIO_STAFF = 'desempenho.staff'
+# Diferenças que nunca contam como regressão (ruído em telas rápidas)
+FOLGA_MS = 5
+FOLGA_KB = 64
+
+
+class Cenario:
+    def __init__(self, nome, url, como=None, antes=None):
+        self.nome = nome
+        self.url = url        # callable () -> caminho (as URLs dependem do banco)
+        self.como = como      # 'staff', 'professor' ou None (anônimo)
+        self.antes = antes    # chamado antes de cada requisição (ex.: esvaziar o cache)
+
+
+def _invalidar_home():
+    from website.cache import nova_versao
+    from website.models import Noticia
+    nova_versao(Noticia)
+
+
+CENARIOS = [
+    Cenario('dashboard_adm', lambda: reverse('dashboard_adm'), 'staff'),
+    Cenario('area_cobranca', lambda: reverse('area_cobranca'), 'staff'),
+    Cenario('listar_alunos', lambda: reverse('listar_alunos'), 'staff'),
+    Cenario('listar_alunos_busca_nome', lambda: reverse('listar_alunos') + '?q=ana+silva', 'staff'),
+    Cenario('listar_alunos_busca_telefone', lambda: reverse('listar_alunos') + '?q=1234', 'staff'),
+    Cenario('relatorio_financeiro', lambda: reverse('relatorio_financeiro'), 'staff'),
+    # ?simular=1: calcula a folha sem gravar (a medição não pode mudar a base)
+    Cenario('gerar_folha', lambda: reverse('gerar_folha') + '?simular=1', 'staff'),
+    Cenario('dashboard_professor', lambda: reverse('dashboard_professor'), 'professor'),
+    Cenario('website_index', lambda: reverse('index_site')),
+    Cenario('website_index_sem_cache', lambda: reverse('index_site'), antes=_invalidar_home),
+]
+
+
+def volume_da_base():
+    # Para saber se duas medições são comparáveis
+    return {
+        'alunos': Aluno.objects.count(),
+        'matriculas': Matricula.objects.count(),
+        'presencas': Presenca.objects.count(),
+        'pagamentos': Pagamento.objects.count(),
+    }
+
+
+def _usuarios():
+    staff, criado = User.objects.get_or_create(username=USUARIO_STAFF, defaults={'is_staff': True, 'first_name': 'Desempenho'})
+    if criado:
+        staff.set_unusable_password()
+        staff.save(update_fields=['password'])
+    # O professor com mais alunos ativos (o pior caso do painel)
+    professor = (
+        Professor.objects.annotate(ativos=Count('curso__matricula', filter=Q(curso__matricula__ativo=True)))
+        .select_related('user').order_by('-ativos', 'id').first()
+    )
+    return {'staff': staff, 'professor': professor.user if professor else None}
+
+
+def _requisitar(cliente, cenario, url):
+    if cenario.antes:
+        cenario.antes()
+    # secure=True: em produção (DEBUG=False) o SECURE_SSL_REDIRECT responderia 301
+    return cliente.get(url, secure=True)
+
+
+def medir_cenario(cenario, usuarios, repeticoes=5):
+    cliente = Client()
+    if cenario.como:
+        if usuarios.get(cenario.como) is None:
+            return {'erro': f"sem usuário '{cenario.como}' na base"}
+        cliente.force_login(usuarios[cenario.como])
+    url = cenario.url()
+
+    resposta = _requisitar(cliente, cenario, url)  # aquecimento (templates, caches de processo)
+    if resposta.status_code != 200:
+        return {'erro': f'status {resposta.status_code}'}
+
+    tempos = []
+    for _ in range(repeticoes):
+        with ColetorConsultas() as coletor:
+            inicio = time.perf_counter()
+            _requisitar(cliente, cenario, url)
+            tempos.append(time.perf_counter() - inicio)
+
+    tracemalloc.start()
+    try:
+        _requisitar(cliente, cenario, url)
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'tempo_ms': round(statistics.median(tempos) * 1000, 1),
+        'tempo_min_ms': round(min(tempos) * 1000, 1),
+        'consultas': coletor.total,
+        'tempo_sql_ms': round(coletor.tempo_total * 1000, 1),
+        'memoria_kb': round(pico / 1024),
+    }
+
+
+def medir(cenarios=None, repeticoes=5, saida=None):
+    saida = saida or (lambda texto: None)
+    usuarios = _usuarios()
+    resultado = {
+        'gerado_em': timezone.now().isoformat(timespec='seconds'),
+        'banco': connection.vendor,
+        'debug': settings.DEBUG,
+        'repeticoes': repeticoes,
+        'volume': volume_da_base(),
+        'telas': {},
+    }
+    for cenario in cenarios or CENARIOS:
+        medida = medir_cenario(cenario, usuarios, repeticoes)
+        resultado['telas'][cenario.nome] = medida
+        if 'erro' in medida:
+            saida(f"{cenario.nome}: ERRO ({medida['erro']})")
+        else:
+            saida(
+                f"{cenario.nome}: {medida['tempo_ms']} ms, {medida['consultas']} consultas, "
+                f"{medida['memoria_kb']} KB"
+            )
+    return resultado
+
+
+def comparar(atual, base, tolerancia=0.2):
+    # Lista de regressões (texto) de `atual` em relação à `base`.
+    # Tempo e memória podem crescer até a tolerância; consultas não podem crescer.
+    regressoes = []
+    for nome, medida in atual['telas'].items():
+        referencia = base.get('telas', {}).get(nome)
+        if not referencia or 'erro' in referencia:
+            continue
+        if 'erro' in medida:
+            regressoes.append(f"{nome}: {medida['erro']}")
+            continue
+        limite_tempo = referencia['tempo_ms'] * (1 + tolerancia) + FOLGA_MS
+        if medida['tempo_ms'] > limite_tempo:
+            regressoes.append(f"{nome}: tempo {medida['tempo_ms']} ms (base {referencia['tempo_ms']} ms)")
+        if medida['consultas'] > referencia['consultas']:
+            regressoes.append(f"{nome}: {medida['consultas']} consultas (base {referencia['consultas']})")
+        if medida['memoria_kb'] > referencia['memoria_kb'] * (1 + tolerancia) + FOLGA_KB:
+            regressoes.append(f"{nome}: memória {medida['memoria_kb']} KB (base {referencia['memoria_kb']} KB)")
+    return regressoes
@@ -0,0 +1,361 @@
+import datetime
+import random
+from decimal import Decimal
+from itertools import islice
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import (
+    Aluno, Curso, Despesa, Doacao, Matricula, PagamentoProfessor, Pagamento, Presenca, Professor,
+)
+from .periodo import Periodo
+from . import autocompletar, busca, folha, painel_professor, papel, resumo
+
+# =======================================================
+# BASE SINTÉTICA EM ESCALA (python manage.py popular_escala)
+# Gera uma base com o tamanho de produção (ex.: 20 mil alunos e alguns
+# milhões de chamadas) para medir as telas antes de subir uma mudança.
+# Tudo sai de um random.Random(semente): a mesma semente e a mesma data final
+# geram sempre a mesma base.
+#
+# As tabelas grandes entram em lote: bulk_create para cadastros e, para as
+# chamadas, INSERT com executemany (COPY no PostgreSQL com psycopg 3).
+# Como o bulk_create não dispara signals, no final o resumo mensal, o índice
+# de busca, o autocompletar e o painel dos professores são refeitos de uma vez.
+# =======================================================
+
+PRIMEIROS_NOMES = [
+    'Ana', 'Maria', 'Júlia', 'Beatriz', 'Larissa', 'Camila', 'Fernanda', 'Gabriela', 'Letícia', 'Sofia',
+    'Helena', 'Alice', 'Laura', 'Manuela', 'Valentina', 'Isabela', 'Lívia', 'Yasmin', 'Clara', 'Rafaela',
+    'João', 'Pedro', 'Lucas', 'Gabriel', 'Mateus', 'Rafael', 'Gustavo', 'Felipe', 'Bruno', 'Thiago',
+    'Miguel', 'Arthur', 'Davi', 'Bernardo', 'Heitor', 'Samuel', 'Enzo', 'Guilherme', 'Vinícius', 'Caio',
+]
+SOBRENOMES = [
+    'Silva', 'Santos', 'Oliveira', 'Souza', 'Rodrigues', 'Ferreira', 'Alves', 'Pereira', 'Lima', 'Gomes',
+    'Costa', 'Ribeiro', 'Martins', 'Carvalho', 'Almeida', 'Lopes', 'Soares', 'Fernandes', 'Vieira', 'Barbosa',
+    'Rocha', 'Dias', 'Nascimento', 'Andrade', 'Moreira', 'Nunes', 'Marques', 'Machado', 'Mendes', 'Freitas',
+]
+BAIRROS = ['Centro', 'Duques', 'Bandeirantes', 'Vila Cortes', 'Ampliação', 'Posse dos Coutinhos', 'Tomascar', 'Pinhão']
+ATIVIDADES = [
+    'Violão', 'Teclado', 'Bateria', 'Canto', 'Violino', 'Flauta', 'Ballet', 'Jazz', 'Capoeira', 'Judô',
+    'Inglês', 'Informática', 'Reforço Escolar', 'Artesanato', 'Teatro', 'Coral',
+]
+DIAS = [dia for dia, _ in Matricula.DIAS_CHOICES]
+HORAS = [hora for hora, _ in Matricula.HORAS_CHOICES]
+NUMERO_DIA = {'SEG': 0, 'TER': 1, 'QUA': 2, 'QUI': 3, 'SEX': 4, 'SAB': 5}
+DESPESAS_FIXAS = [('Conta de Luz', Decimal('280')), ('Conta de Água', Decimal('90')), ('Internet', Decimal('120'))]
+METODOS_PAGAMENTO = ['PIX', 'PIX', 'PIX', 'DIN', 'CD', 'CC']
+
+
+class ConfiguracaoEscala:
+    # Volumes e distribuições (os padrões dão uns 4-5 milhões de chamadas)
+    def __init__(self, alunos=20000, professores=40, cursos=60, anos=4, semente=42, ate=None,
+                 matriculas_por_aluno=2, evasao=0.25, faltas=0.2, inadimplencia=0.12,
+                 bolsistas=0.1, sem_horario=0.03, mensalidade=Decimal('50'), doacoes_por_mes=12,
+                 despesas_por_mes=6, lote=5000):
+        self.alunos = alunos
+        self.professores = professores
+        self.cursos = cursos
+        self.anos = anos
+        self.semente = semente
+        self.ate = ate or timezone.localdate()
+        self.inicio = datetime.date(self.ate.year - anos + 1, 1, 1) if anos > 0 else self.ate.replace(day=1)
+        self.matriculas_por_aluno = matriculas_por_aluno
+        self.evasao = evasao
+        self.faltas = faltas
+        self.inadimplencia = inadimplencia
+        self.bolsistas = bolsistas
+        self.sem_horario = sem_horario
+        self.mensalidade = Decimal(str(mensalidade))
+        self.doacoes_por_mes = doacoes_por_mes
+        self.despesas_por_mes = despesas_por_mes
+        self.lote = lote
+
+
+def _taxa_individual(rng, media):
+    # Taxa de cada aluno em volta da média (uns faltam/atrasam muito, a maioria pouco)
+    if media <= 0:
+        return 0.0
+    if media >= 1:
+        return 1.0
+    return rng.betavariate(2, 2 * (1 - media) / media)
+
+
+def _data_entre(rng, inicio, fim):
+    if fim <= inicio:
+        return inicio
+    return inicio + datetime.timedelta(days=rng.randrange((fim - inicio).days + 1))
+
+
+def _anos_antes(data, anos):
+    # 29/02 vira 28/02 em ano não bissexto
+    try:
+        return data.replace(year=data.year - anos)
+    except ValueError:
+        return data.replace(year=data.year - anos, day=28)
+
+
+def _meses(inicio, fim):
+    periodo, ultimo = Periodo.da_data(inicio), Periodo.da_data(fim)
+    while (periodo.ano, periodo.mes) <= (ultimo.ano, ultimo.mes):
+        yield periodo
+        periodo = periodo.seguinte()
+
+
+def _em_blocos(iteravel, tamanho):
+    iterador = iter(iteravel)
+    while True:
+        bloco = list(islice(iterador, tamanho))
+        if not bloco:
+            return
+        yield bloco
+
+
+def inserir_em_massa(modelo, campos, linhas, lote=5000):
+    # INSERT direto (sem instanciar o modelo) das tuplas de `linhas`, na ordem de `campos`.
+    # Devolve quantas linhas entraram.
+    opcoes = modelo._meta
+    tabela = connection.ops.quote_name(opcoes.db_table)
+    colunas = ', '.join(connection.ops.quote_name(opcoes.get_field(campo).column) for campo in campos)
+    total = 0
+    with connection.cursor() as cursor:
+        bruto = cursor.cursor
+        if connection.vendor == 'postgresql' and hasattr(bruto, 'copy'):
+            # psycopg 3: COPY é bem mais rápido que INSERT para milhões de linhas
+            with bruto.copy(f'COPY {tabela} ({colunas}) FROM STDIN') as copia:
+                for linha in linhas:
+                    copia.write_row(linha)
+                    total += 1
+            return total
+        sql = f"INSERT INTO {tabela} ({colunas}) VALUES ({', '.join(['%s'] * len(campos))})"
+        for bloco in _em_blocos(linhas, lote):
+            cursor.executemany(sql, bloco)
+            total += len(bloco)
+    return total
+
+
+class GeradorEscala:
+    def __init__(self, config, saida=None):
+        self.config = config
+        self.rng = random.Random(config.semente)
+        self.saida = saida or (lambda texto: None)
+        self.contagem = {}
+
+    def _avisar(self, modelo, quantidade):
+        self.contagem[modelo.__name__] = self.contagem.get(modelo.__name__, 0) + quantidade
+        self.saida(f"{modelo.__name__}: {self.contagem[modelo.__name__]}")
+
+    def _nome(self):
+        return f"{self.rng.choice(PRIMEIROS_NOMES)} {self.rng.choice(SOBRENOMES)} {self.rng.choice(SOBRENOMES)}"
+
+    def _telefone(self):
+        return f"219{self.rng.randrange(10 ** 7, 10 ** 8)}"
+
+    def gerar(self):
+        senha = make_password('123456')  # uma vez só: PBKDF2 por usuário levaria minutos
+        with transaction.atomic():
+            professores = self._professores(senha)
+            cursos = self._cursos(professores)
+            alunos = self._alunos(senha)
+            matriculas = self._matriculas(alunos, cursos)
+        with transaction.atomic():
+            self._presencas(matriculas)
+        with transaction.atomic():
+            self._pagamentos(matriculas)
+            self._folha(matriculas)
+            self._doacoes_e_despesas()
+
+        # O que os signals/save() manteriam linha a linha
+        resumo.reconstruir_tudo()
+        if busca.fts_disponivel():
+            with transaction.atomic(), connection.cursor() as cursor:
+                busca.reconstruir_indice(cursor, Aluno.objects.values_list('id', 'busca_normalizada', 'telefone').iterator())
+        autocompletar.invalidar_indice()
+        painel_professor.invalidar_todos()
+        papel.invalidar_todos()
+        return self.contagem
+
+    # -------------------------------------------------------
+    # Cadastros
+    # -------------------------------------------------------
+
+    def _usuarios(self, prefixo, quantidade, senha):
+        # Usernames com o prefixo + número; pula os que já existem (rodar duas vezes soma)
+        inicio = User.objects.filter(username__startswith=prefixo).count()
+        usuarios = [
+            User(username=f"{prefixo}{inicio + i:06d}", first_name=self._nome(), password=senha, is_active=True)
+            for i in range(quantidade)
+        ]
+        return User.objects.bulk_create(usuarios, batch_size=self.config.lote)
+
+    def _professores(self, senha):
+        usuarios = self._usuarios('escala.prof', self.config.professores, senha)
+        professores = Professor.objects.bulk_create([Professor(user=u) for u in usuarios], batch_size=self.config.lote)
+        self._avisar(Professor, len(professores))
+        return professores
+
+    def _cursos(self, professores):
+        cursos = []
+        for i in range(self.config.cursos):
+            atividade = ATIVIDADES[i % len(ATIVIDADES)]
+            turma = i // len(ATIVIDADES) + 1
+            curso = Curso(
+                nome=f"{atividade} - Turma {turma}" if turma > 1 else atividade,
+                professor=self.rng.choice(professores) if professores else None,
+            )
+            # Horário da turma: as matrículas do curso usam o mesmo dia/hora
+            curso.dia_escala = self.rng.choice(DIAS)
+            curso.hora_escala = self.rng.choice(HORAS)
+            cursos.append(curso)
+        Curso.objects.bulk_create(cursos, batch_size=self.config.lote)
+        self._avisar(Curso, len(cursos))
+        return cursos
+
+    def _alunos(self, senha):
+        config, rng = self.config, self.rng
+        usuarios = self._usuarios('escala.aluno', config.alunos, senha)
+        alunos = []
+        for usuario in usuarios:
+            menor = rng.random() < 0.6
+            idades = (6, 17) if menor else (18, 70)
+            nascimento = _data_entre(rng, _anos_antes(config.ate, idades[1]), _anos_antes(config.ate, idades[0]))
+            aluno = Aluno(
+                user=usuario,
+                telefone=self._telefone(),
+                data_nascimento=nascimento,
+                sexo=rng.choice('MF'),
+                logradouro=f"Rua {rng.choice(SOBRENOMES)}, {rng.randrange(1, 999)}",
+                bairro=rng.choice(BAIRROS),
+                eh_bolsista=rng.random() < config.bolsistas,
+                nome_responsavel=self._nome() if menor else None,
+                contato_responsavel=self._telefone() if menor else None,
+                membro_metodista=rng.random() < 0.3,
+                data_matricula=_data_entre(rng, config.inicio, config.ate),
+            )
+            aluno.busca_normalizada = aluno.calcular_busca_normalizada()
+            # Comportamento do aluno (não vai para o banco)
+            aluno.taxa_faltas = _taxa_individual(rng, config.faltas)
+            aluno.taxa_atraso = _taxa_individual(rng, config.inadimplencia)
+            alunos.append(aluno)
+        Aluno.objects.bulk_create(alunos, batch_size=config.lote)
+        self._avisar(Aluno, len(alunos))
+        return alunos
+
+    def _matriculas(self, alunos, cursos):
+        config, rng = self.config, self.rng
+        matriculas = []
+        for aluno in alunos:
+            # 1 curso garantido + extras até chegar na média pedida
+            quantidade = 1
+            while quantidade < len(cursos) and rng.random() < 1 - 1 / max(config.matriculas_por_aluno, 1):
+                quantidade += 1
+            for curso in rng.sample(cursos, min(quantidade, len(cursos))):
+                inicio = _data_entre(rng, aluno.data_matricula, min(aluno.data_matricula + datetime.timedelta(days=60), config.ate))
+                saida = None
+                if rng.random() < config.evasao:
+                    saida = _data_entre(rng, inicio, config.ate)
+                sem_horario = rng.random() < config.sem_horario
+                matricula = Matricula(
+                    aluno=aluno, curso=curso, data_inicio=inicio,
+                    ativo=saida is None,
+                    data_saida=timezone.make_aware(datetime.datetime.combine(saida, datetime.time(12))) if saida else None,
+                    dia_semana=None if sem_horario else curso.dia_escala,
+                    hora_aula=None if sem_horario else curso.hora_escala,
+                )
+                matricula.ultima_aula = saida or config.ate
+                matriculas.append(matricula)
+        Matricula.objects.bulk_create(matriculas, batch_size=config.lote)
+        self._avisar(Matricula, len(matriculas))
+        return matriculas
+
+    # -------------------------------------------------------
+    # Movimento (chamadas, pagamentos, folha, doações, despesas)
+    # -------------------------------------------------------
+
+    def _linhas_presenca(self, matriculas):
+        rng = self.rng
+        semana = datetime.timedelta(days=7)
+        for matricula in matriculas:
+            if not matricula.dia_semana:
+                continue
+            data = matricula.data_inicio + datetime.timedelta(days=(NUMERO_DIA[matricula.dia_semana] - matricula.data_inicio.weekday()) % 7)
+            taxa = matricula.aluno.taxa_faltas
+            while data <= matricula.ultima_aula:
+                yield (matricula.pk, data, rng.random() >= taxa)
+                data += semana
+
+    def _presencas(self, matriculas):
+        total = inserir_em_massa(Presenca, ['matricula', 'data_aula', 'presente'], self._linhas_presenca(matriculas), self.config.lote)
+        self._avisar(Presenca, total)
+
+    def _linhas_pagamento(self, matriculas):
+        config, rng = self.config, self.rng
+        agora = Periodo.da_data(config.ate)
+        for matricula in matriculas:
+            aluno = matricula.aluno
+            if aluno.eh_bolsista:
+                continue
+            for periodo in _meses(matricula.data_inicio, matricula.ultima_aula):
+                if rng.random() < aluno.taxa_atraso:
+                    continue  # mês em aberto
+                data = min(periodo.inicio.replace(day=rng.randrange(1, 16)), config.ate)
+                # Os do mês corrente às vezes ainda esperam a secretaria confirmar
+                confirmado = periodo != agora or rng.random() < 0.7
+                yield (
+                    aluno.pk, matricula.curso_id, f"{periodo.mes:02d}", periodo.ano,
+                    rng.choice(METODOS_PAGAMENTO), config.mensalidade, data, confirmado,
+                )
+
+    def _pagamentos(self, matriculas):
+        campos = ['aluno', 'curso', 'mes', 'ano', 'metodo', 'valor', 'data_pagamento', 'confirmado']
+        total = inserir_em_massa(Pagamento, campos, self._linhas_pagamento(matriculas), self.config.lote)
+        self._avisar(Pagamento, total)
+
+    def _folha(self, matriculas):
+        # Folha de cada professor por mês: alunos distintos com matrícula ativa no mês
+        config = self.config
+        alunos_por_mes = {}
+        for matricula in matriculas:
+            professor_id = matricula.curso.professor_id
+            if professor_id is None:
+                continue
+            for periodo in _meses(matricula.data_inicio, matricula.ultima_aula):
+                alunos_por_mes.setdefault((professor_id, periodo), set()).add(matricula.aluno_id)
+
+        agora = Periodo.da_data(config.ate)
+        folhas = []
+        for (professor_id, periodo), alunos in sorted(alunos_por_mes.items(), key=lambda item: (item[0][1].ano, item[0][1].mes, item[0][0])):
+            pago = periodo != agora
+            folhas.append(PagamentoProfessor(
+                professor_id=professor_id, mes=periodo.mes, ano=periodo.ano, qtd_alunos=len(alunos),
+                valor_total=folha.VALOR_POR_ALUNO_PADRAO * len(alunos), pago=pago,
+                data_pagamento_realizado=timezone.make_aware(datetime.datetime.combine(periodo.seguinte().inicio, datetime.time(10))) if pago else None,
+            ))
+        PagamentoProfessor.objects.bulk_create(folhas, batch_size=config.lote)
+        self._avisar(PagamentoProfessor, len(folhas))
+
+    def _doacoes_e_despesas(self):
+        config, rng = self.config, self.rng
+        doacoes, despesas = [], []
+        for periodo in _meses(config.inicio, config.ate):
+            ultimo_dia = min(periodo.fim - datetime.timedelta(days=1), config.ate)
+            for _ in range(rng.randrange(config.doacoes_por_mes // 2, config.doacoes_por_mes + 1) if config.doacoes_por_mes else 0):
+                doacoes.append(Doacao(
+                    nome_doador=self._nome(), telefone=self._telefone(),
+                    valor=Decimal(rng.choice([20, 30, 50, 50, 100, 100, 200, 500])),
+                    data_doacao=_data_entre(rng, periodo.inicio, ultimo_dia), metodo=rng.choice(['PIX', 'PIX', 'DIN', 'TRA']),
+                ))
+            for descricao, valor in DESPESAS_FIXAS:
+                despesas.append(Despesa(descricao=descricao, categoria='FIXA', valor=valor, data_despesa=min(periodo.inicio.replace(day=10), config.ate)))
+            for _ in range(config.despesas_por_mes):
+                despesas.append(Despesa(
+                    descricao=rng.choice(['Material de limpeza', 'Cordas e palhetas', 'Lanche', 'Manutenção', 'Xerox']),
+                    categoria=rng.choice(['VAR', 'MAN']), valor=Decimal(rng.randrange(15, 400)),
+                    data_despesa=_data_entre(rng, periodo.inicio, ultimo_dia),
+                ))
+        Doacao.objects.bulk_create(doacoes, batch_size=config.lote)
+        Despesa.objects.bulk_create(despesas, batch_size=config.lote)
+        self._avisar(Doacao, len(doacoes))
+        self._avisar(Despesa, len(despesas))
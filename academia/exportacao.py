@@ -0,0 +1,234 @@
+import csv
+import datetime
+import re
+import zipfile
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from django.http import StreamingHttpResponse
+
+# =======================================================
+# EXPORTAÇÃO EM STREAMING (CSV / XLSX)
+# As linhas saem do banco em blocos (.iterator) já "achatadas" por values()
+# (os JOINs são feitos no SQL) e vão sendo enviadas ao navegador enquanto são
+# lidas: a memória não cresce com o tamanho da tabela e o download começa na hora.
+#
+# O XLSX é montado aqui mesmo (é um .zip com alguns XMLs); o zipfile do Python
+# consegue gravar num destino sem seek, então a planilha também sai em streaming.
+# =======================================================
+
+TAMANHO_BLOCO = 2000
+FORMATOS = ('csv', 'xlsx')
+
+TIPOS_CONTEUDO = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+def _texto(valor):
+    # Como o valor aparece na planilha
+    if valor is None:
+        return ''
+    if isinstance(valor, bool):
+        return 'Sim' if valor else 'Não'
+    if isinstance(valor, datetime.datetime):
+        return valor.strftime('%d/%m/%Y %H:%M')
+    if isinstance(valor, datetime.date):
+        return valor.strftime('%d/%m/%Y')
+    if isinstance(valor, Decimal):
+        return f'{valor:.2f}'.replace('.', ',')
+    return str(valor)
+
+
+# Texto que o Excel executaria como fórmula ao abrir o CSV (os nomes vêm dos
+# formulários públicos de inscrição): ganha um ' na frente e fica como texto
+_INICIO_DE_FORMULA = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _texto_csv(valor):
+    texto = _texto(valor)
+    if isinstance(valor, str) and texto.startswith(_INICIO_DE_FORMULA):
+        return "'" + texto
+    return texto
+
+
+class _Eco:
+    # "Arquivo" que devolve o que recebe (o csv.writer escreve aqui)
+    def write(self, valor):
+        return valor
+
+
+def _linhas_csv(cabecalho, linhas):
+    # ';' e BOM: é o que o Excel em português abre direto, com acentos certos
+    escritor = csv.writer(_Eco(), delimiter=';')
+    yield '\ufeff' + escritor.writerow(cabecalho)
+    for linha in linhas:
+        yield escritor.writerow([_texto_csv(v) for v in linha])
+
+
+# -------------------------------------------------------
+# XLSX
+# -------------------------------------------------------
+
+class _Saida:
+    # Destino do zipfile: guarda os bytes até o gerador entregá-los
+    def __init__(self):
+        self.partes = []
+        self.posicao = 0
+
+    def write(self, dados):
+        self.partes.append(bytes(dados))
+        self.posicao += len(dados)
+        return len(dados)
+
+    def tell(self):
+        return self.posicao
+
+    def flush(self):
+        pass
+
+    def retirar(self):
+        dados = b''.join(self.partes)
+        self.partes = []
+        return dados
+
+
+_XLSX_FIXOS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Dados" sheetId="1" r:id="rId1"/></sheets></workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+# Caracteres de controle não são aceitos no XML da planilha
+_CONTROLE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def _celula(valor):
+    if isinstance(valor, (int, float, Decimal)) and not isinstance(valor, bool):
+        return f'<c><v>{valor}</v></c>'
+    texto = escape(_CONTROLE.sub('', _texto(valor)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{texto}</t></is></c>'
+
+
+def _linhas_xlsx(cabecalho, linhas):
+    saida = _Saida()
+    with zipfile.ZipFile(saida, 'w', compression=zipfile.ZIP_DEFLATED) as arquivo_zip:
+        for nome, conteudo in _XLSX_FIXOS.items():
+            arquivo_zip.writestr(nome, conteudo)
+        yield saida.retirar()
+
+        with arquivo_zip.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as planilha:
+            planilha.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            for linha in _com_cabecalho(cabecalho, linhas):
+                planilha.write(('<row>' + ''.join(_celula(v) for v in linha) + '</row>').encode('utf-8'))
+                if saida.partes:
+                    yield saida.retirar()
+            planilha.write(b'</sheetData></worksheet>')
+    yield saida.retirar()
+
+
+def _com_cabecalho(cabecalho, linhas):
+    yield [str(c) for c in cabecalho]
+    yield from linhas
+
+
+def resposta_exportacao(nome_arquivo, formato, cabecalho, linhas):
+    # `linhas` é um iterável (de preferência preguiçoso) de tuplas na ordem do cabeçalho
+    gerador = _linhas_xlsx(cabecalho, linhas) if formato == 'xlsx' else _linhas_csv(cabecalho, linhas)
+    resposta = StreamingHttpResponse(gerador, content_type=TIPOS_CONTEUDO[formato])
+    resposta['Content-Disposition'] = f'attachment; filename="{nome_arquivo}.{formato}"'
+    return resposta
+
+
+# -------------------------------------------------------
+# Consultas das exportações: (cabeçalho, linhas)
+# -------------------------------------------------------
+
+def _projetar(queryset, colunas):
+    # colunas: [(título, campo do values_list), ...]
+    cabecalho = [titulo for titulo, _ in colunas]
+    linhas = queryset.values_list(*[campo for _, campo in colunas]).iterator(chunk_size=TAMANHO_BLOCO)
+    return cabecalho, linhas
+
+
+COLUNAS_ALUNOS = [
+    ('ID', 'id'),
+    ('Usuário', 'user__username'),
+    ('Nome', 'user__first_name'),
+    ('Telefone', 'telefone'),
+    ('Nascimento', 'data_nascimento'),
+    ('Sexo', 'sexo'),
+    ('Logradouro', 'logradouro'),
+    ('Bairro', 'bairro'),
+    ('Cidade', 'cidade'),
+    ('Bolsista', 'eh_bolsista'),
+    ('Responsável', 'nome_responsavel'),
+    ('Contato do Responsável', 'contato_responsavel'),
+    ('Membro Metodista', 'membro_metodista'),
+    ('Outra Igreja', 'outra_igreja'),
+    ('Data de Matrícula', 'data_matricula'),
+    ('Ativo', 'user__is_active'),
+]
+
+COLUNAS_PAGAMENTOS = [
+    ('ID', 'id'),
+    ('Data do Pagamento', 'data_pagamento'),
+    ('Aluno', 'aluno__user__first_name'),
+    ('Usuário', 'aluno__user__username'),
+    ('Pagante', 'nome_pagante'),
+    ('Curso', 'curso__nome'),
+    ('Mês Ref.', 'mes'),
+    ('Ano Ref.', 'ano'),
+    ('Forma', 'metodo'),
+    ('Valor', 'valor'),
+    ('Confirmado', 'confirmado'),
+    ('Observação', 'observacao'),
+]
+
+COLUNAS_PRESENCAS = [
+    ('Data da Aula', 'data_aula'),
+    ('Aluno', 'matricula__aluno__user__first_name'),
+    ('Usuário', 'matricula__aluno__user__username'),
+    ('Curso', 'matricula__curso__nome'),
+    ('Presente', 'presente'),
+]
+
+
+def exportacao_alunos(queryset):
+    return _projetar(queryset.order_by('user__username'), COLUNAS_ALUNOS)
+
+
+def exportacao_pagamentos(queryset):
+    return _projetar(queryset.order_by('data_pagamento', 'id'), COLUNAS_PAGAMENTOS)
+
+
+def exportacao_presencas(queryset):
+    return _projetar(queryset.order_by('data_aula', 'matricula__aluno__user__username'), COLUNAS_PRESENCAS)
@@ -0,0 +1,87 @@
+from decimal import Decimal
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Value, DecimalField
+from django.db.models.functions import Coalesce
+
+from .models import Professor, Presenca, PagamentoProfessor
+
+# =======================================================
+# FOLHA DE PAGAMENTO DOS PROFESSORES
+# Uma consulta agrupada por (professor, aluno) traz quem esteve presente no mês
+# e o valor de cada aluno; depois a folha inteira é gravada em lote numa
+# única transação.
+# =======================================================
+
+# Valor pago ao professor por aluno presente no mês (pode mudar no settings.py).
+# Cada curso pode ter o seu próprio valor em Curso.valor_por_aluno.
+VALOR_POR_ALUNO_PADRAO = Decimal(str(getattr(settings, 'VALOR_POR_ALUNO_PROFESSOR', '35.00')))
+
+
+def calcular_folha(ano, mes, valor_padrao=None):
+    # Lista com um item por professor: {'professor', 'nome', 'qtd_alunos', 'valor'}.
+    # Um aluno presente em dois cursos do mesmo professor conta uma vez só
+    # (como antes), usando o maior valor entre os cursos dele.
+    valor_padrao = VALOR_POR_ALUNO_PADRAO if valor_padrao is None else Decimal(str(valor_padrao))
+
+    presentes = Presenca.objects.filter(
+        presente=True,
+        matricula__curso__professor__isnull=False,
+    ).no_mes(ano, mes).values(
+        'matricula__curso__professor', 'matricula__aluno'
+    ).annotate(
+        valor=Max(Coalesce(
+            'matricula__curso__valor_por_aluno',
+            Value(valor_padrao),
+            output_field=DecimalField(max_digits=10, decimal_places=2),
+        ))
+    ).order_by()
+
+    totais = {}
+    for linha in presentes:
+        qtd, valor = totais.get(linha['matricula__curso__professor'], (0, Decimal('0')))
+        totais[linha['matricula__curso__professor']] = (qtd + 1, valor + Decimal(linha['valor']))
+
+    folha = []
+    for prof in Professor.objects.select_related('user').order_by('user__username'):
+        qtd, valor = totais.get(prof.id, (0, Decimal('0')))
+        folha.append({
+            'professor': prof,
+            'nome': prof.user.username,
+            'qtd_alunos': qtd,
+            'valor': valor.quantize(Decimal('0.01')),
+        })
+    return folha
+
+
+def gerar_folha(ano, mes, valor_padrao=None, simular=False):
+    # Calcula e grava a folha do mês. Lançamentos já pagos não são alterados.
+    # Com simular=True só devolve a prévia, sem gravar nada.
+    folha = calcular_folha(ano, mes, valor_padrao)
+    if simular:
+        return folha
+
+    with transaction.atomic():
+        existentes = {}
+        for pgto in PagamentoProfessor.objects.select_for_update().filter(mes=mes, ano=ano).order_by('id'):
+            # Se houver lançamento duplicado, vale o primeiro (igual ao get_or_create antigo)
+            existentes.setdefault(pgto.professor_id, pgto)
+
+        novos, alterados = [], []
+        for item in folha:
+            pgto = existentes.get(item['professor'].id)
+            if pgto is None:
+                novos.append(PagamentoProfessor(
+                    professor=item['professor'], mes=mes, ano=ano,
+                    qtd_alunos=item['qtd_alunos'], valor_total=item['valor'],
+                ))
+            elif not pgto.pago:
+                pgto.qtd_alunos = item['qtd_alunos']
+                pgto.valor_total = item['valor']
+                alterados.append(pgto)
+
+        # bulk_* não dispara signals, mas lançamentos não pagos não entram no ResumoMensal
+        PagamentoProfessor.objects.bulk_create(novos)
+        PagamentoProfessor.objects.bulk_update(alterados, ['qtd_alunos', 'valor_total'])
+
+    return folha
@@ -1,7 +1,9 @@
 from django import forms
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
+from django.urls import reverse
 from .models import Aluno, Curso, Pagamento, Professor, Matricula, MensagemPadrao,Doacao, Despesa
+from .autocompletar import rotulo_aluno
 
 # =======================================================
 # 1. USUÁRIOS E ALUNOS (CADASTRO INICIAL)
@@ -186,16 +188,51 @@ class PagamentoForm(forms.ModelForm):
 class AlunoModelChoiceField(forms.ModelChoiceField):
     def label_from_instance(self, obj):
         # Aqui definimos o que aparece na lista
-        # Ex: "João da Silva (Resp: Maria)"
-        responsavel = f" - Resp: {obj.nome_responsavel}" if obj.nome_responsavel else ""
-        return f"{obj.user.first_name} {responsavel}"
+        # Ex: "João da Silva - Resp: Maria" (mesmo texto do autocompletar)
+        return rotulo_aluno(obj.user.first_name, obj.user.username, obj.nome_responsavel)
+
+class SelectAutocompletar(forms.Select):
+    # Select pesquisável (select2) que busca as opções por AJAX em `url_name`.
+    # Na página só vai a opção já escolhida, não a lista inteira do queryset.
+    def __init__(self, url_name, attrs=None):
+        self.url_name = url_name
+        padrao = {'class': 'form-select select-autocompletar', 'data-minimum-input-length': '2'}
+        super().__init__(attrs={**padrao, **(attrs or {})})
+
+    class Media:
+        css = {'all': ['https://cdn.jsdelivr.net/npm/select2@4.1.0-rc.0/dist/css/select2.min.css']}
+        js = [
+            'https://code.jquery.com/jquery-3.7.1.min.js',
+            'https://cdn.jsdelivr.net/npm/select2@4.1.0-rc.0/dist/js/select2.min.js',
+            'js/autocompletar.js',
+        ]
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context['widget']['attrs']['data-ajax--url'] = reverse(self.url_name)
+        return context
+
+    def optgroups(self, name, value, attrs=None):
+        todas = self.choices
+        escolhidos = [v for v in value if v not in ('', None)]
+        opcoes = [('', '---------')]
+        if escolhidos and hasattr(todas, 'queryset'):
+            try:
+                opcoes += [todas.choice(obj) for obj in todas.queryset.filter(pk__in=escolhidos)]
+            except (ValueError, ValidationError):
+                pass
+        self.choices = opcoes
+        try:
+            return super().optgroups(name, value, attrs)
+        finally:
+            self.choices = todas
 
 class PagamentoAdminForm(forms.ModelForm):
     # Substituímos o campo padrão pelo nosso personalizado
     aluno = AlunoModelChoiceField(
-        queryset=Aluno.objects.all().order_by('user__first_name'), 
+        queryset=Aluno.objects.select_related('user').order_by('user__first_name'),
         label="Aluno",
-        widget=forms.Select(attrs={'class': 'form-select select2'}) # Dica: Se usar select2, fica pesquisável
+        widget=SelectAutocompletar('autocompletar_alunos', attrs={'data-placeholder': 'Digite o nome ou telefone do aluno'})
     )
 
     class Meta:
@@ -221,7 +258,7 @@ class PagamentoAdminForm(forms.ModelForm):
 class CursoForm(forms.ModelForm):
     class Meta:
         model = Curso
-        fields = ['nome', 'professor', 'descricao', 'imagem','ativo']
+        fields = ['nome', 'professor', 'descricao', 'imagem','ativo', 'valor_por_aluno']
 
 # Formulário para o Gerador de Relatórios
 class RelatorioAlunoForm(forms.Form):
@@ -237,6 +274,17 @@ class RelatorioAlunoForm(forms.Form):
     mostrar_igreja = forms.BooleanField(required=False, label="Mostrar Igreja")
     mostrar_foto = forms.BooleanField(required=False, initial=True, label="Mostrar Foto")
 
+class ImportarPlanilhaForm(forms.Form):
+    # Importação em segundo plano (academia/tarefas.py)
+    recurso = forms.ChoiceField(choices=[('alunos', 'Alunos'), ('matriculas', 'Matrículas')], label="O que importar")
+    arquivo = forms.FileField(label="Planilha (CSV ou XLSX)")
+
+    def clean_arquivo(self):
+        arquivo = self.cleaned_data['arquivo']
+        if not arquivo.name.lower().endswith(('.csv', '.xlsx')):
+            raise forms.ValidationError("Envie uma planilha .csv ou .xlsx.")
+        return arquivo
+
 class HorarioForm(forms.ModelForm):
     class Meta:
         model = Matricula
@@ -258,9 +306,9 @@ class NovoAgendamentoForm(forms.Form):
     
     # O dropdown vai mostrar "Joao - Violão", "Maria - Bateria", etc.
     matricula = forms.ModelChoiceField(
-        queryset=Matricula.objects.filter(ativo=True).order_by('aluno__user__username'),
+        queryset=Matricula.objects.filter(ativo=True).select_related('aluno__user', 'curso').order_by('aluno__user__username'),
         label="Selecione a Matrícula (Aluno - Curso)",
-        widget=forms.Select(attrs={'class': 'form-control select2'}) # Classe extra pra ficar bonito
+        widget=SelectAutocompletar('autocompletar_matriculas', attrs={'data-placeholder': 'Digite o nome do aluno'})
     )
     
     # Campos de Dia e Hora (pegamos as opções do modelo)
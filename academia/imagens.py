@@ -0,0 +1,141 @@
+import hashlib
+import io
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# =======================================================
+# VARIANTES DAS IMAGENS (FOTOS DE ALUNOS, CURSOS, NOTÍCIAS...)
+# A foto original (às vezes 3-5 MB, tirada do celular) continua guardada como
+# veio. Na primeira vez que uma página pede a imagem, geramos cópias menores
+# em larguras fixas, em WebP e JPEG, sem os dados EXIF (GPS, modelo do celular).
+# O nome de cada cópia é o hash do conteúdo do original, então:
+#   - a mesma foto enviada duas vezes usa as mesmas cópias;
+#   - trocar a foto gera nomes novos (o navegador não mostra a antiga do cache).
+# =======================================================
+
+# Larguras geradas (px). Nunca aumentamos uma imagem menor que a largura.
+LARGURAS = tuple(getattr(settings, 'IMAGENS_LARGURAS', (160, 320, 640, 1280)))
+QUALIDADE = getattr(settings, 'IMAGENS_QUALIDADE', 80)
+PASTA = 'variantes'
+
+FORMATOS = {
+    'webp': ('WEBP', 'image/webp'),
+    'jpg': ('JPEG', 'image/jpeg'),
+}
+
+
+def _hash_do_arquivo(campo):
+    # O hash do original fica no cache (ler o arquivo a cada página seria caro).
+    # O nome do arquivo muda a cada upload, então ele serve de chave.
+    chave = f'imagens:hash:{campo.name}'
+    valor = cache.get(chave)
+    if valor is None:
+        sha = hashlib.sha256()
+        with campo.storage.open(campo.name, 'rb') as arquivo:
+            for bloco in iter(lambda: arquivo.read(64 * 1024), b''):
+                sha.update(bloco)
+        valor = sha.hexdigest()[:20]
+        cache.set(chave, valor, timeout=None)
+    return valor
+
+
+def _caminho(hash_original, largura, extensao):
+    return f'{PASTA}/{hash_original[:2]}/{hash_original}-{largura}.{extensao}'
+
+
+def _larguras_para(largura_original):
+    # As larguras fixas menores que a original + a própria original (se for menor que a maior)
+    larguras = [l for l in LARGURAS if l < largura_original]
+    if largura_original <= LARGURAS[-1]:
+        larguras.append(largura_original)
+    return larguras
+
+
+# Orientações do EXIF que giram a foto 90° (largura e altura trocam)
+_ORIENTACOES_DEITADAS = {5, 6, 7, 8}
+_TAG_ORIENTACAO = 0x0112
+
+
+def _tamanho_visivel(imagem):
+    # (largura, altura) depois da rotação do EXIF, só pelo cabeçalho
+    largura, altura = imagem.size
+    if imagem.getexif().get(_TAG_ORIENTACAO) in _ORIENTACOES_DEITADAS:
+        return altura, largura
+    return largura, altura
+
+
+def _gerar(campo, hash_original):
+    # Grava as larguras/formatos que faltarem. O Image.open() só lê o
+    # cabeçalho: se todas as cópias já existem (cache limpo, servidor
+    # reiniciado), o original nem é decodificado.
+    with campo.storage.open(campo.name, 'rb') as arquivo:
+        imagem = Image.open(arquivo)
+        larguras = _larguras_para(_tamanho_visivel(imagem)[0])
+        faltando = {}
+        for largura in larguras:
+            extensoes = [e for e in FORMATOS if not default_storage.exists(_caminho(hash_original, largura, e))]
+            if extensoes:
+                faltando[largura] = extensoes
+        if not faltando:
+            return larguras
+        imagem.load()
+
+    # Aplica a rotação do EXIF antes de jogá-lo fora (foto de celular "deitada")
+    imagem = ImageOps.exif_transpose(imagem)
+    if imagem.mode not in ('RGB', 'RGBA'):
+        imagem = imagem.convert('RGBA' if 'A' in imagem.getbands() else 'RGB')
+
+    for largura, extensoes in faltando.items():
+        altura = max(1, round(imagem.height * largura / imagem.width))
+        copia = imagem if largura == imagem.width else imagem.resize((largura, altura), Image.LANCZOS)
+        for extensao in extensoes:
+            formato = FORMATOS[extensao][0]
+            saida = copia.convert('RGB') if formato == 'JPEG' else copia
+            buffer = io.BytesIO()
+            # Sem exif=... no save: os metadados do original não vão para a cópia
+            saida.save(buffer, formato, quality=QUALIDADE, optimize=True, **({'progressive': True} if formato == 'JPEG' else {}))
+            default_storage.save(_caminho(hash_original, largura, extensao), ContentFile(buffer.getvalue()))
+    return larguras
+
+
+def variantes(campo):
+    # {'webp': [(url, largura), ...], 'jpg': [...]} das cópias da imagem,
+    # gerando na primeira chamada. Devolve None se não der para gerar
+    # (arquivo sumiu ou não é imagem): quem chama usa o original.
+    if not campo:
+        return None
+    chave = f'imagens:variantes:{campo.name}'
+    resultado = cache.get(chave)
+    if resultado is not None:
+        return resultado or None
+
+    try:
+        hash_original = _hash_do_arquivo(campo)
+        larguras = _gerar(campo, hash_original)
+    except (OSError, UnidentifiedImageError, ValueError, Image.DecompressionBombError):
+        # Guarda a falha por um tempo para não tentar a cada página
+        cache.set(chave, {}, timeout=60 * 60)
+        return None
+
+    resultado = {
+        extensao: [(default_storage.url(_caminho(hash_original, l, extensao)), l) for l in larguras]
+        for extensao in FORMATOS
+    }
+    cache.set(chave, resultado, timeout=None)
+    return resultado
+
+
+def url_variante(campo, largura, extensao='jpg'):
+    # URL da menor cópia com pelo menos `largura` px (ou a maior que houver)
+    if not campo:
+        return ''
+    copias = variantes(campo)
+    if not copias:
+        return campo.url
+    for url, largura_copia in copias[extensao]:
+        if largura_copia >= largura:
+            return url
+    return copias[extensao][-1][0]
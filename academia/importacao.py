@@ -0,0 +1,112 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from import_export import widgets
+
+# =======================================================
+# IMPORTAÇÃO EM LOTE (PLANILHAS DE ALUNOS E MATRÍCULAS)
+# Antes, cada linha da planilha fazia suas próprias consultas (get_or_create do
+# usuário, get do aluno, get do curso) e calculava um PBKDF2 para a senha:
+# 2.000 linhas levavam minutos e o admin estourava o tempo.
+# Aqui a planilha é lida uma vez no before_import: o que já existe vem do banco
+# em poucas consultas (username IN (...)), os usuários novos entram num
+# bulk_create e cada senha diferente é calculada uma única vez. As linhas só
+# consultam dicionários; alunos e matrículas são gravados em lotes.
+# =======================================================
+
+SENHA_PADRAO = '123456'
+TAMANHO_LOTE = getattr(settings, 'IMPORTACAO_TAMANHO_LOTE', 500)
+# Quantos valores por "IN (...)" (o SQLite limita o número de parâmetros)
+TAMANHO_CONSULTA = 500
+# Threads para calcular senhas diferentes (o hashlib solta o GIL no PBKDF2)
+TRABALHADORES_SENHA = getattr(settings, 'IMPORTACAO_TRABALHADORES_SENHA', min(8, os.cpu_count() or 1))
+
+
+def texto(valor):
+    # Célula da planilha como texto limpo (None/vazio viram '')
+    if valor is None:
+        return ''
+    return str(valor).strip()
+
+
+def em_blocos(valores, tamanho=TAMANHO_CONSULTA):
+    valores = list(valores)
+    for inicio in range(0, len(valores), tamanho):
+        yield valores[inicio:inicio + tamanho]
+
+
+def hashes_das_senhas(senhas):
+    # {senha: hash}. Cada senha distinta é calculada uma vez (quase sempre é só
+    # a senha padrão); se a planilha trouxer senhas diferentes, em paralelo
+    distintas = list(set(senhas))
+    if len(distintas) <= 1:
+        return {senha: make_password(senha) for senha in distintas}
+    with ThreadPoolExecutor(max_workers=TRABALHADORES_SENHA) as executor:
+        return dict(zip(distintas, executor.map(make_password, distintas)))
+
+
+def preparar_usuarios(dataset):
+    # Devolve {username: User} de todos os usernames da planilha, criando os
+    # que faltam (com first_name e senha da primeira linha em que aparecem)
+    if 'username' not in (dataset.headers or []):
+        return {}
+
+    dados = {}
+    for linha in dataset.dict:
+        username = texto(linha.get('username'))
+        if username and username not in dados:
+            dados[username] = (texto(linha.get('first_name')), texto(linha.get('password')) or SENHA_PADRAO)
+
+    usuarios = {}
+    for bloco in em_blocos(dados):
+        usuarios.update((u.username, u) for u in User.objects.filter(username__in=bloco))
+
+    novos = [username for username in dados if username not in usuarios]
+    if novos:
+        hashes = hashes_das_senhas(dados[username][1] for username in novos)
+        criados = User.objects.bulk_create(
+            [
+                User(username=username, first_name=dados[username][0], is_active=True, password=hashes[dados[username][1]])
+                for username in novos
+            ],
+            batch_size=TAMANHO_LOTE,
+        )
+        if all(u.pk for u in criados):
+            usuarios.update((u.username, u) for u in criados)
+        else:
+            # Bancos que não devolvem o id no bulk_create (MySQL): busca de novo
+            for bloco in em_blocos(novos):
+                usuarios.update((u.username, u) for u in User.objects.filter(username__in=bloco))
+    return usuarios
+
+
+def cursos_por_nome(nomes):
+    # {nome em minúsculas: Curso}. Os cursos são poucos: lê todos de uma vez e
+    # cria só os que a planilha cita e ainda não existem (um create por curso novo)
+    from .models import Curso
+
+    cursos = {}
+    for curso in Curso.objects.order_by('id'):
+        cursos.setdefault(curso.nome.strip().lower(), curso)
+    for nome in nomes:
+        chave = nome.lower()
+        if nome and chave not in cursos:
+            cursos[chave] = Curso.objects.create(nome=nome)
+    return cursos
+
+
+class ChavePreCarregada(widgets.ForeignKeyWidget):
+    # ForeignKeyWidget que resolve o id pelos objetos já carregados no
+    # before_import, sem uma consulta por linha (cai no normal se não achar)
+
+    def __init__(self, model, field='pk', **kwargs):
+        super().__init__(model, field, **kwargs)
+        self.objetos = {}
+
+    def clean(self, value, row=None, **kwargs):
+        try:
+            return self.objetos[int(value)]
+        except (KeyError, TypeError, ValueError):
+            return super().clean(value, row, **kwargs)
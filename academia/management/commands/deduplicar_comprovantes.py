@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+
+from academia.armazenamento import armazenamento_comprovantes
+from academia.models import Pagamento, Doacao, Despesa
+
+
+def _tamanho_legivel(qtd):
+    for unidade in ('B', 'KB', 'MB'):
+        if qtd < 1024:
+            return f"{qtd:.0f} {unidade}"
+        qtd /= 1024
+    return f"{qtd:.1f} GB"
+
+
+class Command(BaseCommand):
+    help = (
+        "Move os comprovantes já enviados (pagamentos, doações e despesas) para o "
+        "armazenamento por conteúdo: arquivos repetidos viram um só (hardlink) e, "
+        "com --comprimir, fotos grandes são reduzidas. Mostra o espaço liberado."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--comprimir', action='store_true', help="Também reduz fotos grandes e tira o EXIF.")
+
+    def handle(self, *args, **options):
+        armazenamento = armazenamento_comprovantes()
+        total_arquivos = 0
+        total_liberado = 0
+
+        for modelo in (Pagamento, Doacao, Despesa):
+            nomes = (
+                modelo.objects.exclude(comprovante='').exclude(comprovante__isnull=True)
+                .values_list('comprovante', flat=True).distinct().iterator()
+            )
+            liberado = 0
+            qtd = 0
+            for nome in nomes:
+                liberado += armazenamento.incorporar(nome, comprimir_imagem=options['comprimir'])
+                qtd += 1
+            total_arquivos += qtd
+            total_liberado += liberado
+            self.stdout.write(f"{modelo.__name__}: {qtd} arquivo(s), {_tamanho_legivel(liberado)} liberado(s).")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Pronto: {total_arquivos} comprovante(s) verificados, {_tamanho_legivel(total_liberado)} de espaço liberado."
+        ))
@@ -0,0 +1,31 @@
+import time
+from django.core.management.base import BaseCommand
+
+from academia import mensageria
+
+
+class Command(BaseCommand):
+    help = (
+        "Envia as mensagens pendentes da caixa de saída (campanhas de cobrança) pelo enviador "
+        "configurado em MENSAGENS_ENVIADOR, respeitando MENSAGENS_POR_MINUTO. "
+        "Com --continuo fica rodando e verifica a fila de tempos em tempos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limite', type=int, help="Máximo de mensagens nesta execução.")
+        parser.add_argument('--por-minuto', type=int, default=mensageria.POR_MINUTO)
+        parser.add_argument('--continuo', action='store_true', help="Não para quando a fila esvazia.")
+        parser.add_argument('--intervalo', type=int, default=30, help="Segundos entre verificações no modo contínuo.")
+
+    def handle(self, *args, **options):
+        enviador = mensageria.obter_enviador()
+        while True:
+            contagem = mensageria.processar_fila(enviador, limite=options['limite'], por_minuto=options['por_minuto'])
+            if contagem or not options['continuo']:
+                self.stdout.write(
+                    f"{contagem['enviadas']} enviadas, {contagem['falhas']} com falha (voltam para a fila), "
+                    f"{contagem['desistidas']} desistidas."
+                )
+            if not options['continuo']:
+                break
+            time.sleep(options['intervalo'])
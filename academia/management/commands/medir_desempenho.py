@@ -0,0 +1,64 @@
+import json
+from pathlib import Path
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from academia.desempenho import CENARIOS, comparar, medir
+
+PASTA = Path(settings.BASE_DIR) / 'desempenho'
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede tempo, consultas SQL e pico de memória das telas mais pesadas na base atual "
+        "(gere antes com popular_escala), grava o resultado em JSON e compara com a base de "
+        "referência. Termina com erro se alguma tela piorou além da tolerância."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticoes', type=int, default=5)
+        parser.add_argument('--tolerancia', type=float, default=0.2, help="Quanto o tempo/memória pode crescer (0.2 = 20%%).")
+        parser.add_argument('--saida', default=str(PASTA / 'resultado.json'))
+        parser.add_argument('--base', default=str(PASTA / 'base.json'), help="JSON de referência para comparar.")
+        parser.add_argument('--gravar-base', action='store_true', help="Grava o resultado como nova referência.")
+        parser.add_argument('--telas', nargs='*', help="Só estas telas (nomes dos cenários).")
+
+    def handle(self, *args, **options):
+        cenarios = CENARIOS
+        if options['telas']:
+            nomes = {c.nome for c in CENARIOS}
+            desconhecidas = set(options['telas']) - nomes
+            if desconhecidas:
+                raise CommandError(f"Telas desconhecidas: {', '.join(sorted(desconhecidas))}. Opções: {', '.join(sorted(nomes))}.")
+            cenarios = [c for c in CENARIOS if c.nome in options['telas']]
+
+        # O Client de teste precisa do 'testserver' no ALLOWED_HOSTS
+        setup_test_environment()
+        try:
+            resultado = medir(cenarios, options['repeticoes'], saida=self.stdout.write)
+        finally:
+            teardown_test_environment()
+
+        destino = Path(options['base'] if options['gravar_base'] else options['saida'])
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        destino.write_text(json.dumps(resultado, indent=2, ensure_ascii=False) + '\n', encoding='utf-8')
+        self.stdout.write(f"Resultado gravado em {destino}.")
+        if options['gravar_base']:
+            return
+
+        caminho_base = Path(options['base'])
+        if not caminho_base.exists():
+            self.stdout.write(self.style.WARNING("Sem base de referência para comparar (use --gravar-base)."))
+            return
+        base = json.loads(caminho_base.read_text(encoding='utf-8'))
+        if base.get('volume') != resultado['volume'] or base.get('banco') != resultado['banco']:
+            self.stdout.write(self.style.WARNING(
+                f"A base de referência foi medida com outro volume/banco ({base.get('banco')}, {base.get('volume')}); "
+                "a comparação pode não valer."
+            ))
+
+        regressoes = comparar(resultado, base, options['tolerancia'])
+        if regressoes:
+            raise CommandError("Regressões de desempenho:\n  " + "\n  ".join(regressoes))
+        self.stdout.write(self.style.SUCCESS(f"Nenhuma tela piorou além de {options['tolerancia']:.0%} da referência."))
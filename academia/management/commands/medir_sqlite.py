@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from academia.medicao_sqlite import CONFIGURACOES, medir
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara leituras/s, escritas/s e erros de \"database is locked\" do SQLite padrão do "
+        "Django com o SQLite ajustado (WAL, PRAGMAs, BEGIN IMMEDIATE e trava de escrita), "
+        "com leitores e escritores em paralelo num banco de teste."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--leitores', type=int, default=4)
+        parser.add_argument('--escritores', type=int, default=4)
+        parser.add_argument('--segundos', type=float, default=5)
+        parser.add_argument('--configuracoes', nargs='*', choices=sorted(CONFIGURACOES), default=list(CONFIGURACOES))
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{options['leitores']} leitores e {options['escritores']} escritores por {options['segundos']:g}s em cada configuração.\n"
+        )
+        self.stdout.write(f"{'':10} {'leituras/s':>11} {'escritas/s':>11} {'erros leit.':>12} {'erros escr.':>12} {'escrita med.':>13} {'escrita máx.':>13}")
+        for configuracao in options['configuracoes']:
+            r = medir(configuracao, options['leitores'], options['escritores'], options['segundos'])
+            self.stdout.write(
+                f"{configuracao:10} {r['leituras_s']:>11} {r['escritas_s']:>11} {r['erros_leitura']:>12} "
+                f"{r['erros_escrita']:>12} {r['escrita_mediana_ms']:>10} ms {r['escrita_max_ms']:>10} ms"
+            )
@@ -0,0 +1,57 @@
+import time
+from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from academia.escala import ConfiguracaoEscala, GeradorEscala
+
+
+class Command(BaseCommand):
+    help = (
+        "Gera uma base sintética com volume de produção (alunos, cursos, matrículas, "
+        "anos de chamadas, pagamentos, folha, doações e despesas) para medir as telas. "
+        "A mesma --semente gera sempre a mesma base. Use num banco de teste: os dados são somados aos existentes."
+    )
+
+    def add_arguments(self, parser):
+        padrao = ConfiguracaoEscala()
+        parser.add_argument('--alunos', type=int, default=padrao.alunos)
+        parser.add_argument('--professores', type=int, default=padrao.professores)
+        parser.add_argument('--cursos', type=int, default=padrao.cursos)
+        parser.add_argument('--anos', type=int, default=padrao.anos, help="Quantos anos de histórico (até a data final).")
+        parser.add_argument('--ate', help="Data final do histórico (AAAA-MM-DD). Padrão: hoje.")
+        parser.add_argument('--semente', type=int, default=padrao.semente)
+        parser.add_argument('--matriculas-por-aluno', type=float, default=padrao.matriculas_por_aluno, help="Média de cursos por aluno.")
+        parser.add_argument('--evasao', type=float, default=padrao.evasao, help="Fração das matrículas que foram desligadas.")
+        parser.add_argument('--faltas', type=float, default=padrao.faltas, help="Taxa média de faltas (0 a 1).")
+        parser.add_argument('--inadimplencia', type=float, default=padrao.inadimplencia, help="Fração média de mensalidades em aberto (0 a 1).")
+        parser.add_argument('--bolsistas', type=float, default=padrao.bolsistas, help="Fração de alunos bolsistas.")
+        parser.add_argument('--sem-horario', type=float, default=padrao.sem_horario, help="Fração das matrículas sem dia/hora definidos.")
+        parser.add_argument('--mensalidade', type=Decimal, default=padrao.mensalidade)
+        parser.add_argument('--doacoes-por-mes', type=int, default=padrao.doacoes_por_mes)
+        parser.add_argument('--despesas-por-mes', type=int, default=padrao.despesas_por_mes)
+        parser.add_argument('--lote', type=int, default=padrao.lote, help="Linhas por INSERT em lote.")
+
+    def handle(self, *args, **options):
+        ate = None
+        if options['ate']:
+            ate = parse_date(options['ate'])
+            if ate is None:
+                raise CommandError("Data inválida em --ate (use AAAA-MM-DD).")
+        for taxa in ('evasao', 'faltas', 'inadimplencia', 'bolsistas', 'sem_horario'):
+            if not 0 <= options[taxa] <= 1:
+                raise CommandError(f"--{taxa.replace('_', '-')} precisa estar entre 0 e 1.")
+
+        config = ConfiguracaoEscala(
+            alunos=options['alunos'], professores=options['professores'], cursos=options['cursos'],
+            anos=options['anos'], semente=options['semente'], ate=ate,
+            matriculas_por_aluno=options['matriculas_por_aluno'], evasao=options['evasao'],
+            faltas=options['faltas'], inadimplencia=options['inadimplencia'], bolsistas=options['bolsistas'],
+            sem_horario=options['sem_horario'], mensalidade=options['mensalidade'],
+            doacoes_por_mes=options['doacoes_por_mes'], despesas_por_mes=options['despesas_por_mes'],
+            lote=options['lote'],
+        )
+        inicio = time.perf_counter()
+        contagem = GeradorEscala(config, saida=self.stdout.write).gerar()
+        resumo = ', '.join(f"{quantidade} {modelo}" for modelo, quantidade in contagem.items())
+        self.stdout.write(self.style.SUCCESS(f"Base gerada em {time.perf_counter() - inicio:.1f}s: {resumo}."))
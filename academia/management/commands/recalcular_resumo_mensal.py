@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from academia.resumo import reconstruir_tudo
+
+
+class Command(BaseCommand):
+    help = "Apaga e recalcula do zero a tabela ResumoMensal a partir de pagamentos, doações, folha, despesas e matrículas."
+
+    def handle(self, *args, **options):
+        total = reconstruir_tudo()
+        self.stdout.write(self.style.SUCCESS(f"Resumo mensal recalculado: {total} mês(es)."))
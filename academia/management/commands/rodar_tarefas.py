@@ -0,0 +1,32 @@
+import threading
+from django.core.management.base import BaseCommand, CommandError
+
+from academia import tarefas
+
+
+class Command(BaseCommand):
+    help = (
+        "Executa as tarefas em segundo plano (folha, importações, relatórios, fechamento, envio de "
+        "mensagens) guardadas no banco. Sem --continuo, para quando a fila esvazia (bom para cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--trabalhadores', type=int, default=tarefas.TRABALHADORES, help="Quantas tarefas ao mesmo tempo.")
+        parser.add_argument('--modo', choices=['thread', 'processo'], default='thread', help="Trabalhadores em threads ou em processos separados.")
+        parser.add_argument('--continuo', action='store_true', help="Não para quando a fila esvazia.")
+        parser.add_argument('--intervalo', type=int, default=tarefas.INTERVALO, help="Segundos entre verificações da fila vazia.")
+
+    def handle(self, *args, **options):
+        if options['trabalhadores'] < 1:
+            raise CommandError("--trabalhadores precisa ser pelo menos 1.")
+        parar = threading.Event()
+        try:
+            executadas = tarefas.rodar(
+                options['trabalhadores'], options['modo'],
+                continuo=options['continuo'], intervalo=options['intervalo'], parar=parar,
+            )
+        except KeyboardInterrupt:
+            # rodar() já avisou as threads, que terminaram a tarefa em andamento
+            self.stdout.write("Trabalhadores encerrados.")
+            return
+        self.stdout.write(self.style.SUCCESS(f"{executadas} tarefa(s) executada(s)."))
@@ -0,0 +1,136 @@
+import random
+import statistics
+import tempfile
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from django.db import DatabaseError, connections, transaction
+from django.db.utils import load_backend
+
+# =======================================================
+# MEDIÇÃO DO SQLITE: PADRÃO x AJUSTADO (python manage.py medir_sqlite)
+# Cria um banco de teste em arquivo para cada configuração e põe leitores e
+# escritores (threads, como os workers do servidor e do rodar_tarefas) para
+# disputar o mesmo arquivo durante alguns segundos. Mede:
+#   - leituras/s e escritas/s que terminaram;
+#   - escritas que falharam com "database is locked";
+#   - tempo máximo de uma escrita (espera na fila incluída).
+# A escrita imita o caso comum do sistema: dentro de um atomic, lê a linha e
+# depois grava (como um get() seguido de save()).
+# =======================================================
+
+CONFIGURACOES = {
+    # O que o projeto usava antes: sqlite3 do Django sem ajuste nenhum
+    'padrao': {'ENGINE': 'django.db.backends.sqlite3', 'OPTIONS': {}},
+    # O que está em config/settings.py
+    'ajustado': {'ENGINE': 'academia.banco_sqlite', 'OPTIONS': {'transaction_mode': 'IMMEDIATE'}},
+}
+
+LINHAS = 10000
+FAIXA_LEITURA = 200
+
+
+def abrir(configuracao, caminho, apelido):
+    # Conexão avulsa (fora do settings.DATABASES) com a configuração pedida,
+    # registrada só na thread atual para que transaction.atomic(using=apelido) funcione
+    dados = dict(connections['default'].settings_dict)
+    dados.update(CONFIGURACOES[configuracao], NAME=str(caminho), CONN_MAX_AGE=0, TEST={})
+    banco = load_backend(dados['ENGINE']).DatabaseWrapper(dados, apelido)
+    connections[apelido] = banco
+    return banco
+
+
+def fechar(banco):
+    banco.close()
+    del connections[banco.alias]
+
+
+def _criar_tabela(configuracao, caminho, apelido):
+    banco = abrir(configuracao, caminho, apelido)
+    try:
+        with transaction.atomic(using=apelido), banco.cursor() as cursor:
+            cursor.execute("CREATE TABLE medicao (id INTEGER PRIMARY KEY, valor INTEGER NOT NULL, texto TEXT NOT NULL)")
+            cursor.executemany(
+                "INSERT INTO medicao (id, valor, texto) VALUES (%s, %s, %s)",
+                [(i, 0, 'x' * 100) for i in range(1, LINHAS + 1)],
+            )
+    finally:
+        fechar(banco)
+
+
+def _leitor(configuracao, caminho, apelido, parar, resultado):
+    banco = abrir(configuracao, caminho, apelido)
+    sorteio = random.Random(apelido)
+    try:
+        while not parar.is_set():
+            inicio = sorteio.randint(1, LINHAS - FAIXA_LEITURA)
+            try:
+                with banco.cursor() as cursor:
+                    cursor.execute(
+                        "SELECT COUNT(*), SUM(valor) FROM medicao WHERE id BETWEEN %s AND %s",
+                        [inicio, inicio + FAIXA_LEITURA],
+                    )
+                    cursor.fetchone()
+            except DatabaseError:
+                resultado['erros_leitura'] += 1
+            else:
+                resultado['leituras'] += 1
+    finally:
+        fechar(banco)
+
+
+def _escritor(configuracao, caminho, apelido, parar, resultado, tempos):
+    banco = abrir(configuracao, caminho, apelido)
+    sorteio = random.Random(apelido)
+    try:
+        while not parar.is_set():
+            linha = sorteio.randint(1, LINHAS)
+            comeco = time.perf_counter()
+            try:
+                with transaction.atomic(using=apelido), banco.cursor() as cursor:
+                    cursor.execute("SELECT valor FROM medicao WHERE id = %s", [linha])
+                    valor = cursor.fetchone()[0]
+                    cursor.execute("UPDATE medicao SET valor = %s WHERE id = %s", [valor + 1, linha])
+            except DatabaseError:
+                resultado['erros_escrita'] += 1
+            else:
+                resultado['escritas'] += 1
+            tempos.append(time.perf_counter() - comeco)
+    finally:
+        fechar(banco)
+
+
+def medir(configuracao, leitores=4, escritores=4, segundos=5):
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = Path(pasta) / f'{configuracao}.sqlite3'
+        _criar_tabela(configuracao, caminho, f'medicao_{configuracao}')
+
+        # Cada thread conta no seu Counter (somados no fim)
+        parar = threading.Event()
+        contagens = [Counter() for _ in range(leitores + escritores)]
+        tempos = []
+        threads = [
+            threading.Thread(target=_leitor, args=(configuracao, caminho, f'medicao_{configuracao}_l{i}', parar, contagens[i]))
+            for i in range(leitores)
+        ] + [
+            threading.Thread(target=_escritor, args=(configuracao, caminho, f'medicao_{configuracao}_e{i}', parar, contagens[leitores + i], tempos))
+            for i in range(escritores)
+        ]
+        for thread in threads:
+            thread.start()
+        time.sleep(segundos)
+        parar.set()
+        for thread in threads:
+            thread.join()
+
+    resultado = sum(contagens, Counter())
+    return {
+        'configuracao': configuracao,
+        'leituras_s': round(resultado['leituras'] / segundos, 1),
+        'escritas_s': round(resultado['escritas'] / segundos, 1),
+        'erros_leitura': resultado['erros_leitura'],
+        'erros_escrita': resultado['erros_escrita'],
+        'escrita_mediana_ms': round(statistics.median(tempos) * 1000, 2) if tempos else None,
+        'escrita_max_ms': round(max(tempos) * 1000, 1) if tempos else None,
+    }
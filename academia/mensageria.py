@@ -0,0 +1,209 @@
+import datetime
+import json
+import logging
+import re
+import time
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+from django.conf import settings
+from django.db.models import Count
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from . import cobranca
+from .models import MensagemSaida
+
+logger = logging.getLogger('academia.mensageria')
+
+# =======================================================
+# MENSAGENS DE COBRANÇA EM LOTE (CAIXA DE SAÍDA)
+# Em vez de a secretaria abrir um link do WhatsApp por família, a campanha
+# inteira é montada no servidor:
+#   1. enfileirar_cobranca(): pega a lista de inadimplentes (cobranca.py),
+#      personaliza o texto da MensagemPadrao para cada família e grava tudo
+#      na MensagemSaida de uma vez (bulk_create);
+#   2. processar_fila() (python manage.py enviar_mensagens, em segundo plano):
+#      entrega as pendentes pelo enviador configurado, no máximo
+#      MENSAGENS_POR_MINUTO, e tenta de novo com espera crescente quando falha.
+#
+# O texto da MensagemPadrao aceita [NOME] (responsável, ou o aluno), [ALUNO]
+# e [CURSO], e também {nome}, {aluno} e {curso}. Ele é "compilado" uma vez em
+# pedaços fixos + campos, e cada mensagem é só uma junção de strings.
+#
+# O enviador é uma classe com enviar(mensagem), escolhida em
+# MENSAGENS_ENVIADOR. O padrão (EnviadorArquivo) não manda nada: grava as
+# mensagens em arquivo, para desenvolvimento e testes.
+# =======================================================
+
+ENVIADOR = getattr(settings, 'MENSAGENS_ENVIADOR', 'academia.mensageria.EnviadorArquivo')
+PASTA_ARQUIVO = Path(getattr(settings, 'MENSAGENS_PASTA_ARQUIVO', Path(settings.BASE_DIR) / 'mensagens_enviadas'))
+POR_MINUTO = getattr(settings, 'MENSAGENS_POR_MINUTO', 20)
+MAXIMO_TENTATIVAS = getattr(settings, 'MENSAGENS_MAXIMO_TENTATIVAS', 5)
+# Espera depois da 1ª falha; dobra a cada nova falha
+ESPERA_TENTATIVA = datetime.timedelta(seconds=getattr(settings, 'MENSAGENS_ESPERA_TENTATIVA', 60))
+# Mensagem "Enviando" há mais tempo que isso é de um envio que caiu no meio: volta para a fila
+TEMPO_TRAVA = datetime.timedelta(minutes=10)
+TAMANHO_LOTE = 100
+
+TEXTO_PADRAO = 'Olá, tudo bem? Não identificamos seu pagamento.'
+
+_CAMPOS = re.compile(r'\[(NOME|ALUNO|CURSO)\]|\{(nome|aluno|curso)\}', re.IGNORECASE)
+
+
+class ErroEnvio(Exception):
+    pass
+
+
+class MensagemCompilada:
+    def __init__(self, texto):
+        # [(texto fixo, campo ou None), ...]
+        self.partes = []
+        posicao = 0
+        for achado in _CAMPOS.finditer(texto):
+            campo = (achado.group(1) or achado.group(2)).lower()
+            self.partes.append((texto[posicao:achado.start()], campo))
+            posicao = achado.end()
+        self.partes.append((texto[posicao:], None))
+
+    def renderizar(self, dados):
+        # dados: {'nome': ..., 'aluno': ..., 'curso': ...}
+        return ''.join(fixo + (dados.get(campo) or '' if campo else '') for fixo, campo in self.partes)
+
+
+@lru_cache(maxsize=64)
+def compilar(texto):
+    return MensagemCompilada(texto)
+
+
+def nome_da_campanha(ano, mes):
+    return f'cobranca-{ano}-{int(mes):02d}'
+
+
+def enfileirar_cobranca(ano, mes, modelo=None, meses_atraso=1, excluir_bolsistas=True, campanha=None):
+    # Grava na caixa de saída uma mensagem por inadimplente com telefone.
+    # Quem já está na mesma campanha não é duplicado.
+    # Devolve (mensagens novas, inadimplentes sem telefone).
+    campanha = campanha or nome_da_campanha(ano, mes)
+    compilada = compilar(modelo.texto if modelo else TEXTO_PADRAO)
+
+    mensagens, sem_telefone = [], 0
+    for devedor in cobranca.lista_inadimplentes(ano, mes, meses_atraso=meses_atraso, excluir_bolsistas=excluir_bolsistas):
+        if not devedor['fone_link']:
+            sem_telefone += 1
+            continue
+        texto = compilada.renderizar({
+            'nome': devedor['nome_tratamento'],
+            'aluno': devedor['nome_aluno_msg'],
+            'curso': devedor['nome_cursos'],
+        })
+        mensagens.append(MensagemSaida(
+            campanha=campanha, aluno_id=devedor['id'], modelo=modelo,
+            telefone=devedor['fone_link'], texto=texto,
+        ))
+
+    antes = MensagemSaida.objects.filter(campanha=campanha).count()
+    MensagemSaida.objects.bulk_create(mensagens, batch_size=500, ignore_conflicts=True)
+    novas = MensagemSaida.objects.filter(campanha=campanha).count() - antes
+    return novas, sem_telefone
+
+
+def situacao_da_fila():
+    # {status: quantidade} de toda a caixa de saída (uma consulta)
+    contagem = dict.fromkeys(dict(MensagemSaida.STATUS_CHOICES), 0)
+    for status, total in MensagemSaida.objects.values_list('status').annotate(total=Count('id')).order_by():
+        contagem[status] = total
+    return contagem
+
+
+# -------------------------------------------------------
+# Enviadores
+# -------------------------------------------------------
+
+class EnviadorArquivo:
+    # Não envia nada: acrescenta cada mensagem (JSON, uma por linha) em
+    # <PASTA_ARQUIVO>/<campanha>.jsonl
+    def __init__(self, pasta=None):
+        self.pasta = Path(pasta or PASTA_ARQUIVO)
+
+    def enviar(self, mensagem):
+        self.pasta.mkdir(parents=True, exist_ok=True)
+        linha = {'id': mensagem.id, 'telefone': mensagem.telefone, 'texto': mensagem.texto}
+        with open(self.pasta / f'{mensagem.campanha}.jsonl', 'a', encoding='utf-8') as arquivo:
+            arquivo.write(json.dumps(linha, ensure_ascii=False) + '\n')
+
+
+def obter_enviador():
+    return import_string(ENVIADOR)()
+
+
+# -------------------------------------------------------
+# Envio (esvaziar a fila)
+# -------------------------------------------------------
+
+def liberar_travadas():
+    # Devolve para a fila as mensagens de um envio que parou no meio
+    return MensagemSaida.objects.filter(
+        status=MensagemSaida.ENVIANDO, enviar_a_partir_de__lt=timezone.now(),
+    ).update(status=MensagemSaida.PENDENTE)
+
+
+def _reservar(mensagem):
+    # Só um processo pega cada mensagem (UPDATE condicional)
+    return MensagemSaida.objects.filter(id=mensagem.id, status=MensagemSaida.PENDENTE).update(
+        status=MensagemSaida.ENVIANDO, enviar_a_partir_de=timezone.now() + TEMPO_TRAVA,
+    ) == 1
+
+
+def _enviar(enviador, mensagem):
+    mensagem.tentativas += 1
+    try:
+        enviador.enviar(mensagem)
+    except Exception as erro:
+        logger.warning("Falha ao enviar mensagem %s (tentativa %s): %s", mensagem.id, mensagem.tentativas, erro)
+        mensagem.ultimo_erro = str(erro)[:1000] or erro.__class__.__name__
+        if mensagem.tentativas >= MAXIMO_TENTATIVAS:
+            mensagem.status = MensagemSaida.ERRO
+            resultado = 'desistidas'
+        else:
+            mensagem.status = MensagemSaida.PENDENTE
+            mensagem.enviar_a_partir_de = timezone.now() + ESPERA_TENTATIVA * 2 ** (mensagem.tentativas - 1)
+            resultado = 'falhas'
+    else:
+        mensagem.status = MensagemSaida.ENVIADA
+        mensagem.enviada_em = timezone.now()
+        mensagem.ultimo_erro = ''
+        resultado = 'enviadas'
+    mensagem.save(update_fields=['status', 'tentativas', 'enviar_a_partir_de', 'ultimo_erro', 'enviada_em'])
+    return resultado
+
+
+def processar_fila(enviador=None, limite=None, por_minuto=POR_MINUTO, dormir=time.sleep):
+    # Envia as mensagens pendentes e liberadas (até `limite`), respeitando
+    # `por_minuto`. Devolve a contagem: enviadas, falhas (voltam para a fila)
+    # e desistidas (passaram de MAXIMO_TENTATIVAS).
+    enviador = enviador or obter_enviador()
+    intervalo = 60 / por_minuto if por_minuto else 0
+    contagem = Counter()
+    ultimo_envio = None
+    liberar_travadas()
+
+    while limite is None or sum(contagem.values()) < limite:
+        lote = list(
+            MensagemSaida.objects.filter(status=MensagemSaida.PENDENTE, enviar_a_partir_de__lte=timezone.now())
+            .order_by('enviar_a_partir_de', 'id')[:TAMANHO_LOTE]
+        )
+        if not lote:
+            break
+        for mensagem in lote:
+            if limite is not None and sum(contagem.values()) >= limite:
+                break
+            if not _reservar(mensagem):
+                continue  # outro processo pegou
+            if ultimo_envio is not None:
+                espera = intervalo - (time.monotonic() - ultimo_envio)
+                if espera > 0:
+                    dormir(espera)
+            ultimo_envio = time.monotonic()
+            contagem[_enviar(enviador, mensagem)] += 1
+    return contagem
@@ -0,0 +1,122 @@
+import json
+import logging
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+
+from . import papel, perfilador, replica
+from .consultas import ColetorConsultas, orcamento_da_view
+
+logger = logging.getLogger('academia.consultas')
+
+# =======================================================
+# MIDDLEWARE DE CONSULTAS
+# Mede as consultas SQL de cada requisição e grava um resumo (JSON) no logger
+# 'academia.consultas': view, quantidade, tempo, consultas repetidas e as mais
+# lentas. Vai como WARNING quando a view passa do orçamento declarado
+# (@orcamento_consultas) ou de CONSULTAS_ALERTA; senão, como INFO.
+#
+# Com CONSULTAS_CABECALHO = True, usuários staff recebem o resumo também nos
+# cabeçalhos da resposta (X-Consultas e Server-Timing, que aparece na aba
+# "Rede" do navegador).
+# =======================================================
+
+ALERTA = getattr(settings, 'CONSULTAS_ALERTA', 50)
+CABECALHO = getattr(settings, 'CONSULTAS_CABECALHO', False)
+
+
+class MedidorConsultasMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with ColetorConsultas() as coletor:
+            response = self.get_response(request)
+
+        match = getattr(request, 'resolver_match', None)
+        orcamento = orcamento_da_view(match.func) if match else None
+
+        dados = coletor.resumo()
+        dados.update(
+            view=match.view_name if match else None,
+            caminho=request.path,
+            metodo=request.method,
+            status=response.status_code,
+            orcamento=orcamento,
+        )
+        estourou = coletor.total > (orcamento if orcamento is not None else ALERTA)
+        logger.log(logging.WARNING if estourou else logging.INFO, json.dumps(dados, ensure_ascii=False), extra={'consultas': dados})
+
+        usuario = getattr(request, 'user', None)
+        if CABECALHO and usuario is not None and usuario.is_staff:
+            response['X-Consultas'] = f"{coletor.total}; tempo={dados['tempo_ms']}ms; repetidas={sum(coletor.repetidas().values())}"
+            response['Server-Timing'] = f'db;dur={dados["tempo_ms"]};desc="{coletor.total} consultas"'
+        return response
+
+
+# =======================================================
+# PERFILADOR SOB DEMANDA
+# Usuário staff abre qualquer página com ?perfil=1 e a requisição é perfilada
+# (cProfile + amostrador de pilhas + linha do tempo das consultas; ver
+# academia/perfilador.py). ?perfil=sempre liga o cookie para perfilar as
+# próximas páginas também; ?perfil=0 desliga. Para os outros usuários o
+# parâmetro e o cookie são ignorados.
+# Fica depois do AuthenticationMiddleware (precisa do request.user).
+# =======================================================
+
+class PerfilRequisicaoMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        usuario = getattr(request, 'user', None)
+        if usuario is None or not usuario.is_staff:
+            return self.get_response(request)
+
+        perfilar, cookie = perfilador.pedido_de_perfil(request)
+        if perfilar:
+            response, nome = perfilador.perfilar(request, self.get_response)
+            response['X-Perfil'] = nome
+        else:
+            response = self.get_response(request)
+
+        if cookie == '1':
+            response.set_cookie(perfilador.COOKIE, '1', httponly=True, samesite='Lax', secure=request.is_secure())
+        elif cookie == '':
+            response.delete_cookie(perfilador.COOKIE)
+        return response
+
+
+# =======================================================
+# RÉPLICA: LER O QUE ACABOU DE GRAVAR
+# Depois de um POST (ou outro método que grava), a sessão passa a ler só do
+# banco principal por alguns segundos, mesmo nas views @ler_da_replica
+# (ver academia/replica.py). Sem réplica configurada, não faz nada.
+# Fica depois do SessionMiddleware.
+# =======================================================
+
+class GrudarNoPrincipalMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method not in replica.METODOS_SEGUROS and replica.configurada() and hasattr(request, 'session'):
+            replica.grudar_no_principal(request)
+        return response
+
+
+# =======================================================
+# PAPEL DO USUÁRIO
+# request.role: aluno_id, professor_id, is_staff e os cursos do professor
+# (ver academia/papel.py). É preguiçoso: só vai ao cache/banco se a view ou
+# o template usarem.
+# Fica depois do AuthenticationMiddleware (precisa do request.user).
+# =======================================================
+
+class PapelMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.role = SimpleLazyObject(lambda: papel.papel_do_usuario(request.user))
+        return self.get_response(request)
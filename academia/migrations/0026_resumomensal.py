@@ -0,0 +1,69 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:35
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+
+# Cópia congelada de resumo.FONTES como era nesta migração (o código da
+# aplicação pode mudar depois; a migração não)
+# modelo de origem -> (coluna do resumo, campo de data, filtro, campo somado ou None p/ COUNT)
+FONTES = {
+    'Pagamento': ('receita_mensalidades', 'data_pagamento', {'confirmado': True}, 'valor'),
+    'Doacao': ('receita_doacoes', 'data_doacao', {}, 'valor'),
+    'PagamentoProfessor': ('total_professores', 'data_pagamento_realizado', {'pago': True}, 'valor_total'),
+    'Despesa': ('total_despesas', 'data_despesa', {}, 'valor'),
+    'Matricula': ('novas_matriculas', 'data_inicio', {}, None),
+}
+
+
+def popular_resumo(apps, schema_editor):
+    # Preenche o resumo com o histórico que já existe no banco
+    # (uma consulta agrupada por mês para cada origem)
+    ResumoMensal = apps.get_model('academia', 'ResumoMensal')
+    linhas = {}
+    for nome_modelo, (coluna, campo_data, filtro, campo_valor) in FONTES.items():
+        modelo = apps.get_model('academia', nome_modelo)
+        agregado = Count('id') if campo_valor is None else Sum(campo_valor)
+        grupos = modelo.objects.filter(
+            **filtro, **{f'{campo_data}__isnull': False}
+        ).annotate(
+            periodo=TruncMonth(campo_data)
+        ).values('periodo').annotate(total=agregado).order_by()
+
+        for grupo in grupos:
+            periodo = grupo['periodo']
+            chave = (periodo.year, periodo.month)
+            if chave not in linhas:
+                linhas[chave] = ResumoMensal(ano=chave[0], mes=chave[1])
+            setattr(linhas[chave], coluna, grupo['total'] or 0)
+
+    ResumoMensal.objects.bulk_create(linhas.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academia', '0025_alter_matricula_hora_aula'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumoMensal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ano', models.IntegerField(verbose_name='Ano')),
+                ('mes', models.IntegerField(verbose_name='Mês')),
+                ('receita_mensalidades', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Mensalidades Confirmadas')),
+                ('receita_doacoes', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Doações')),
+                ('total_professores', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Folha Paga aos Professores')),
+                ('total_despesas', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Despesas Extras')),
+                ('novas_matriculas', models.IntegerField(default=0, verbose_name='Novas Matrículas')),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['ano', 'mes'],
+                'constraints': [models.UniqueConstraint(fields=('ano', 'mes'), name='resumo_mensal_unico_por_mes')],
+            },
+        ),
+        migrations.RunPython(popular_resumo, migrations.RunPython.noop),
+    ]
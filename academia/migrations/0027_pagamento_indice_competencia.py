@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academia', '0026_resumomensal'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pagamento',
+            index=models.Index(fields=['aluno', 'ano', 'mes', 'confirmado'], name='pagamento_aluno_competencia'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academia', '0027_pagamento_indice_competencia'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='curso',
+            name='valor_por_aluno',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, verbose_name='Valor por Aluno na Folha (vazio = valor padrão)'),
+        ),
+    ]
@@ -0,0 +1,66 @@
+from django.db import migrations
+
+# Cópia congelada dos nomes e do formato do índice de academia/busca.py como
+# eram nesta migração (o código da aplicação pode mudar depois; a migração não)
+TABELA_FTS = 'academia_aluno_busca'
+TABELA_VOCAB = 'academia_aluno_busca_vocab'
+
+
+def _so_digitos(texto):
+    return ''.join(filter(str.isdigit, str(texto or '')))
+
+
+def _preencher_indice(cursor, alunos):
+    # Uma linha por aluno: (rowid, texto normalizado, telefone ao contrário)
+    cursor.execute(f"DELETE FROM {TABELA_FTS}")
+    cursor.executemany(
+        f"INSERT INTO {TABELA_FTS}(rowid, texto, fone_rev) VALUES (%s, %s, %s)",
+        [(pk, texto or '', _so_digitos(fone)[::-1]) for pk, texto, fone in alunos],
+    )
+
+
+def criar_indices_busca(apps, schema_editor):
+    conexao = schema_editor.connection
+
+    if conexao.vendor == 'postgresql':
+        # LIKE '%termo%' e similaridade passam a usar o índice GIN de trigramas
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS academia_aluno_busca_trgm "
+            "ON academia_aluno USING gin (busca_normalizada gin_trgm_ops)"
+        )
+
+    elif conexao.vendor == 'sqlite':
+        with conexao.cursor() as cursor:
+            try:
+                cursor.execute(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABELA_FTS} "
+                    "USING fts5(texto, fone_rev, tokenize='unicode61 remove_diacritics 2')"
+                )
+            except Exception:
+                # SQLite compilado sem FTS5: a busca continua com o LIKE antigo
+                return
+            cursor.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABELA_VOCAB} USING fts5vocab({TABELA_FTS}, row)")
+
+            Aluno = apps.get_model('academia', 'Aluno')
+            _preencher_indice(cursor, Aluno.objects.values_list('id', 'busca_normalizada', 'telefone').iterator())
+
+
+def remover_indices_busca(apps, schema_editor):
+    conexao = schema_editor.connection
+    if conexao.vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS academia_aluno_busca_trgm")
+    elif conexao.vendor == 'sqlite':
+        schema_editor.execute(f"DROP TABLE IF EXISTS {TABELA_VOCAB}")
+        schema_editor.execute(f"DROP TABLE IF EXISTS {TABELA_FTS}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academia', '0028_curso_valor_por_aluno'),
+    ]
+
+    operations = [
+        migrations.RunPython(criar_indices_busca, remover_indices_busca),
+    ]
@@ -0,0 +1,33 @@
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def remover_duplicadas(apps, schema_editor):
+    # Antes da restrição única, cliques simultâneos podiam gravar a mesma aula
+    # duas vezes. Fica a marcação mais recente (maior id) de cada matrícula/dia.
+    Presenca = apps.get_model('academia', 'Presenca')
+    grupos = (
+        Presenca.objects.values('matricula_id', 'data_aula')
+        .annotate(qtd=Count('id'), manter=Max('id'))
+        .filter(qtd__gt=1)
+        .order_by()
+    )
+    for grupo in grupos:
+        Presenca.objects.filter(
+            matricula_id=grupo['matricula_id'], data_aula=grupo['data_aula']
+        ).exclude(id=grupo['manter']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academia', '0029_indices_busca'),
+    ]
+
+    operations = [
+        migrations.RunPython(remover_duplicadas, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='presenca',
+            constraint=models.UniqueConstraint(fields=('matricula', 'data_aula'), name='presenca_unica_por_aula'),
+        ),
+    ]
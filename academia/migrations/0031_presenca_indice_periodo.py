@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academia', '0030_presenca_unica_por_aula'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='presenca',
+            index=models.Index(fields=['data_aula', 'matricula', 'presente'], name='presenca_data_matricula'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academia', '0031_presenca_indice_periodo'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='despesa',
+            index=models.Index(fields=['data_despesa'], name='despesa_data'),
+        ),
+        migrations.AddIndex(
+            model_name='doacao',
+            index=models.Index(fields=['data_doacao'], name='doacao_data'),
+        ),
+        migrations.AddIndex(
+            model_name='matricula',
+            index=models.Index(fields=['data_inicio'], name='matricula_data_inicio'),
+        ),
+        migrations.AddIndex(
+            model_name='pagamento',
+            index=models.Index(fields=['data_pagamento'], name='pagamento_data'),
+        ),
+        migrations.AddIndex(
+            model_name='pagamentoprofessor',
+            index=models.Index(fields=['data_pagamento_realizado'], name='pgto_professor_data'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:52
+
+import academia.armazenamento
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academia', '0032_indices_datas_periodo'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='despesa',
+            name='comprovante',
+            field=models.ImageField(blank=True, null=True, storage=academia.armazenamento.armazenamento_comprovantes, upload_to='despesas/'),
+        ),
+        migrations.AlterField(
+            model_name='doacao',
+            name='comprovante',
+            field=models.ImageField(blank=True, null=True, storage=academia.armazenamento.armazenamento_comprovantes, upload_to='doacoes/'),
+        ),
+        migrations.AlterField(
+            model_name='pagamento',
+            name='comprovante',
+            field=models.ImageField(blank=True, null=True, storage=academia.armazenamento.armazenamento_comprovantes, upload_to='comprovantes/'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:22
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academia', '0033_comprovantes_por_conteudo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MensagemSaida',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('campanha', models.CharField(max_length=60, verbose_name='Campanha (Ex: cobranca-2026-03)')),
+                ('telefone', models.CharField(max_length=20)),
+                ('texto', models.TextField()),
+                ('status', models.CharField(choices=[('PEN', 'Pendente'), ('ENV', 'Enviando'), ('OK', 'Enviada'), ('ERR', 'Erro (desistiu)')], default='PEN', max_length=3)),
+                ('tentativas', models.PositiveSmallIntegerField(default=0)),
+                ('enviar_a_partir_de', models.DateTimeField(default=django.utils.timezone.now)),
+                ('ultimo_erro', models.TextField(blank=True, default='')),
+                ('criada_em', models.DateTimeField(auto_now_add=True)),
+                ('enviada_em', models.DateTimeField(blank=True, null=True)),
+                ('aluno', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='academia.aluno')),
+                ('modelo', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='academia.mensagempadrao', verbose_name='Mensagem Padrão')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'enviar_a_partir_de'], name='mensagem_saida_fila')],
+                'constraints': [models.UniqueConstraint(fields=('campanha', 'aluno'), name='mensagem_saida_unica_por_campanha')],
+            },
+        ),
+    ]
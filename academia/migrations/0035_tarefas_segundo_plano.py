@@ -0,0 +1,42 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:25
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academia', '0034_caixa_saida_mensagens'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tarefa',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(max_length=50)),
+                ('parametros', models.JSONField(blank=True, default=dict)),
+                ('status', models.CharField(choices=[('PEN', 'Na fila'), ('RUN', 'Rodando'), ('OK', 'Concluída'), ('ERR', 'Erro')], default='PEN', max_length=3)),
+                ('progresso', models.PositiveSmallIntegerField(default=0, verbose_name='Progresso (%)')),
+                ('etapa', models.CharField(blank=True, default='', max_length=200)),
+                ('resultado', models.JSONField(blank=True, null=True)),
+                ('erro', models.TextField(blank=True, default='')),
+                ('tentativas', models.PositiveSmallIntegerField(default=0)),
+                ('maximo_tentativas', models.PositiveSmallIntegerField(default=3)),
+                ('executar_a_partir_de', models.DateTimeField(default=django.utils.timezone.now)),
+                ('travada_ate', models.DateTimeField(blank=True, null=True)),
+                ('criada_em', models.DateTimeField(auto_now_add=True)),
+                ('iniciada_em', models.DateTimeField(blank=True, null=True)),
+                ('terminada_em', models.DateTimeField(blank=True, null=True)),
+                ('criada_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-criada_em'],
+                'indexes': [models.Index(fields=['status', 'executar_a_partir_de'], name='tarefa_fila')],
+            },
+        ),
+    ]
@@ -1,8 +1,12 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 from unidecode import unidecode
 import datetime
 
+from .periodo import PeriodoQuerySet
+from .armazenamento import armazenamento_comprovantes
+
 # =======================================================
 # 1. MODELOS BASE (INDEPENDENTES)
 # =======================================================
@@ -40,7 +44,7 @@ class Aluno(models.Model):
     data_matricula = models.DateField(default=datetime.date.today, verbose_name="Data de Matrícula")
     busca_normalizada = models.TextField(blank=True, null=True, db_index=True)
 
-    def save(self, *args, **kwargs):
+    def calcular_busca_normalizada(self):
         # 1. Pega os dados que queremos buscar (Nome, User, Telefone)
         nome = self.user.first_name if self.user else ""
         usuario = self.user.username if self.user else ""
@@ -50,9 +54,17 @@ class Aluno(models.Model):
         texto_completo = f"{nome} {usuario} {fone}"
         
         # 3. Limpa os acentos e deixa minúsculo (Ex: "João" vira "joao")
-        self.busca_normalizada = unidecode(texto_completo).lower()
+        return unidecode(texto_completo).lower()
+
+    def save(self, *args, **kwargs):
+        # (a importação em lote usa bulk_create e chama o cálculo por conta própria)
+        self.busca_normalizada = self.calcular_busca_normalizada()
         
         super().save(*args, **kwargs)
+
+        # 4. Atualiza o índice de busca (FTS5 no SQLite; no PostgreSQL o GIN se atualiza sozinho)
+        from .busca import indexar_aluno
+        indexar_aluno(self)
         
     def __str__(self):
         return self.user.username
@@ -73,6 +85,11 @@ class Curso(models.Model):
         blank=True
     )
     ativo = models.BooleanField(default=True, verbose_name="Curso Ativo? (Aceita novas matrículas)")
+    # Se vazio, a folha usa o valor padrão (VALOR_POR_ALUNO_PROFESSOR no settings.py)
+    valor_por_aluno = models.DecimalField(
+        max_digits=10, decimal_places=2, null=True, blank=True,
+        verbose_name="Valor por Aluno na Folha (vazio = valor padrão)"
+    )
     def __str__(self):
         return self.nome
 
@@ -119,6 +136,15 @@ class Matricula(models.Model):
     dia_semana = models.CharField(max_length=3, choices=DIAS_CHOICES, null=True, blank=True, verbose_name="Dia")
     hora_aula = models.CharField(max_length=5, choices=HORAS_CHOICES, null=True, blank=True, verbose_name="Hora")
 
+    # Data usada por Matricula.objects.no_mes(ano, mes)
+    CAMPO_PERIODO = 'data_inicio'
+    objects = PeriodoQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['data_inicio'], name='matricula_data_inicio'),
+        ]
+
     def __str__(self):
         status = "ATIVO" if self.ativo else "INATIVO"
         return f"{self.aluno} - {self.curso} ({status})"
@@ -129,6 +155,20 @@ class Presenca(models.Model):
     data_aula = models.DateField(default=datetime.date.today)
     presente = models.BooleanField(default=False)
 
+    CAMPO_PERIODO = 'data_aula'
+    objects = PeriodoQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            # Uma chamada por matrícula e dia (a chamada em lote faz upsert nela)
+            models.UniqueConstraint(fields=['matricula', 'data_aula'], name='presenca_unica_por_aula'),
+        ]
+        indexes = [
+            # Cobre as consultas por período (folha, risco, relatórios): o banco
+            # resolve data + matrícula + presente só pelo índice, sem ler a tabela
+            models.Index(fields=['data_aula', 'matricula', 'presente'], name='presenca_data_matricula'),
+        ]
+
     def __str__(self):
         # Ajustamos o __str__ para usar os dados que vêm da matrícula
         return f"{self.matricula.aluno} - {self.data_aula} - {'Presente' if self.presente else 'Falta'}"
@@ -161,9 +201,20 @@ class Pagamento(models.Model):
     valor = models.DecimalField(max_digits=10, decimal_places=2)
     # default=datetime.now deixa pré-preenchido com hoje, mas permite mudar
     data_pagamento = models.DateField(default=datetime.date.today, verbose_name="Data do Pagamento")
-    comprovante = models.ImageField(upload_to='comprovantes/', blank=True, null=True)
+    comprovante = models.ImageField(upload_to='comprovantes/', storage=armazenamento_comprovantes, blank=True, null=True)
     confirmado = models.BooleanField(default=False)
 
+    CAMPO_PERIODO = 'data_pagamento'
+    objects = PeriodoQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Usado pela cobrança: "este aluno pagou o mês X/ano Y?"
+            models.Index(fields=['aluno', 'ano', 'mes', 'confirmado'], name='pagamento_aluno_competencia'),
+            # Relatórios por período (entradas do mês)
+            models.Index(fields=['data_pagamento'], name='pagamento_data'),
+        ]
+
     def __str__(self):
         return f"{self.get_mes_display()}/{self.ano} - {self.aluno}"
 
@@ -176,6 +227,14 @@ class PagamentoProfessor(models.Model):
     pago = models.BooleanField(default=False)
     data_pagamento_realizado = models.DateTimeField(null=True, blank=True)
 
+    CAMPO_PERIODO = 'data_pagamento_realizado'
+    objects = PeriodoQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['data_pagamento_realizado'], name='pgto_professor_data'),
+        ]
+
     def __str__(self):
         status = "PAGO" if self.pago else "PENDENTE"
         return f"{self.professor} - {self.mes}/{self.ano} - R$ {self.valor_total} ({status})"
@@ -201,7 +260,15 @@ class Doacao(models.Model):
     metodo = models.CharField(max_length=3, choices=METODOS_CHOICES, default='PIX')
     
     descricao = models.CharField(max_length=200, blank=True, null=True, verbose_name="Motivo/Obs")
-    comprovante = models.ImageField(upload_to='doacoes/', blank=True, null=True)
+    comprovante = models.ImageField(upload_to='doacoes/', storage=armazenamento_comprovantes, blank=True, null=True)
+
+    CAMPO_PERIODO = 'data_doacao'
+    objects = PeriodoQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['data_doacao'], name='doacao_data'),
+        ]
 
     def __str__(self):
         return f"Doação de {self.nome_doador} - R$ {self.valor}"
@@ -216,7 +283,141 @@ class Despesa(models.Model):
     
     valor = models.DecimalField(max_digits=10, decimal_places=2)
     data_despesa = models.DateField(default=datetime.date.today, verbose_name="Data do Pagamento")
-    comprovante = models.ImageField(upload_to='despesas/', blank=True, null=True)
+    comprovante = models.ImageField(upload_to='despesas/', storage=armazenamento_comprovantes, blank=True, null=True)
+
+    CAMPO_PERIODO = 'data_despesa'
+    objects = PeriodoQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['data_despesa'], name='despesa_data'),
+        ]
+
+    def __str__(self):
+        return f"{self.descricao} - R$ {self.valor}"
+# 11. RESUMO FINANCEIRO MENSAL (TABELA MATERIALIZADA)
+# Uma linha por (ano, mês) com os totais já somados. É mantida pelos signals
+# de academia/signals.py e pode ser refeita com:
+#   python manage.py recalcular_resumo_mensal
+class ResumoMensal(models.Model):
+    ano = models.IntegerField(verbose_name="Ano")
+    mes = models.IntegerField(verbose_name="Mês")
+
+    receita_mensalidades = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="Mensalidades Confirmadas")
+    receita_doacoes = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="Doações")
+    total_professores = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="Folha Paga aos Professores")
+    total_despesas = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="Despesas Extras")
+    novas_matriculas = models.IntegerField(default=0, verbose_name="Novas Matrículas")
+
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['ano', 'mes']
+        constraints = [
+            models.UniqueConstraint(fields=['ano', 'mes'], name='resumo_mensal_unico_por_mes'),
+        ]
+
+    @property
+    def total_receitas(self):
+        return self.receita_mensalidades + self.receita_doacoes
+
+    @property
+    def total_saidas(self):
+        return self.total_professores + self.total_despesas
+
+    @property
+    def saldo(self):
+        return self.total_receitas - self.total_saidas
+
+    def __str__(self):
+        return f"Resumo {self.mes:02d}/{self.ano}"
+
+# 12. CAIXA DE SAÍDA DAS MENSAGENS DE COBRANÇA
+# Cada linha é uma mensagem já personalizada para uma família. A campanha é
+# montada de uma vez (academia/mensageria.py) e o envio acontece em segundo
+# plano (python manage.py enviar_mensagens), respeitando o limite por minuto
+# e tentando de novo, com espera crescente, quando o envio falha.
+class MensagemSaida(models.Model):
+    PENDENTE, ENVIANDO, ENVIADA, ERRO = 'PEN', 'ENV', 'OK', 'ERR'
+    STATUS_CHOICES = [
+        (PENDENTE, 'Pendente'),
+        (ENVIANDO, 'Enviando'),
+        (ENVIADA, 'Enviada'),
+        (ERRO, 'Erro (desistiu)'),
+    ]
+
+    campanha = models.CharField(max_length=60, verbose_name="Campanha (Ex: cobranca-2026-03)")
+    aluno = models.ForeignKey(Aluno, on_delete=models.SET_NULL, null=True, blank=True)
+    modelo = models.ForeignKey(MensagemPadrao, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Mensagem Padrão")
+    telefone = models.CharField(max_length=20)
+    texto = models.TextField()
+
+    status = models.CharField(max_length=3, choices=STATUS_CHOICES, default=PENDENTE)
+    tentativas = models.PositiveSmallIntegerField(default=0)
+    # Não enviar antes disso: espera entre tentativas e limite de envio por minuto
+    enviar_a_partir_de = models.DateTimeField(default=timezone.now)
+    ultimo_erro = models.TextField(blank=True, default='')
+    criada_em = models.DateTimeField(auto_now_add=True)
+    enviada_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            # Rodar a mesma campanha de novo não manda duas vezes para o mesmo aluno
+            models.UniqueConstraint(fields=['campanha', 'aluno'], name='mensagem_saida_unica_por_campanha'),
+        ]
+        indexes = [
+            # "Próximas a enviar": status + horário liberado
+            models.Index(fields=['status', 'enviar_a_partir_de'], name='mensagem_saida_fila'),
+        ]
+
+    def __str__(self):
+        return f"{self.campanha} -> {self.telefone} ({self.get_status_display()})"
+
+# 13. TAREFAS EM SEGUNDO PLANO
+# Operações pesadas (folha, importação de planilha, relatório de impressão,
+# recálculo do resumo...) viram uma linha aqui e são executadas pelo
+# `python manage.py rodar_tarefas`, fora da requisição. A tela só acompanha
+# o progresso. Ver academia/tarefas.py.
+class Tarefa(models.Model):
+    PENDENTE, RODANDO, CONCLUIDA, ERRO = 'PEN', 'RUN', 'OK', 'ERR'
+    STATUS_CHOICES = [
+        (PENDENTE, 'Na fila'),
+        (RODANDO, 'Rodando'),
+        (CONCLUIDA, 'Concluída'),
+        (ERRO, 'Erro'),
+    ]
+
+    tipo = models.CharField(max_length=50)
+    parametros = models.JSONField(default=dict, blank=True)
+    criada_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+
+    status = models.CharField(max_length=3, choices=STATUS_CHOICES, default=PENDENTE)
+    progresso = models.PositiveSmallIntegerField(default=0, verbose_name="Progresso (%)")
+    etapa = models.CharField(max_length=200, blank=True, default='')
+    resultado = models.JSONField(null=True, blank=True)
+    erro = models.TextField(blank=True, default='')
+
+    tentativas = models.PositiveSmallIntegerField(default=0)
+    maximo_tentativas = models.PositiveSmallIntegerField(default=3)
+    # Não rodar antes disso (espera entre tentativas)
+    executar_a_partir_de = models.DateTimeField(default=timezone.now)
+    # Enquanto roda, o trabalhador renova este prazo; se ele cair, a tarefa volta para a fila
+    travada_ate = models.DateTimeField(null=True, blank=True)
+
+    criada_em = models.DateTimeField(auto_now_add=True)
+    iniciada_em = models.DateTimeField(null=True, blank=True)
+    terminada_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-criada_em']
+        indexes = [
+            # "Próxima tarefa a rodar": status + horário liberado
+            models.Index(fields=['status', 'executar_a_partir_de'], name='tarefa_fila'),
+        ]
+
+    @property
+    def terminou(self):
+        return self.status in (self.CONCLUIDA, self.ERRO)
 
     def __str__(self):
-        return f"{self.descricao} - R$ {self.valor}"
\ No newline at end of file
+        return f"{self.tipo} #{self.id} ({self.get_status_display()})"
@@ -0,0 +1,86 @@
+import base64
+import json
+from django.db import connection
+from django.db.models import Q
+
+# =======================================================
+# PAGINAÇÃO POR CURSOR (KEYSET)
+# Em vez de OFFSET (que fica mais lento a cada página), a próxima página começa
+# "depois" dos valores de ordenação do último item mostrado. O cursor é só esses
+# valores em JSON/base64 na URL.
+# =======================================================
+
+# Acima disso a contagem vira "N+" (não contamos a tabela inteira)
+LIMITE_CONTAGEM = 1000
+
+
+def codificar_cursor(valores):
+    texto = json.dumps(valores, separators=(',', ':'))
+    return base64.urlsafe_b64encode(texto.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    # Cursor inválido/adulterado volta para a primeira página
+    try:
+        preenchimento = '=' * (-len(cursor) % 4)
+        valores = json.loads(base64.urlsafe_b64decode(cursor + preenchimento))
+    except (ValueError, TypeError):
+        return None
+    return valores if isinstance(valores, list) else None
+
+
+def _valor_do_campo(obj, campo):
+    # Segue 'user__username' -> obj.user.username ('-campo' = ordem decrescente)
+    for parte in campo.lstrip('-').split('__'):
+        obj = getattr(obj, parte)
+    return obj
+
+
+def _filtro_apos(campos, valores):
+    # (a > x) OR (a = x AND b > y) OR (a = x AND b = y AND c > z) ...
+    # Campos com '-' (decrescentes) usam < no lugar de >
+    filtro = Q()
+    for i, campo in enumerate(campos):
+        comparacao = 'lt' if campo.startswith('-') else 'gt'
+        condicao = Q(**{f'{campo.lstrip("-")}__{comparacao}': valores[i]})
+        for anterior, valor in zip(campos[:i], valores[:i]):
+            condicao &= Q(**{anterior.lstrip('-'): valor})
+        filtro |= condicao
+    return filtro
+
+
+def pagina_por_cursor(queryset, campos, cursor=None, tamanho=50):
+    # `campos` precisa formar uma ordenação única (termine com um campo único, ex: username).
+    # Devolve (itens, proximo_cursor); proximo_cursor é None na última página.
+    queryset = queryset.order_by(*campos)
+
+    valores = decodificar_cursor(cursor) if cursor else None
+    if valores and len(valores) == len(campos):
+        queryset = queryset.filter(_filtro_apos(campos, valores))
+
+    itens = list(queryset[:tamanho + 1])
+    if len(itens) <= tamanho:
+        return itens, None
+
+    itens = itens[:tamanho]
+    ultimo = itens[-1]
+    return itens, codificar_cursor([_valor_do_campo(ultimo, campo) for campo in campos])
+
+
+def contar_aproximado(queryset, filtrado=True, limite=LIMITE_CONTAGEM):
+    # Devolve (total, exato). No PostgreSQL sem filtros usa a estimativa do
+    # próprio banco (pg_class); nos outros casos conta no máximo `limite` + 1 linhas.
+    if not filtrado and connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE relname = %s",
+                [queryset.model._meta.db_table],
+            )
+            linha = cursor.fetchone()
+        if linha and linha[0] > limite:
+            return linha[0], False
+
+    total = queryset.order_by()[:limite + 1].count()
+    if total > limite:
+        return limite, False
+    return total, True
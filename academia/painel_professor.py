@@ -0,0 +1,109 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import OuterRef, Subquery
+
+from .models import Curso, Matricula, Presenca
+
+# =======================================================
+# PAINEL DO PROFESSOR (MINHAS TURMAS)
+# Tudo o que a tela precisa (turmas, alunos ativos com nome e horário e a
+# presença do dia) sai em 2 consultas, não importa quantas turmas e alunos o
+# professor tenha: uma para os cursos e outra para as matrículas, já com o
+# nome do aluno (JOIN) e a presença da data (subconsulta).
+#
+# O resultado fica no cache por (professor, data). A chave leva duas versões:
+#   - a do professor: muda quando a chamada ou uma matrícula dele muda
+#     (signals, e chamada.py para os upserts em lote, que não disparam signals);
+#   - a geral: muda quando cursos ou nomes de alunos mudam e nas importações.
+# Como em website/cache.py, não é preciso saber quais chaves apagar.
+# =======================================================
+
+PREFIXO = 'painel_professor'
+CHAVE_VERSAO_GERAL = f'{PREFIXO}:versao'
+# Mesmo sem mudança, o painel é refeito depois disso (segundos)
+TEMPO_CACHE = getattr(settings, 'PAINEL_PROFESSOR_CACHE', 60 * 60 * 12)
+
+_DIAS = dict(Matricula.DIAS_CHOICES)
+_HORAS = dict(Matricula.HORAS_CHOICES)
+
+
+def _chave_versao(professor_id):
+    return f'{PREFIXO}:versao:{professor_id}'
+
+
+def _versoes(professor_id):
+    chaves = [CHAVE_VERSAO_GERAL, _chave_versao(professor_id)]
+    encontradas = cache.get_many(chaves)
+    for chave in chaves:
+        if chave not in encontradas:
+            cache.add(chave, 1, timeout=None)
+            encontradas[chave] = cache.get(chave, 1)
+    return tuple(encontradas[chave] for chave in chaves)
+
+
+def _nova_versao(chave):
+    try:
+        cache.incr(chave)
+    except ValueError:
+        # Chave ainda não existe (ou o cache foi limpo): começa uma versão nova
+        cache.set(chave, 2, timeout=None)
+
+
+def montar_painel(professor_id, data):
+    # [{'id', 'nome', 'lista_alunos': [{'id', 'nome', 'dia_semana', ..., 'status_hoje'}]}]
+    cursos = list(Curso.objects.filter(professor_id=professor_id).order_by('id').values('id', 'nome'))
+    presenca_do_dia = Presenca.objects.filter(matricula=OuterRef('pk'), data_aula=data).values('presente')[:1]
+    matriculas = (
+        Matricula.objects.filter(curso__professor_id=professor_id, ativo=True)
+        .annotate(status_hoje=Subquery(presenca_do_dia))
+        .order_by('id')
+        .values_list('id', 'curso_id', 'dia_semana', 'hora_aula', 'aluno__user__first_name', 'aluno__user__username', 'status_hoje')
+    )
+
+    por_curso = {curso['id']: curso for curso in cursos}
+    for curso in cursos:
+        curso['lista_alunos'] = []
+    for matricula_id, curso_id, dia, hora, first_name, username, status_hoje in matriculas:
+        por_curso[curso_id]['lista_alunos'].append({
+            'id': matricula_id,
+            'nome': first_name or username,
+            'dia_semana': dia,
+            'dia_semana_display': _DIAS.get(dia, dia),
+            'hora_aula_display': _HORAS.get(hora, hora),
+            'status_hoje': status_hoje,  # True / False / None (sem chamada)
+        })
+    return cursos
+
+
+def carregar_painel(professor_id, data):
+    versoes = _versoes(professor_id)
+    chave = f'{PREFIXO}:{versoes[0]}:{versoes[1]}:{professor_id}:{data.isoformat()}'
+    painel = cache.get(chave)
+    if painel is None:
+        painel = montar_painel(professor_id, data)
+        cache.set(chave, painel, timeout=TEMPO_CACHE)
+    return painel
+
+
+# -------------------------------------------------------
+# Invalidação
+# -------------------------------------------------------
+
+def invalidar_professor(professor_id):
+    if professor_id is not None:
+        _nova_versao(_chave_versao(professor_id))
+
+
+def invalidar_curso(curso_id):
+    # Quando só temos o curso (uma consulta para achar o professor)
+    professor_id = Curso.objects.filter(id=curso_id).values_list('professor_id', flat=True).first()
+    invalidar_professor(professor_id)
+
+
+def invalidar_matricula(matricula_id):
+    professor_id = Curso.objects.filter(matricula__id=matricula_id).values_list('professor_id', flat=True).first()
+    invalidar_professor(professor_id)
+
+
+def invalidar_todos():
+    _nova_versao(CHAVE_VERSAO_GERAL)
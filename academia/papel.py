@@ -0,0 +1,111 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+
+from .models import Curso
+
+# =======================================================
+# PAPEL DO USUÁRIO (request.role)
+# Quase toda view precisava descobrir se o usuário é aluno ou professor
+# (request.user.aluno / request.user.professor em try/except ou hasattr), e
+# as checagens de segurança comparavam objetos (matricula.curso.professor ==
+# request.user.professor), cada uma com suas consultas.
+# O PapelMiddleware resolve isso uma vez: aluno_id, professor_id e os IDs dos
+# cursos do professor, e as views comparam só IDs.
+# O papel fica no cache por usuário (1 consulta quando não está no cache).
+# is_staff vem sempre do request.user já carregado.
+# Autorização não confia no cache: role.cursos serve para exibir, mas
+# pode_gerenciar_curso / eh_professor_do_curso conferem no banco (uma
+# consulta por chave primária), porque um cache velho em outro processo
+# deixaria o professor antigo mexer numa turma que já não é dele.
+# Invalidação (signals): Aluno/Professor salvo ou apagado -> só aquele
+# usuário; Curso salvo ou apagado (pode ter trocado de professor) -> todos,
+# pela versão na chave, como em painel_professor.py.
+# =======================================================
+
+PREFIXO = 'papel'
+CHAVE_VERSAO = f'{PREFIXO}:versao'
+TEMPO_CACHE = getattr(settings, 'PAPEL_CACHE', 60 * 60 * 12)
+
+
+class Papel:
+    def __init__(self, is_staff=False, aluno_id=None, professor_id=None, cursos=()):
+        self.is_staff = is_staff
+        self.aluno_id = aluno_id
+        self.professor_id = professor_id
+        self.cursos = frozenset(cursos)  # cursos em que o usuário é o professor
+
+    @property
+    def eh_aluno(self):
+        return self.aluno_id is not None
+
+    @property
+    def eh_professor(self):
+        return self.professor_id is not None
+
+    def eh_professor_do_curso(self, curso_id):
+        # Sempre no banco, nunca no cache (ver cabeçalho)
+        if self.professor_id is None:
+            return False
+        return Curso.objects.filter(id=curso_id, professor_id=self.professor_id).exists()
+
+    def pode_gerenciar_curso(self, curso_id):
+        # Secretaria ou o professor da turma
+        return self.is_staff or self.eh_professor_do_curso(curso_id)
+
+    def __repr__(self):
+        return f'<Papel staff={self.is_staff} aluno={self.aluno_id} professor={self.professor_id} cursos={sorted(self.cursos)}>'
+
+
+ANONIMO = Papel()
+
+
+def _versao():
+    versao = cache.get(CHAVE_VERSAO)
+    if versao is None:
+        cache.add(CHAVE_VERSAO, 1, timeout=None)
+        versao = cache.get(CHAVE_VERSAO, 1)
+    return versao
+
+
+def _chave(usuario_id):
+    return f'{PREFIXO}:{_versao()}:{usuario_id}'
+
+
+def resolver(usuario_id):
+    # (aluno_id, professor_id, [cursos]) direto do banco, numa consulta só
+    # (LEFT JOIN com aluno, professor e os cursos dele: uma linha por curso)
+    aluno_id = professor_id = None
+    cursos = []
+    for aluno_id, professor_id, curso_id in User.objects.filter(id=usuario_id).values_list('aluno__id', 'professor__id', 'professor__curso__id'):
+        if curso_id is not None:
+            cursos.append(curso_id)
+    return aluno_id, professor_id, cursos
+
+
+def papel_do_usuario(usuario):
+    if not usuario.is_authenticated:
+        return ANONIMO
+    chave = _chave(usuario.id)
+    dados = cache.get(chave)
+    if dados is None:
+        dados = resolver(usuario.id)
+        cache.set(chave, dados, timeout=TEMPO_CACHE)
+    aluno_id, professor_id, cursos = dados
+    return Papel(usuario.is_staff, aluno_id, professor_id, cursos)
+
+
+# -------------------------------------------------------
+# Invalidação
+# -------------------------------------------------------
+
+def invalidar_usuario(usuario_id):
+    if usuario_id is not None:
+        cache.delete(_chave(usuario_id))
+
+
+def invalidar_todos():
+    try:
+        cache.incr(CHAVE_VERSAO)
+    except ValueError:
+        cache.set(CHAVE_VERSAO, 2, timeout=None)
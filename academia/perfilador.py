@@ -0,0 +1,193 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from django.conf import settings
+from django.utils import timezone
+
+from .consultas import ColetorConsultas
+
+# =======================================================
+# PERFILADOR SOB DEMANDA (SÓ STAFF)
+# Para descobrir por que uma tela está lenta em produção: um usuário staff
+# abre a página com ?perfil=1 (ou liga o cookie com ?perfil=sempre) e a
+# requisição roda dentro do cProfile, com um amostrador de pilhas em paralelo
+# e o ColetorConsultas. O resultado fica em PERFIS_PASTA:
+#   <nome>.prof    -> pstats (snakeviz, python -m pstats)
+#   <nome>.pilhas  -> pilhas "collapsed" (flamegraph.pl, speedscope)
+#   <nome>.json    -> tela, usuário, tempo total, tempo de template e a
+#                     linha do tempo das consultas SQL
+# Só os PERFIS_MAXIMO mais recentes (e de até PERFIS_DIAS) são mantidos.
+# A lista e os downloads ficam em /sistema/desempenho/perfis/.
+# =======================================================
+
+PASTA = Path(getattr(settings, 'PERFIS_PASTA', Path(settings.BASE_DIR) / 'perfis'))
+MAXIMO = getattr(settings, 'PERFIS_MAXIMO', 50)
+DIAS = getattr(settings, 'PERFIS_DIAS', 7)
+# Intervalo do amostrador de pilhas (segundos)
+INTERVALO_AMOSTRA = getattr(settings, 'PERFIS_INTERVALO_AMOSTRA', 0.005)
+
+PARAMETRO = 'perfil'
+COOKIE = 'perfil'
+
+FORMATOS = {
+    'prof': ('.prof', 'application/octet-stream'),
+    'pilhas': ('.pilhas', 'text/plain; charset=utf-8'),
+    'json': ('.json', 'application/json'),
+}
+_NOME_VALIDO = re.compile(r'^[\w-]+$')
+_SEM_SIMBOLOS = re.compile(r'[^\w-]')
+
+# Onde a renderização de template aparece no cProfile (render() / render_to_string())
+_RENDER_TEMPLATE = ('django/template/backends/django.py', 'render')
+
+
+class AmostradorPilhas(threading.Thread):
+    # Olha a pilha da thread da requisição a cada INTERVALO_AMOSTRA e conta
+    # quantas vezes cada pilha apareceu (formato "collapsed" do flamegraph)
+    def __init__(self, thread_alvo, intervalo=INTERVALO_AMOSTRA):
+        super().__init__(daemon=True)
+        self.thread_alvo = thread_alvo
+        self.intervalo = intervalo
+        self.pilhas = Counter()
+        self._parar = threading.Event()
+
+    def run(self):
+        while not self._parar.wait(self.intervalo):
+            quadro = sys._current_frames().get(self.thread_alvo)
+            pilha = []
+            while quadro is not None:
+                codigo = quadro.f_code
+                pilha.append(f"{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{codigo.co_firstlineno})")
+                quadro = quadro.f_back
+            if pilha:
+                self.pilhas[';'.join(reversed(pilha))] += 1
+
+    def parar(self):
+        self._parar.set()
+        self.join()
+
+    def collapsed(self):
+        return ''.join(f"{pilha} {vezes}\n" for pilha, vezes in self.pilhas.most_common())
+
+
+def pedido_de_perfil(request):
+    # (perfilar esta requisição?, valor novo do cookie ou None)
+    valor = request.GET.get(PARAMETRO)
+    if valor == 'sempre':
+        return True, '1'
+    if valor == '0':
+        return False, ''
+    return bool(valor) or request.COOKIES.get(COOKIE) == '1', None
+
+
+def _tempo_de_template(estatisticas):
+    for (arquivo, _, funcao), (_, _, _, acumulado, _) in estatisticas.stats.items():
+        if funcao == _RENDER_TEMPLATE[1] and arquivo.replace('\\', '/').endswith(_RENDER_TEMPLATE[0]):
+            return acumulado
+    return 0.0
+
+
+def perfilar(request, get_response):
+    # Roda a requisição perfilada, grava os arquivos e devolve (response, nome)
+    amostrador = AmostradorPilhas(threading.get_ident())
+    perfil = cProfile.Profile()
+    inicio = time.perf_counter()
+    with ColetorConsultas() as coletor:
+        amostrador.start()
+        perfil.enable()
+        try:
+            response = get_response(request)
+            # Respostas com template preguiçoso (TemplateResponse) renderizam aqui dentro
+            if hasattr(response, 'render') and callable(response.render) and not getattr(response, 'is_rendered', True):
+                response.render()
+        finally:
+            perfil.disable()
+            amostrador.parar()
+    total = time.perf_counter() - inicio
+
+    estatisticas = pstats.Stats(perfil, stream=io.StringIO())
+    match = getattr(request, 'resolver_match', None)
+    view = match.view_name if match else 'sem_view'
+    agora = timezone.now()
+    nome = f"{agora:%Y%m%d-%H%M%S}-{_SEM_SIMBOLOS.sub('_', view)}-{uuid.uuid4().hex[:6]}"
+
+    dados = {
+        'nome': nome,
+        'criado_em': agora.isoformat(timespec='seconds'),
+        'view': view,
+        'caminho': request.get_full_path(),
+        'metodo': request.method,
+        'usuario': request.user.get_username(),
+        'status': response.status_code,
+        'tempo_ms': round(total * 1000, 1),
+        'template_ms': round(_tempo_de_template(estatisticas) * 1000, 1),
+        'sql_ms': round(coletor.tempo_total * 1000, 1),
+        'amostras': sum(amostrador.pilhas.values()),
+        'consultas': [
+            {
+                'inicio_ms': round((c.inicio - inicio) * 1000, 2),
+                'ms': round(c.duracao * 1000, 2),
+                'banco': c.banco,
+                'sql': c.sql,
+            }
+            for c in coletor.consultas
+        ],
+    }
+
+    PASTA.mkdir(parents=True, exist_ok=True)
+    estatisticas.dump_stats(PASTA / f'{nome}.prof')
+    (PASTA / f'{nome}.pilhas').write_text(amostrador.collapsed(), encoding='utf-8')
+    (PASTA / f'{nome}.json').write_text(json.dumps(dados, ensure_ascii=False, indent=1), encoding='utf-8')
+    limpar_antigos()
+    return response, nome
+
+
+# -------------------------------------------------------
+# Perfis guardados
+# -------------------------------------------------------
+
+def listar_perfis():
+    # Resumo dos perfis guardados, do mais novo para o mais antigo (sem a linha do tempo)
+    perfis = []
+    if not PASTA.exists():
+        return perfis
+    for arquivo in sorted(PASTA.glob('*.json'), reverse=True):
+        try:
+            dados = json.loads(arquivo.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            continue
+        dados['qtd_consultas'] = len(dados.pop('consultas', []))
+        perfis.append(dados)
+    return perfis
+
+
+def caminho_do_perfil(nome, formato):
+    # Caminho do arquivo pedido, ou None (nome inválido, formato desconhecido ou já apagado)
+    if formato not in FORMATOS or not _NOME_VALIDO.match(nome):
+        return None
+    caminho = PASTA / (nome + FORMATOS[formato][0])
+    return caminho if caminho.is_file() else None
+
+
+def limpar_antigos():
+    # Mantém só os MAXIMO perfis mais recentes e de até DIAS dias
+    if not PASTA.exists():
+        return
+    nomes = sorted({arquivo.stem for arquivo in PASTA.iterdir() if arquivo.suffix in ('.prof', '.pilhas', '.json')}, reverse=True)
+    limite = time.time() - DIAS * 24 * 60 * 60
+    for posicao, nome in enumerate(nomes):
+        arquivos = [PASTA / (nome + extensao) for extensao, _ in FORMATOS.values()]
+        antigo = any(a.exists() and a.stat().st_mtime < limite for a in arquivos)
+        if posicao >= MAXIMO or antigo:
+            for arquivo in arquivos:
+                if arquivo.exists():
+                    arquivo.unlink()
@@ -0,0 +1,97 @@
+import datetime
+from django.db import models
+from django.utils import timezone
+
+# =======================================================
+# PERÍODOS (MÊS) COMO INTERVALO DE DATAS
+# Filtrar com data__month=3, data__year=2026 vira EXTRACT/strftime sobre a
+# coluna e nenhum índice é usado. Aqui o mês vira o intervalo meio-aberto
+# [primeiro dia do mês, primeiro dia do mês seguinte), que o índice da data
+# resolve direto:
+#   Pagamento.objects.filter(confirmado=True).no_mes(2026, 3)
+# =======================================================
+
+
+# O fim do período é o 1º dia do mês seguinte: em dezembro de 9999 ele cairia
+# no ano 10000, que o datetime.date não aceita
+ANO_MINIMO = 1
+ANO_MAXIMO = 9998
+
+
+class Periodo:
+    def __init__(self, ano, mes):
+        self.ano = int(ano)
+        self.mes = int(mes)
+        if not 1 <= self.mes <= 12:
+            raise ValueError(f"Mês inválido: {mes}")
+        if not ANO_MINIMO <= self.ano <= ANO_MAXIMO:
+            raise ValueError(f"Ano inválido: {ano}")
+
+    @classmethod
+    def da_data(cls, data):
+        return cls(data.year, data.month)
+
+    @classmethod
+    def atual(cls):
+        return cls.da_data(timezone.localdate())
+
+    def __repr__(self):
+        return f"Periodo({self.ano}, {self.mes})"
+
+    def __eq__(self, outro):
+        return isinstance(outro, Periodo) and (self.ano, self.mes) == (outro.ano, outro.mes)
+
+    def __hash__(self):
+        return hash((self.ano, self.mes))
+
+    def __iter__(self):
+        # Permite "ano, mes = periodo"
+        return iter((self.ano, self.mes))
+
+    @property
+    def inicio(self):
+        return datetime.date(self.ano, self.mes, 1)
+
+    @property
+    def fim(self):
+        # Primeiro dia do mês seguinte (fora do período)
+        if self.mes == 12:
+            return datetime.date(self.ano + 1, 1, 1)
+        return datetime.date(self.ano, self.mes + 1, 1)
+
+    def anterior(self):
+        if self.mes == 1:
+            return Periodo(self.ano - 1, 12)
+        return Periodo(self.ano, self.mes - 1)
+
+    def seguinte(self):
+        if self.mes == 12:
+            return Periodo(self.ano + 1, 1)
+        return Periodo(self.ano, self.mes + 1)
+
+    def limites(self, com_hora=False):
+        # (inicio, fim). Para campos DateTime o mês é o do fuso local,
+        # igual ao que o __month do Django fazia
+        if not com_hora:
+            return self.inicio, self.fim
+        return (
+            timezone.make_aware(datetime.datetime.combine(self.inicio, datetime.time.min)),
+            timezone.make_aware(datetime.datetime.combine(self.fim, datetime.time.min)),
+        )
+
+    def filtro(self, campo, com_hora=False):
+        # {'campo__gte': inicio, 'campo__lt': fim}, para usar em .filter(**...)
+        inicio, fim = self.limites(com_hora)
+        return {f'{campo}__gte': inicio, f'{campo}__lt': fim}
+
+
+class PeriodoQuerySet(models.QuerySet):
+    # O modelo diz qual é a sua data de referência em CAMPO_PERIODO
+
+    def no_periodo(self, periodo, campo=None):
+        campo = campo or self.model.CAMPO_PERIODO
+        com_hora = self.model._meta.get_field(campo).get_internal_type() == 'DateTimeField'
+        return self.filter(**periodo.filtro(campo, com_hora))
+
+    def no_mes(self, ano, mes, campo=None):
+        return self.no_periodo(Periodo(ano, mes), campo)
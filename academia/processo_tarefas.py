@@ -0,0 +1,13 @@
+import django
+
+# =======================================================
+# TRABALHADOR EM PROCESSO SEPARADO (rodar_tarefas --modo processo)
+# O processo novo ("spawn") importa este módulo antes de o Django estar
+# carregado, por isso ele não importa modelos no topo (tarefas.py importa).
+# =======================================================
+
+
+def trabalhar(continuo, intervalo):
+    django.setup()
+    from academia import tarefas
+    return tarefas.trabalhar(continuo, intervalo)
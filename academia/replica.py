@@ -0,0 +1,106 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from django.conf import settings
+from django.db import connections
+
+# =======================================================
+# RÉPLICA SÓ DE LEITURA PARA OS RELATÓRIOS
+# As telas pesadas de consulta (relatórios, painel da secretaria,
+# exportações) competem com quem está lançando chamada e pagamento. Quando
+# existe o banco BANCO_REPLICA em settings.DATABASES (DATABASE_REPLICA_URL),
+# as views marcadas com @ler_da_replica fazem as leituras nele:
+#   - RoteadorReplica (DATABASE_ROUTERS) manda para a réplica só as leituras
+#     feitas dentro de usando_replica(); escrita sempre vai para o 'default';
+#   - "ler o que acabou de gravar": depois de um POST, a sessão fica presa ao
+#     'default' por REPLICA_GRUDAR segundos (GrudarNoPrincipalMiddleware),
+#     para a tela seguinte não mostrar dado velho por causa do atraso da réplica;
+#   - sem réplica configurada, nada muda: tudo vai para o 'default'.
+# Nos testes, a réplica é espelho do banco de teste (TEST['MIRROR']) e as
+# leituras ficam no 'default'.
+# =======================================================
+
+ALIAS = getattr(settings, 'BANCO_REPLICA', 'replica')
+# Quanto tempo a sessão lê do 'default' depois de gravar algo (segundos)
+GRUDAR = getattr(settings, 'REPLICA_GRUDAR', 15)
+CHAVE_SESSAO = 'replica_principal_ate'
+METODOS_SEGUROS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+_na_replica = ContextVar('na_replica', default=False)
+
+
+def configurada():
+    if ALIAS not in settings.DATABASES:
+        return False
+    # Réplica apontando para o próprio banco principal (o espelho dos testes)
+    # não conta: lendo pelo 'default', a transação em andamento fica visível
+    replica, principal = connections[ALIAS].settings_dict, connections['default'].settings_dict
+    return any(replica[chave] != principal[chave] for chave in ('NAME', 'HOST', 'PORT'))
+
+
+@contextmanager
+def usando_replica():
+    token = _na_replica.set(True)
+    try:
+        yield
+    finally:
+        _na_replica.reset(token)
+
+
+def grudado_no_principal(request):
+    sessao = getattr(request, 'session', None)
+    return sessao is not None and sessao.get(CHAVE_SESSAO, 0) > time.time()
+
+
+def grudar_no_principal(request):
+    request.session[CHAVE_SESSAO] = time.time() + GRUDAR
+
+
+def _iterar_na_replica(pedacos):
+    # Resposta em streaming (exportações): as linhas saem do banco depois que a
+    # view já retornou, então cada pedaço é gerado dentro da réplica
+    iterador = iter(pedacos)
+    while True:
+        with usando_replica():
+            try:
+                pedaco = next(iterador)
+            except StopIteration:
+                return
+        yield pedaco
+
+
+def ler_da_replica(view):
+    # Só os GETs vão para a réplica; um POST na mesma view (ex.: lançar uma
+    # despesa no relatório financeiro) lê e grava no principal
+    @wraps(view)
+    def _view(request, *args, **kwargs):
+        if request.method not in METODOS_SEGUROS or not configurada() or grudado_no_principal(request):
+            return view(request, *args, **kwargs)
+        with usando_replica():
+            response = view(request, *args, **kwargs)
+        if response.streaming:
+            response.streaming_content = _iterar_na_replica(response.streaming_content)
+        return response
+    return _view
+
+
+class RoteadorReplica:
+    def db_for_read(self, model, **hints):
+        if _na_replica.get() and configurada():
+            return ALIAS
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Réplica e principal têm os mesmos dados
+        bancos = {'default', ALIAS}
+        if obj1._state.db in bancos and obj2._state.db in bancos:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # A réplica recebe as mudanças do principal; nunca migra sozinha
+        return False if db == ALIAS else None
@@ -1,55 +1,114 @@
-from import_export import resources, fields, widgets
+from import_export import resources, fields
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
 from .models import Aluno, Curso, Matricula
+from . import importacao, busca, autocompletar, resumo, painel_professor, papel
+
+# A importação é feita em lote (ver importacao.py): tudo que as linhas precisam
+# é carregado no before_import, os objetos são gravados com bulk_create/bulk_update
+# e o arquivo inteiro roda numa transação só. Erros de uma linha (usuário
+# repetido, aluno inexistente...) são mostrados na linha, sem parar o resto.
 
 class AlunoResource(resources.ModelResource):
     # Campos auxiliares (lidos do CSV)
     username = fields.Field(column_name='username')
     first_name = fields.Field(column_name='first_name')
     password = fields.Field(column_name='password')
-    
+
     # CORREÇÃO 1: Definimos o campo user explicitamente para aceitar um ID
-    user = fields.Field(column_name='user', attribute='user', widget=widgets.ForeignKeyWidget(User, 'id'))
+    # (resolvido pelos usuários já carregados, sem consulta por linha)
+    user = fields.Field(column_name='user', attribute='user', widget=importacao.ChavePreCarregada(User, 'id'))
+
+    # Campos do Aluno regravados no bulk_update (os auxiliares acima não existem no modelo)
+    CAMPOS_ATUALIZADOS = [
+        'user', 'telefone', 'data_nascimento',
+        'logradouro', 'bairro', 'cidade', 'eh_bolsista',
+        'nome_responsavel', 'contato_responsavel', 'membro_metodista', 'outra_igreja',
+        'sexo', 'busca_normalizada',
+    ]
 
     class Meta:
         model = Aluno
         # CORREÇÃO 2: Adicionamos 'user' nesta lista. Sem isso, ele não salva!
         fields = (
-            'id', 'username', 'first_name', 'password', 'user', 
-            'telefone', 'data_nascimento', 
-            'logradouro', 'bairro', 'cidade', 'eh_bolsista', 
+            'id', 'username', 'first_name', 'password', 'user',
+            'telefone', 'data_nascimento',
+            'logradouro', 'bairro', 'cidade', 'eh_bolsista',
             'nome_responsavel', 'contato_responsavel', 'membro_metodista', 'outra_igreja',
             'sexo'
         )
         export_order = fields
         skip_unchanged = True
         report_skipped = False
-    
+        use_bulk = True
+        batch_size = importacao.TAMANHO_LOTE
+        use_transactions = True
+
+    def before_import(self, dataset, **kwargs):
+        # 1. Usuários da planilha: os existentes numa consulta, os novos num bulk_create
+        self.usuarios = importacao.preparar_usuarios(dataset)
+        self.fields['user'].widget.objetos = {u.id: u for u in self.usuarios.values()}
+
+        # 2. Alunos que já existem (pelo id da planilha ou pelo usuário)
+        ids = [int(v) for v in (dataset['id'] if 'id' in (dataset.headers or []) else []) if importacao.texto(v).isdigit()]
+        self.alunos_por_id, self.alunos_por_usuario = {}, {}
+        user_ids = [u.id for u in self.usuarios.values()]
+        for bloco in importacao.em_blocos(user_ids):
+            for aluno in Aluno.objects.filter(user_id__in=bloco).select_related('user'):
+                self.alunos_por_usuario[aluno.user_id] = aluno
+                self.alunos_por_id[aluno.id] = aluno
+        faltando = [i for i in ids if i not in self.alunos_por_id]
+        for bloco in importacao.em_blocos(faltando):
+            self.alunos_por_id.update((aluno.id, aluno) for aluno in Aluno.objects.filter(id__in=bloco).select_related('user'))
+
+        self.linha_do_usuario = {}
+        self.gravados = []
+        return super().before_import(dataset, **kwargs)
+
     def before_import_row(self, row, **kwargs):
-        # 1. Cria ou recupera o User
+        # 1. Recupera o User (criado no before_import)
         # Garantimos que os dados venham como string para evitar erros
-        uname = str(row['username']).strip()
-        fname = str(row.get('first_name', '')).strip()
-        pwd = str(row.get('password', '123456')).strip()
-
-        user, created = User.objects.get_or_create(
-            username=uname,
-            defaults={
-                'first_name': fname,
-                'is_active': True
-            }
-        )
-        
-        # 2. Define a senha se for novo
-        if created:
-            user.set_password(pwd)
-            user.save()
-            
+        uname = importacao.texto(row.get('username'))
+        user = self.usuarios.get(uname)
+        if user is None:
+            raise ValidationError({'username': "Informe o username do aluno."})
+
+        # 2. O mesmo aluno duas vezes na planilha gravaria dois cadastros para um usuário
+        linha = kwargs.get('row_number')
+        primeira = self.linha_do_usuario.setdefault(user.id, linha)
+        if primeira != linha:
+            raise ValidationError({'username': f"Usuário '{uname}' repetido na planilha (já está na linha {primeira})."})
+
         # 3. Passa o ID do User para o campo que definimos lá em cima
         row['user'] = user.id
-        
+
         return super().before_import_row(row, **kwargs)
 
+    def get_instance(self, instance_loader, row):
+        # Aluno já cadastrado: pelo id (se a planilha tiver a coluna) ou pelo usuário
+        aluno_id = importacao.texto(row.get('id'))
+        if aluno_id.isdigit():
+            return self.alunos_por_id.get(int(aluno_id))
+        return self.alunos_por_usuario.get(row['user'])
+
+    def get_bulk_update_fields(self):
+        return self.CAMPOS_ATUALIZADOS
+
+    def before_save_instance(self, instance, row, **kwargs):
+        # O bulk_create não passa pelo Aluno.save()
+        instance.busca_normalizada = instance.calcular_busca_normalizada()
+
+    def after_save_instance(self, instance, row, **kwargs):
+        self.gravados.append(instance)
+
+    def after_import(self, dataset, result, **kwargs):
+        # Índice de busca e autocompletar, que o save()/signals atualizariam aluno a aluno
+        busca.indexar_alunos(self.gravados)
+        autocompletar.invalidar_indice()
+        painel_professor.invalidar_todos()
+        papel.invalidar_todos()
+        return super().after_import(dataset, result, **kwargs)
+
     # (Opcional) Para exportação
     def dehydrate_username(self, aluno):
         return aluno.user.username if aluno.user else ''
@@ -60,8 +119,10 @@ class AlunoResource(resources.ModelResource):
 
 # --- RECURSO DE MATRÍCULA ---
 class MatriculaResource(resources.ModelResource):
-    aluno_username = fields.Field(column_name='username')
-    nome_curso = fields.Field(column_name='curso')
+    # As colunas 'username' e 'curso' da planilha são lidas direto da linha no
+    # before_import_row e viram os ids de 'aluno' e 'curso'
+    aluno = fields.Field(column_name='aluno', attribute='aluno', widget=importacao.ChavePreCarregada(Aluno))
+    curso = fields.Field(column_name='curso', attribute='curso', widget=importacao.ChavePreCarregada(Curso))
 
     class Meta:
         model = Matricula
@@ -69,26 +130,78 @@ class MatriculaResource(resources.ModelResource):
         import_id_fields = ('aluno', 'curso')
         skip_unchanged = True
         report_skipped = False
+        use_bulk = True
+        batch_size = importacao.TAMANHO_LOTE
+        use_transactions = True
+
+    def before_import(self, dataset, **kwargs):
+        headers = dataset.headers or []
+        # A planilha traz username + curso; a coluna 'aluno' é preenchida linha a linha
+        if 'aluno' not in headers:
+            dataset.append_col([''] * len(dataset), header='aluno')
+
+        # Alunos da planilha numa consulta (por username)
+        usernames = {importacao.texto(v) for v in dataset['username']} if 'username' in headers else set()
+        self.alunos = {}
+        for bloco in importacao.em_blocos(usernames - {''}):
+            for aluno in Aluno.objects.filter(user__username__in=bloco).select_related('user'):
+                self.alunos[aluno.user.username] = aluno
+
+        # Cursos por nome (sem diferenciar maiúsculas); os que faltam são criados uma vez
+        nomes = {importacao.texto(v) for v in dataset['curso']} if 'curso' in headers else set()
+        self.cursos = importacao.cursos_por_nome(sorted(nomes - {''}))
+
+        self.fields['aluno'].widget.objetos = {a.id: a for a in self.alunos.values()}
+        self.fields['curso'].widget.objetos = {c.id: c for c in self.cursos.values()}
+
+        # Matrículas que já existem para esses alunos
+        self.matriculas = {}
+        for bloco in importacao.em_blocos([a.id for a in self.alunos.values()]):
+            for matricula in Matricula.objects.filter(aluno_id__in=bloco):
+                self.matriculas.setdefault((matricula.aluno_id, matricula.curso_id), matricula)
+
+        self.linha_da_matricula = {}
+        self.periodos = set()
+        return super().before_import(dataset, **kwargs)
 
     def before_import_row(self, row, **kwargs):
-        username = str(row.get('username', '')).strip()
-        
+        username = importacao.texto(row.get('username'))
+
         # Busca Aluno
-        try:
-            aluno = Aluno.objects.get(user__username=username)
-            row['aluno'] = aluno.id
-        except Aluno.DoesNotExist:
-            pass # Se não achar o aluno, essa linha falha ou é pulada
-
-        # Busca Curso
-        nome_curso_csv = str(row.get('curso', '')).strip()
-        if nome_curso_csv:
-            try:
-                curso = Curso.objects.get(nome__iexact=nome_curso_csv)
-                row['curso'] = curso.id
-            except Curso.DoesNotExist:
-                # Cria o curso se não existir (Opcional, mas útil na primeira vez)
-                curso = Curso.objects.create(nome=nome_curso_csv)
-                row['curso'] = curso.id
-        
-        row['ativo'] = True
\ No newline at end of file
+        aluno = self.alunos.get(username)
+        if aluno is None:
+            raise ValidationError({'username': f"Aluno '{username}' não encontrado."})
+
+        # Busca Curso (criado no before_import se não existia)
+        nome_curso_csv = importacao.texto(row.get('curso'))
+        curso = self.cursos.get(nome_curso_csv.lower())
+        if curso is None:
+            raise ValidationError({'curso': "Informe o nome do curso."})
+
+        linha = kwargs.get('row_number')
+        primeira = self.linha_da_matricula.setdefault((aluno.id, curso.id), linha)
+        if primeira != linha:
+            raise ValidationError({'curso': f"Matrícula repetida na planilha (já está na linha {primeira})."})
+
+        row['aluno'] = aluno.id
+        row['curso'] = curso.id
+        row['ativo'] = True
+
+    def get_instance(self, instance_loader, row):
+        return self.matriculas.get((row['aluno'], row['curso']))
+
+    def get_bulk_update_fields(self):
+        return ['ativo']
+
+    def after_save_instance(self, instance, row, **kwargs):
+        # Matrícula nova conta no resumo mensal (o bulk_create não dispara os signals)
+        if instance.pk is None:
+            periodo = resumo.periodo_do_objeto(instance)
+            if periodo:
+                self.periodos.add(periodo)
+
+    def after_import(self, dataset, result, **kwargs):
+        for periodo in self.periodos:
+            resumo.atualizar_mes(Matricula, *periodo)
+        painel_professor.invalidar_todos()
+        return super().after_import(dataset, result, **kwargs)
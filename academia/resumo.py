@@ -0,0 +1,100 @@
+import datetime
+from decimal import Decimal
+from django.apps import apps as django_apps
+from django.db import transaction
+from django.db.models import Sum, Count
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+# =======================================================
+# RESUMO FINANCEIRO MENSAL
+# Cada coluna do ResumoMensal vem de um modelo de origem. Quando uma linha de
+# origem muda, só a coluna daquele modelo, no(s) mês(es) afetado(s), é recalculada
+# (uma SUM/COUNT indexada em um mês), em vez de refazer o ano inteiro a cada tela.
+# =======================================================
+
+# modelo de origem -> (coluna do resumo, campo de data, filtro, campo somado ou None p/ COUNT)
+FONTES = {
+    'Pagamento': ('receita_mensalidades', 'data_pagamento', {'confirmado': True}, 'valor'),
+    'Doacao': ('receita_doacoes', 'data_doacao', {}, 'valor'),
+    'PagamentoProfessor': ('total_professores', 'data_pagamento_realizado', {'pago': True}, 'valor_total'),
+    'Despesa': ('total_despesas', 'data_despesa', {}, 'valor'),
+    'Matricula': ('novas_matriculas', 'data_inicio', {}, None),
+}
+
+MESES_LABEL = ['Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun', 'Jul', 'Ago', 'Set', 'Out', 'Nov', 'Dez']
+
+
+def periodo_do_objeto(obj):
+    # Devolve (ano, mes) em que o objeto conta no resumo, ou None se não conta
+    coluna, campo_data, filtro, _ = FONTES[obj.__class__.__name__]
+    for campo, valor in filtro.items():
+        if getattr(obj, campo) != valor:
+            return None
+    data = getattr(obj, campo_data)
+    if not data:
+        return None
+    if isinstance(data, datetime.datetime):
+        data = timezone.localtime(data) if timezone.is_aware(data) else data
+    return (data.year, data.month)
+
+
+def _calcular_coluna(modelo, ano, mes):
+    coluna, campo_data, filtro, campo_valor = FONTES[modelo.__name__]
+    qs = modelo.objects.filter(**filtro).no_mes(ano, mes, campo_data)
+    if campo_valor is None:
+        return qs.count()
+    return qs.aggregate(total=Sum(campo_valor))['total'] or Decimal('0')
+
+
+def atualizar_mes(modelo, ano, mes):
+    # Recalcula só a coluna deste modelo no mês informado
+    from .models import ResumoMensal
+
+    coluna = FONTES[modelo.__name__][0]
+    valor = _calcular_coluna(modelo, ano, mes)
+    ResumoMensal.objects.update_or_create(ano=ano, mes=mes, defaults={coluna: valor})
+
+
+def resumo_do_mes(ano, mes):
+    from .models import ResumoMensal
+
+    # Mês sem nenhum lançamento: devolve um resumo zerado (não salvo)
+    return ResumoMensal.objects.filter(ano=ano, mes=mes).first() or ResumoMensal(ano=ano, mes=mes)
+
+
+def resumo_do_ano(ano):
+    # Lista com 12 resumos (Jan..Dez), lida numa consulta só
+    from .models import ResumoMensal
+
+    existentes = {r.mes: r for r in ResumoMensal.objects.filter(ano=ano)}
+    return [existentes.get(m) or ResumoMensal(ano=ano, mes=m) for m in range(1, 13)]
+
+
+def reconstruir_tudo():
+    # Apaga e refaz a tabela inteira com uma consulta agrupada por mês para cada origem
+    ResumoMensal = django_apps.get_model('academia', 'ResumoMensal')
+
+    linhas = {}
+    for nome_modelo, (coluna, campo_data, filtro, campo_valor) in FONTES.items():
+        modelo = django_apps.get_model('academia', nome_modelo)
+        agregado = Count('id') if campo_valor is None else Sum(campo_valor)
+
+        grupos = modelo.objects.filter(
+            **filtro, **{f'{campo_data}__isnull': False}
+        ).annotate(
+            periodo=TruncMonth(campo_data)
+        ).values('periodo').annotate(total=agregado).order_by()
+
+        for grupo in grupos:
+            periodo = grupo['periodo']
+            chave = (periodo.year, periodo.month)
+            if chave not in linhas:
+                linhas[chave] = ResumoMensal(ano=chave[0], mes=chave[1])
+            setattr(linhas[chave], coluna, grupo['total'] or 0)
+
+    with transaction.atomic():
+        ResumoMensal.objects.all().delete()
+        ResumoMensal.objects.bulk_create(linhas.values(), batch_size=500)
+
+    return len(linhas)
@@ -0,0 +1,178 @@
+import datetime
+from django.conf import settings
+from django.db.models import Count, Q, F, Value, Window
+from django.db.models.functions import Coalesce, Lower, NullIf, RowNumber
+from django.utils import timezone
+
+from .models import Matricula, Presenca
+from .periodo import Periodo
+
+# =======================================================
+# RISCO DE EVASÃO
+# Conta as faltas de TODAS as matrículas ativas numa única consulta agrupada
+# (em vez de um COUNT por matrícula) e compara com o período anterior
+# para indicar a tendência.
+# =======================================================
+
+# Quantidade mínima de faltas para o aluno entrar na lista (pode mudar no settings.py)
+LIMITE_FALTAS_PADRAO = getattr(settings, 'RISCO_EVASAO_LIMITE_FALTAS', 2)
+
+JANELA_MES = 'mes'
+JANELA_DIAS = 'dias'
+JANELA_AULAS = 'aulas'
+
+TENDENCIA_SUBINDO = 'subindo'
+TENDENCIA_ESTAVEL = 'estavel'
+TENDENCIA_CAINDO = 'caindo'
+
+
+def _tendencia(atual, anterior):
+    if atual > anterior:
+        return TENDENCIA_SUBINDO
+    if atual < anterior:
+        return TENDENCIA_CAINDO
+    return TENDENCIA_ESTAVEL
+
+
+def _montar_item(mat, qtd_faltas, faltas_anterior):
+    telefone_bruto = str(mat.aluno.telefone or "")
+    fone_limpo = ''.join(filter(str.isdigit, telefone_bruto))
+
+    return {
+        'matricula_id': mat.id,
+        'aluno_id': mat.aluno_id,
+        'nome_aluno': mat.aluno.user.first_name or mat.aluno.user.username,
+        'nome_curso': mat.curso.nome,
+        'qtd_faltas': qtd_faltas,
+        'faltas_anterior': faltas_anterior,
+        'tendencia': _tendencia(qtd_faltas, faltas_anterior),
+        'nome_responsavel': mat.aluno.nome_responsavel,
+        'link_zap': f"55{fone_limpo}" if fone_limpo else None,
+    }
+
+
+def _ordenar(lista):
+    # Quem tem mais faltas aparece primeiro
+    lista.sort(key=lambda x: (-x['qtd_faltas'], x['nome_aluno'].lower(), x['matricula_id']))
+    return lista
+
+
+class ListaRisco:
+    # Lista de risco ordenada pelo próprio banco: len()/count() viram um COUNT e
+    # as fatias um LIMIT/OFFSET, e só os itens da fatia são montados. É o que o
+    # Paginator e o card do dashboard usam, sem trazer a lista inteira.
+
+    def __init__(self, matriculas):
+        self.matriculas = matriculas
+        self._total = None
+
+    def count(self):
+        if self._total is None:
+            self._total = self.matriculas.count()
+        return self._total
+
+    __len__ = count
+
+    def __getitem__(self, indice):
+        if isinstance(indice, slice):
+            return [_montar_item(mat, mat.qtd_faltas, mat.faltas_anterior) for mat in self.matriculas[indice]]
+        mat = self.matriculas[indice]
+        return _montar_item(mat, mat.qtd_faltas, mat.faltas_anterior)
+
+    def __iter__(self):
+        return iter(self[:])
+
+
+def _risco_por_periodo(inicio, fim, inicio_anterior, limite):
+    # Uma consulta só: cada matrícula ativa já vem com as faltas do período
+    # atual e do período anterior (para a tendência), junto com aluno/curso.
+    faltas_atual = Q(presenca__presente=False, presenca__data_aula__gte=inicio, presenca__data_aula__lt=fim)
+    faltas_anterior = Q(presenca__presente=False, presenca__data_aula__gte=inicio_anterior, presenca__data_aula__lt=inicio)
+
+    matriculas = Matricula.objects.filter(ativo=True)
+    if limite > 0:
+        # Filtro antes do annotate: o JOIN com as presenças já vem restrito às
+        # faltas das duas janelas (o índice (matricula, data_aula) atende), em
+        # vez de varrer todo o histórico e só filtrar dentro do COUNT
+        matriculas = matriculas.filter(
+            presenca__presente=False, presenca__data_aula__gte=inicio_anterior, presenca__data_aula__lt=fim,
+        )
+    matriculas = matriculas.annotate(
+        qtd_faltas=Count('presenca', filter=faltas_atual),
+        faltas_anterior=Count('presenca', filter=faltas_anterior),
+    ).filter(
+        qtd_faltas__gte=limite
+    ).select_related('aluno__user', 'curso').order_by(
+        # Mesma ordem do _ordenar: mais faltas, nome (first_name ou username) e id
+        '-qtd_faltas',
+        Lower(Coalesce(NullIf(F('aluno__user__first_name'), Value('')), F('aluno__user__username'))),
+        'id',
+    )
+
+    return ListaRisco(matriculas)
+
+
+def _risco_por_ultimas_aulas(qtd_aulas, hoje, limite):
+    # Numera as chamadas de cada matrícula da mais recente para a mais antiga
+    # e traz só as 2N últimas: as N primeiras são a janela atual e as N seguintes
+    # servem de comparação para a tendência.
+    chamadas = Presenca.objects.filter(
+        matricula__ativo=True,
+        data_aula__lte=hoje,
+    ).annotate(
+        ordem=Window(
+            expression=RowNumber(),
+            partition_by=[F('matricula_id')],
+            order_by=F('data_aula').desc(),
+        )
+    ).filter(
+        ordem__lte=qtd_aulas * 2
+    ).values_list('matricula_id', 'presente', 'ordem')
+
+    contagem = {}
+    for matricula_id, presente, ordem in chamadas:
+        atual, anterior = contagem.get(matricula_id, (0, 0))
+        if not presente:
+            if ordem <= qtd_aulas:
+                atual += 1
+            else:
+                anterior += 1
+        contagem[matricula_id] = (atual, anterior)
+
+    ids_risco = [mat_id for mat_id, (atual, _) in contagem.items() if atual >= limite]
+    if not ids_risco:
+        return []
+
+    matriculas = Matricula.objects.filter(id__in=ids_risco).select_related('aluno__user', 'curso')
+    return [_montar_item(mat, *contagem[mat.id]) for mat in matriculas]
+
+
+# Matrículas ativas com faltas >= limite na janela escolhida, já ordenadas:
+#   - 'mes':   faltas no mês (ano/mes), comparado com o mês anterior;
+#   - 'dias':  faltas nos últimos `qtd` dias, comparado com os `qtd` dias antes disso;
+#   - 'aulas': faltas nas últimas `qtd` chamadas de cada matrícula,
+#              comparado com as `qtd` chamadas anteriores.
+# Nas janelas 'mes' e 'dias' devolve uma ListaRisco (contagem e fatias no
+# banco); na de 'aulas', que conta as chamadas em Python, uma lista comum.
+def consultar_risco(ano=None, mes=None, limite=None, janela=JANELA_MES, qtd=None, hoje=None):
+    hoje = hoje or timezone.localdate()
+    limite = LIMITE_FALTAS_PADRAO if limite is None else limite
+
+    if janela == JANELA_AULAS:
+        return _ordenar(_risco_por_ultimas_aulas(qtd or 4, hoje, limite))
+    if janela == JANELA_DIAS:
+        dias = qtd or 30
+        fim = hoje + datetime.timedelta(days=1)
+        inicio = fim - datetime.timedelta(days=dias)
+        inicio_anterior = inicio - datetime.timedelta(days=dias)
+        return _risco_por_periodo(inicio, fim, inicio_anterior, limite)
+
+    periodo = Periodo(ano or hoje.year, mes or hoje.month)
+    inicio, fim = periodo.limites()
+    inicio_anterior = periodo.anterior().inicio
+    return _risco_por_periodo(inicio, fim, inicio_anterior, limite)
+
+
+def alunos_em_risco(*args, **kwargs):
+    # A lista inteira (para exportar, ou quando são poucos)
+    return list(consultar_risco(*args, **kwargs))
@@ -0,0 +1,146 @@
+from django.contrib.auth.models import User
+from django.db.backends.signals import connection_created
+from django.db.models.signals import pre_save, post_save, post_delete
+
+from .models import Aluno, Pagamento, Doacao, PagamentoProfessor, Despesa, Matricula, Presenca, Curso, Professor
+from . import resumo, busca, autocompletar, painel_professor, papel
+
+# =======================================================
+# MANUTENÇÃO INCREMENTAL DO RESUMO MENSAL
+# Antes de salvar guardamos o mês antigo do objeto (a data ou o status podem
+# mudar na edição); depois de salvar/apagar recalculamos só os meses afetados.
+# =======================================================
+
+MODELOS_RESUMO = (Pagamento, Doacao, PagamentoProfessor, Despesa, Matricula)
+
+
+def _guardar_periodo_antigo(sender, instance, **kwargs):
+    instance._periodo_resumo_antigo = None
+    if instance.pk:
+        antigo = sender.objects.filter(pk=instance.pk).first()
+        if antigo:
+            instance._periodo_resumo_antigo = resumo.periodo_do_objeto(antigo)
+
+
+def _atualizar_resumo(sender, instance, **kwargs):
+    periodos = {
+        getattr(instance, '_periodo_resumo_antigo', None),
+        resumo.periodo_do_objeto(instance),
+    }
+    for periodo in periodos:
+        if periodo:
+            resumo.atualizar_mes(sender, *periodo)
+
+
+for _modelo in MODELOS_RESUMO:
+    pre_save.connect(_guardar_periodo_antigo, sender=_modelo, dispatch_uid=f'resumo_pre_save_{_modelo.__name__}')
+    post_save.connect(_atualizar_resumo, sender=_modelo, dispatch_uid=f'resumo_post_save_{_modelo.__name__}')
+    post_delete.connect(_atualizar_resumo, sender=_modelo, dispatch_uid=f'resumo_post_delete_{_modelo.__name__}')
+
+
+# =======================================================
+# ÍNDICE DE BUSCA DE ALUNOS
+# O Aluno.save() já atualiza o índice; aqui só tiramos quem foi apagado.
+# =======================================================
+
+def _remover_aluno_da_busca(sender, instance, **kwargs):
+    busca.remover_do_indice(instance.pk)
+
+
+post_delete.connect(_remover_aluno_da_busca, sender=Aluno, dispatch_uid='busca_post_delete_aluno')
+
+
+# PostgreSQL: limiar de similaridade do operador %> usado na busca (índice GIN)
+def _configurar_busca_postgres(sender, connection, **kwargs):
+    if connection.vendor == 'postgresql':
+        busca.configurar_conexao(connection)
+
+
+connection_created.connect(_configurar_busca_postgres, dispatch_uid='busca_configurar_postgres')
+
+
+# O índice em memória do autocompletar é refeito na próxima busca
+# (o nome fica no User, então a edição do usuário também invalida)
+def _invalidar_autocompletar(sender, instance, **kwargs):
+    autocompletar.invalidar_indice()
+
+
+# O índice só guarda nome e usuário: o login (update_fields=['last_login']) e
+# outros saves parciais não refazem o índice. Usuário novo ainda não é aluno
+# (o Aluno.save() invalida)
+CAMPOS_DO_AUTOCOMPLETAR = {'first_name', 'username'}
+
+
+def _invalidar_autocompletar_usuario(sender, instance, created=False, update_fields=None, **kwargs):
+    if created or (update_fields is not None and not CAMPOS_DO_AUTOCOMPLETAR & set(update_fields)):
+        return
+    autocompletar.invalidar_indice()
+
+
+post_save.connect(_invalidar_autocompletar, sender=Aluno, dispatch_uid='autocompletar_post_save_aluno')
+post_delete.connect(_invalidar_autocompletar, sender=Aluno, dispatch_uid='autocompletar_post_delete_aluno')
+post_save.connect(_invalidar_autocompletar_usuario, sender=User, dispatch_uid='autocompletar_post_save_user')
+
+
+# =======================================================
+# PAINEL DO PROFESSOR (CACHE POR PROFESSOR E DATA)
+# Chamada ou matrícula mudou: nova versão só do painel daquele professor.
+# Curso ou nome de aluno mudou: nova versão de todos os painéis.
+# Presença apagada sozinha não tem signal de propósito: um receiver de
+# post_delete faria o Django apagar as presenças uma a uma no cascade da
+# matrícula (que já invalida o painel). O painel expira em TEMPO_CACHE.
+# =======================================================
+
+def _invalidar_painel_presenca(sender, instance, **kwargs):
+    painel_professor.invalidar_matricula(instance.matricula_id)
+
+
+def _guardar_curso_antigo(sender, instance, **kwargs):
+    # A matrícula pode trocar de curso: o painel do professor antigo também muda
+    instance._curso_id_antigo = None
+    if instance.pk:
+        instance._curso_id_antigo = sender.objects.filter(pk=instance.pk).values_list('curso_id', flat=True).first()
+
+
+def _invalidar_painel_matricula(sender, instance, **kwargs):
+    cursos = {getattr(instance, '_curso_id_antigo', None), instance.curso_id}
+    for curso_id in cursos:
+        if curso_id:
+            painel_professor.invalidar_curso(curso_id)
+
+
+def _invalidar_paineis(sender, instance, update_fields=None, **kwargs):
+    # O login só grava o last_login: não muda nada no painel
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    painel_professor.invalidar_todos()
+
+
+post_save.connect(_invalidar_painel_presenca, sender=Presenca, dispatch_uid='painel_post_save_presenca')
+pre_save.connect(_guardar_curso_antigo, sender=Matricula, dispatch_uid='painel_pre_save_matricula')
+post_save.connect(_invalidar_painel_matricula, sender=Matricula, dispatch_uid='painel_post_save_matricula')
+post_delete.connect(_invalidar_painel_matricula, sender=Matricula, dispatch_uid='painel_post_delete_matricula')
+post_save.connect(_invalidar_paineis, sender=Curso, dispatch_uid='painel_post_save_curso')
+post_delete.connect(_invalidar_paineis, sender=Curso, dispatch_uid='painel_post_delete_curso')
+post_save.connect(_invalidar_paineis, sender=User, dispatch_uid='painel_post_save_user')
+
+
+# =======================================================
+# PAPEL DO USUÁRIO (request.role, ver academia/papel.py)
+# Virou ou deixou de ser aluno/professor: só o papel daquele usuário.
+# Curso criado, apagado ou com outro professor: todos os papéis.
+# =======================================================
+
+def _invalidar_papel_usuario(sender, instance, **kwargs):
+    papel.invalidar_usuario(instance.user_id)
+
+
+def _invalidar_papeis(sender, instance, **kwargs):
+    papel.invalidar_todos()
+
+
+for _modelo in (Aluno, Professor):
+    post_save.connect(_invalidar_papel_usuario, sender=_modelo, dispatch_uid=f'papel_post_save_{_modelo.__name__}')
+    post_delete.connect(_invalidar_papel_usuario, sender=_modelo, dispatch_uid=f'papel_post_delete_{_modelo.__name__}')
+post_save.connect(_invalidar_papeis, sender=Curso, dispatch_uid='papel_post_save_curso')
+post_delete.connect(_invalidar_papeis, sender=Curso, dispatch_uid='papel_post_delete_curso')
@@ -0,0 +1,19 @@
+// Campos pesquisáveis (SelectAutocompletar): o select2 busca as opções por AJAX
+// na URL do atributo data-ajax--url, enquanto a pessoa digita.
+document.addEventListener('DOMContentLoaded', function () {
+    $('.select-autocompletar').each(function () {
+        $(this).select2({
+            width: '100%',
+            allowClear: true,
+            ajax: {
+                delay: 250,
+                data: function (params) { return { q: params.term }; }
+            },
+            language: {
+                inputTooShort: function () { return 'Digite pelo menos 2 letras...'; },
+                noResults: function () { return 'Nenhum resultado'; },
+                searching: function () { return 'Buscando...'; }
+            }
+        });
+    });
+});
@@ -0,0 +1,353 @@
+import datetime
+import logging
+import multiprocessing
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from django.conf import settings
+from django.db import close_old_connections, connection, connections
+from django.db.models import F
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils import timezone
+
+from . import processo_tarefas
+from .models import Tarefa
+from .replica import usando_replica
+
+logger = logging.getLogger('academia.tarefas')
+
+# =======================================================
+# TAREFAS EM SEGUNDO PLANO (FILA NO PRÓPRIO BANCO)
+# A view chama enfileirar('gerar_folha', usuario, ano=..., mes=...) e
+# responde na hora com a página da tarefa, que vai perguntando o progresso.
+# Quem executa é o trabalhador:
+#
+#   python manage.py rodar_tarefas --trabalhadores 2 --modo thread --continuo
+#
+# Cada trabalhador pega uma tarefa por vez com um UPDATE condicional (só um
+# consegue passar de "Na fila" para "Rodando"), chama a função registrada com
+# @tarefa e grava o resultado. Se a função der erro, a tarefa volta para a
+# fila com espera crescente até maximo_tentativas; ErroTarefa desiste na hora
+# (erro do usuário, como planilha inválida: tentar de novo não adianta).
+# Enquanto roda, o progresso renova travada_ate: se o trabalhador morrer, a
+# tarefa volta para a fila quando o prazo vencer.
+#
+# Não precisa de Redis nem Celery: é o mesmo banco do sistema.
+# =======================================================
+
+# Arquivos gerados pelas tarefas (relatórios) e planilhas enviadas para importar.
+# Fora do MEDIA_ROOT de propósito: têm dados pessoais e só saem pela view de download.
+PASTA = Path(getattr(settings, 'TAREFAS_PASTA', Path(settings.BASE_DIR) / 'tarefas'))
+TRABALHADORES = getattr(settings, 'TAREFAS_TRABALHADORES', 1)
+# Segundos entre verificações da fila quando ela está vazia (modo contínuo)
+INTERVALO = getattr(settings, 'TAREFAS_INTERVALO', 5)
+ESPERA_TENTATIVA = datetime.timedelta(seconds=getattr(settings, 'TAREFAS_ESPERA_TENTATIVA', 30))
+TEMPO_TRAVA = datetime.timedelta(minutes=getattr(settings, 'TAREFAS_TEMPO_TRAVA', 15))
+# O progresso vai para o banco no máximo uma vez a cada tantos segundos
+INTERVALO_PROGRESSO = 1.0
+ERRO_TRABALHADOR_CAIU = "O trabalhador parou no meio da tarefa em todas as tentativas."
+
+TIPOS = {}
+
+
+class ErroTarefa(Exception):
+    # Falha definitiva: a tarefa vai direto para "Erro", sem nova tentativa
+    pass
+
+
+def tarefa(nome, rotulo, maximo_tentativas=3):
+    # Registra a função que executa as tarefas do tipo `nome`.
+    # Ela recebe o Progresso e os parâmetros e devolve o resultado (dict):
+    #   {'mensagem': '...', 'url': link para ver o resultado, 'arquivo': nome em PASTA}
+    def decorador(funcao):
+        funcao.rotulo = rotulo
+        funcao.maximo_tentativas = maximo_tentativas
+        TIPOS[nome] = funcao
+        return funcao
+    return decorador
+
+
+def rotulo(tipo):
+    funcao = TIPOS.get(tipo)
+    return funcao.rotulo if funcao else tipo
+
+
+class Progresso:
+    def __init__(self, tarefa):
+        self.tarefa = tarefa
+        self._ultima_gravacao = 0
+
+    def __call__(self, atual, total=None, etapa=None, forcar=False):
+        # progresso(3, 10, 'Importando linhas') ou progresso(50) (percentual)
+        percentual = int(atual * 100 / total) if total else int(atual)
+        self.tarefa.progresso = max(0, min(percentual, 100))
+        if etapa is not None:
+            self.tarefa.etapa = etapa[:200]
+        agora = time.monotonic()
+        if forcar or agora - self._ultima_gravacao >= INTERVALO_PROGRESSO:
+            self._ultima_gravacao = agora
+            Tarefa.objects.filter(id=self.tarefa.id).update(
+                progresso=self.tarefa.progresso, etapa=self.tarefa.etapa,
+                travada_ate=timezone.now() + TEMPO_TRAVA,
+            )
+
+
+def enfileirar(tipo, usuario=None, **parametros):
+    if tipo not in TIPOS:
+        raise ValueError(f"Tipo de tarefa desconhecido: {tipo}")
+    return Tarefa.objects.create(
+        tipo=tipo, parametros=parametros, maximo_tentativas=TIPOS[tipo].maximo_tentativas,
+        criada_por=usuario if usuario is not None and usuario.is_authenticated else None,
+    )
+
+
+def pendente_do_tipo(tipo):
+    # Tarefa desse tipo ainda na fila ou rodando (para não enfileirar outra igual)
+    return Tarefa.objects.filter(tipo=tipo, status__in=[Tarefa.PENDENTE, Tarefa.RODANDO]).first()
+
+
+# -------------------------------------------------------
+# Execução
+# -------------------------------------------------------
+
+def liberar_travadas():
+    # Tarefas de um trabalhador que caiu no meio (sem memória, PIL derrubando
+    # o processo...). A tentativa já foi contada quando a tarefa foi pega: se
+    # ela esgotou as tentativas vai para "Erro", senão volta para a fila.
+    # Sem isso, uma tarefa que sempre derruba o trabalhador rodaria para sempre.
+    agora = timezone.now()
+    travadas = Tarefa.objects.filter(status=Tarefa.RODANDO, travada_ate__lt=agora)
+    desistidas = travadas.filter(tentativas__gte=F('maximo_tentativas')).update(
+        status=Tarefa.ERRO, erro=ERRO_TRABALHADOR_CAIU, travada_ate=None, terminada_em=agora,
+    )
+    return desistidas + travadas.update(status=Tarefa.PENDENTE, travada_ate=None)
+
+
+def pegar_proxima():
+    agora = timezone.now()
+    candidatas = Tarefa.objects.filter(
+        status=Tarefa.PENDENTE, executar_a_partir_de__lte=agora,
+    ).order_by('executar_a_partir_de', 'id').values_list('id', flat=True)[:10]
+    for tarefa_id in candidatas:
+        # A tentativa conta já aqui (e não no fim): se o trabalhador morrer no
+        # meio, ela continua contada para o liberar_travadas
+        pegou = Tarefa.objects.filter(id=tarefa_id, status=Tarefa.PENDENTE).update(
+            status=Tarefa.RODANDO, travada_ate=agora + TEMPO_TRAVA, iniciada_em=agora,
+            tentativas=F('tentativas') + 1,
+        )
+        if pegou:
+            return Tarefa.objects.get(id=tarefa_id)
+    return None
+
+
+def executar(tarefa):
+    # tarefa.tentativas já inclui esta (contada no pegar_proxima)
+    progresso = Progresso(tarefa)
+    try:
+        funcao = TIPOS.get(tarefa.tipo)
+        if funcao is None:
+            raise ErroTarefa(f"Tipo de tarefa desconhecido: {tarefa.tipo}")
+        resultado = funcao(progresso, **tarefa.parametros)
+    except Exception as erro:
+        logger.warning("Tarefa %s (%s) falhou na tentativa %s: %s", tarefa.id, tarefa.tipo, tarefa.tentativas, erro)
+        definitivo = isinstance(erro, ErroTarefa) or tarefa.tentativas >= tarefa.maximo_tentativas
+        tarefa.erro = str(erro) if isinstance(erro, ErroTarefa) else traceback.format_exc()[-4000:]
+        if definitivo:
+            tarefa.status = Tarefa.ERRO
+            tarefa.terminada_em = timezone.now()
+        else:
+            tarefa.status = Tarefa.PENDENTE
+            tarefa.executar_a_partir_de = timezone.now() + ESPERA_TENTATIVA * 2 ** (tarefa.tentativas - 1)
+    else:
+        tarefa.status = Tarefa.CONCLUIDA
+        tarefa.progresso = 100
+        tarefa.resultado = resultado or {}
+        tarefa.erro = ''
+        tarefa.terminada_em = timezone.now()
+    tarefa.travada_ate = None
+    tarefa.save(update_fields=[
+        'status', 'progresso', 'etapa', 'resultado', 'erro', 'tentativas',
+        'executar_a_partir_de', 'travada_ate', 'terminada_em',
+    ])
+    return tarefa
+
+
+def trabalhar(continuo=False, intervalo=INTERVALO, parar=None, gerenciar_conexoes=True):
+    # Laço de um trabalhador: executa tarefas até a fila esvaziar (ou para
+    # sempre, com `continuo`). Devolve quantas executou.
+    # gerenciar_conexoes=False só nos testes (que rodam dentro de uma transação).
+    executadas = 0
+    try:
+        while parar is None or not parar.is_set():
+            if gerenciar_conexoes:
+                close_old_connections()
+            liberar_travadas()
+            tarefa = pegar_proxima()
+            if tarefa is None:
+                if not continuo:
+                    break
+                if parar is not None:
+                    parar.wait(intervalo)
+                else:
+                    time.sleep(intervalo)
+                continue
+            executar(tarefa)
+            executadas += 1
+    finally:
+        if gerenciar_conexoes:
+            connection.close()
+    return executadas
+
+
+def rodar(trabalhadores=TRABALHADORES, modo='thread', continuo=False, intervalo=INTERVALO, parar=None):
+    # Sobe `trabalhadores` laços em threads ou em processos separados
+    # (processos: tarefas que usam muita CPU não disputam o mesmo GIL).
+    if modo == 'processo':
+        connections.close_all()  # conexões abertas não podem ir para outro processo
+        executor = ProcessPoolExecutor(trabalhadores, mp_context=multiprocessing.get_context('spawn'))
+        # Event de thread não atravessa processos (Ctrl+C encerra todos)
+        futuros = [executor.submit(processo_tarefas.trabalhar, continuo, intervalo) for _ in range(trabalhadores)]
+    else:
+        executor = ThreadPoolExecutor(trabalhadores, thread_name_prefix='tarefa')
+        futuros = [executor.submit(trabalhar, continuo, intervalo, parar) for _ in range(trabalhadores)]
+    with executor:
+        try:
+            return sum(futuro.result() for futuro in futuros)
+        except KeyboardInterrupt:
+            # Avisa as threads antes de o `with` esperar por elas
+            if parar is not None:
+                parar.set()
+            raise
+
+
+def caminho_do_arquivo(tarefa):
+    # Arquivo gerado pela tarefa (ou None)
+    nome = (tarefa.resultado or {}).get('arquivo')
+    if not nome or Path(nome).name != nome:
+        return None
+    caminho = PASTA / nome
+    return caminho if caminho.is_file() else None
+
+
+# =======================================================
+# TAREFAS DO SISTEMA
+# =======================================================
+
+@tarefa('gerar_folha', 'Folha de pagamento dos professores')
+def _gerar_folha(progresso, ano, mes):
+    from . import folha
+    progresso(10, etapa='Calculando presenças do mês', forcar=True)
+    itens = folha.gerar_folha(ano, mes)
+    total = sum(item['valor'] for item in itens)
+    return {
+        'mensagem': f"Folha de {mes:02d}/{ano} gerada: {len(itens)} professores, R$ {total:.2f}.",
+        'url': f"{reverse('financeiro_professores')}?mes={mes}&ano={ano}",
+    }
+
+
+@tarefa('recalcular_resumo', 'Fechamento financeiro (recalcular resumo mensal)')
+def _recalcular_resumo(progresso):
+    from . import resumo
+    progresso(10, etapa='Somando pagamentos, doações, folha e despesas', forcar=True)
+    meses = resumo.reconstruir_tudo()
+    return {'mensagem': f"Resumo mensal recalculado: {meses} mês(es).", 'url': reverse('relatorio_financeiro')}
+
+
+@tarefa('relatorio_alunos', 'Relatório de alunos para impressão')
+def _relatorio_alunos(progresso, filtros):
+    from .forms import RelatorioAlunoForm
+    from .models import Aluno
+
+    # Só leitura: vai para a réplica, se houver (academia/replica.py)
+    with usando_replica():
+        form = RelatorioAlunoForm(filtros)
+        if not form.is_valid():
+            raise ErroTarefa("Filtros inválidos.")
+        alunos = Aluno.objects.select_related('user').order_by('user__username')
+        curso = form.cleaned_data.get('curso')
+        origem = form.cleaned_data.get('origem')
+        if curso:
+            alunos = alunos.filter(matricula__curso=curso, matricula__ativo=True)
+        if origem == 'secretaria':
+            alunos = alunos.filter(criado_por_admin=True)
+        elif origem == 'site':
+            alunos = alunos.filter(criado_por_admin=False)
+        alunos = list(alunos.distinct())
+
+    progresso(50, etapa=f'Montando o relatório ({len(alunos)} alunos)', forcar=True)
+    html = render_to_string('academia/relatorio_imprimir.html', {'alunos': alunos, 'form': form, 'modo_impressao': True})
+    nome = f'relatorio-alunos-{progresso.tarefa.id}.html'
+    PASTA.mkdir(parents=True, exist_ok=True)
+    (PASTA / nome).write_text(html, encoding='utf-8')
+    return {'mensagem': f"Relatório pronto: {len(alunos)} alunos.", 'arquivo': nome}
+
+
+@tarefa('importar_planilha', 'Importação de planilha')
+def _importar_planilha(progresso, recurso, arquivo):
+    import tablib
+    from .resources import AlunoResource, MatriculaResource
+
+    recursos = {'alunos': AlunoResource, 'matriculas': MatriculaResource}
+    caminho = PASTA / 'entrada' / arquivo
+    if recurso not in recursos or Path(arquivo).name != arquivo or not caminho.is_file():
+        raise ErroTarefa("Planilha não encontrada.")
+
+    progresso(5, etapa='Lendo a planilha', forcar=True)
+    formato = caminho.suffix.lstrip('.').lower()
+    try:
+        if formato == 'csv':
+            dataset = tablib.Dataset().load(caminho.read_text(encoding='utf-8-sig'), format='csv')
+        else:
+            dataset = tablib.Dataset().load(caminho.read_bytes(), format=formato)
+    except Exception as erro:
+        raise ErroTarefa(f"Não foi possível ler a planilha ({formato}): {erro}")
+
+    progresso(20, etapa=f'Importando {len(dataset)} linhas', forcar=True)
+    # Sem rollback_on_validation_errors o import-export grava as linhas boas
+    # mesmo com linhas inválidas no arquivo
+    resultado = recursos[recurso]().import_data(
+        dataset, dry_run=False, raise_errors=False, use_transactions=True, rollback_on_validation_errors=True,
+    )
+    if resultado.base_errors:
+        # Erro fora das linhas (banco ocupado, por exemplo): nada foi gravado, tenta de novo
+        raise RuntimeError(resultado.base_errors[0].error)
+    caminho.unlink(missing_ok=True)
+
+    erros = [
+        f"Linha {linha.number}: " + '; '.join(f"{campo}: {' '.join(mensagens)}" for campo, mensagens in linha.error_dict.items())
+        for linha in resultado.invalid_rows
+    ]
+    erros += [f"Linha {numero}: {erro.error}" for numero, erros_linha in resultado.row_errors() for erro in erros_linha]
+    totais = resultado.totals
+    if erros:
+        # A importação é uma transação só: com erro, nada foi gravado
+        return {'mensagem': f"Nada foi importado: {len(erros)} linha(s) com erro.", 'erros': erros[:50]}
+    return {
+        'mensagem': f"Importação concluída: {totais.get('new', 0)} novos, {totais.get('update', 0)} atualizados, {totais.get('skip', 0)} ignorados.",
+        'url': reverse('listar_alunos'),
+    }
+
+
+@tarefa('enviar_mensagens', 'Envio das mensagens de cobrança')
+def _enviar_mensagens(progresso):
+    from . import mensageria
+    pendentes = mensageria.situacao_da_fila()[mensageria.MensagemSaida.PENDENTE]
+
+    class EnviadorComProgresso:
+        # Mesmo enviador configurado, avisando o progresso a cada mensagem
+        def __init__(self, enviador):
+            self.enviador = enviador
+            self.feitas = 0
+
+        def enviar(self, mensagem):
+            self.feitas += 1
+            progresso(self.feitas, pendentes, etapa=f"{self.feitas} de {pendentes} mensagens")
+            self.enviador.enviar(mensagem)
+
+    resultado = mensageria.processar_fila(EnviadorComProgresso(mensageria.obter_enviador()))
+    return {
+        'mensagem': f"{resultado['enviadas']} enviadas, {resultado['falhas']} com falha (voltam para a fila), {resultado['desistidas']} desistidas.",
+        'url': reverse('area_cobranca'),
+    }
@@ -0,0 +1,48 @@
+from django import template
+from django.utils.html import format_html
+
+from ..imagens import variantes, url_variante
+
+register = template.Library()
+
+# Uso:
+#   {% load imagens %}
+#   {% imagem_responsiva curso.imagem 400 classe="card-img-top" alt=curso.nome %}
+#   <img src="{{ aluno.foto|variante:80 }}">
+# `largura` é a largura em que a imagem aparece na tela (px). O navegador
+# escolhe a cópia certa pelo srcset (telas de alta densidade pegam a maior).
+
+
+def _srcset(copias):
+    return ', '.join(f'{url} {largura}w' for url, largura in copias)
+
+
+@register.simple_tag
+def imagem_responsiva(campo, largura=320, classe='', alt='', style='', sizes='', lazy=True):
+    if not campo:
+        return ''
+    sizes = sizes or f'{largura}px'
+    carregamento = 'lazy' if lazy else 'eager'
+
+    copias = variantes(campo)
+    if not copias:
+        return format_html(
+            '<img src="{}" class="{}" alt="{}" style="{}" loading="{}" decoding="async">',
+            campo.url, classe, alt, style, carregamento,
+        )
+
+    return format_html(
+        '<picture>'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" class="{}" alt="{}" style="{}" loading="{}" decoding="async">'
+        '</picture>',
+        _srcset(copias['webp']), sizes,
+        url_variante(campo, largura), _srcset(copias['jpg']), sizes,
+        classe, alt, style, carregamento,
+    )
+
+
+@register.filter
+def variante(campo, largura):
+    # URL (JPEG) da cópia com pelo menos `largura` px
+    return url_variante(campo, int(largura))
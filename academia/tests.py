@@ -1,3 +1,926 @@
-from django.test import TestCase
+import csv
+import datetime
+import io
+import json
+import os
+import tempfile
+import threading
+from decimal import Decimal
+from unittest import mock
+import tablib
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
 
-# Create your tests here.
+from . import urls
+from . import autocompletar, chamada, cobranca, exportacao, folha, imagens, importacao, medicao_sqlite, mensageria, painel_professor, papel, replica, resumo, risco, tarefas
+from .armazenamento import armazenamento_comprovantes, sha256_dos_bytes
+from .middleware import GrudarNoPrincipalMiddleware
+from .periodo import Periodo
+from .consultas import ColetorConsultas, impressao_digital, orcamento_da_view
+from .resources import AlunoResource, MatriculaResource
+from .models import Aluno, Curso, Matricula, MensagemPadrao, MensagemSaida, Pagamento, PagamentoProfessor, Presenca, Professor, ResumoMensal, Tarefa
+
+# =======================================================
+# ORÇAMENTO DE CONSULTAS
+# Toda view de academia/urls.py marcada com @orcamento_consultas(N) é aberta
+# aqui com uma base "cheia" (vários alunos, matrículas, chamadas e
+# pagamentos). Se ela fizer mais de N consultas (ex.: um N+1 novo num loop do
+# template), o teste falha mostrando as consultas repetidas.
+# =======================================================
+
+QUANTIDADE_ALUNOS = 25
+
+_localdate = timezone.localdate
+
+
+class OrcamentoConsultasTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('secretaria', password='x', is_staff=True)
+        usuario_professor = User.objects.create_user('professor', password='x', first_name='Professor')
+        cls.professor = Professor.objects.create(user=usuario_professor)
+        cursos = [
+            Curso.objects.create(nome='Violão', professor=cls.professor),
+            Curso.objects.create(nome='Teclado', professor=cls.professor),
+        ]
+        # As matrículas são de segunda e o teste roda "numa segunda" (localdate
+        # fixo), para as telas com as aulas do dia terem o que mostrar
+        hoje = cls.segunda = datetime.date.today() - datetime.timedelta(days=datetime.date.today().weekday())
+        for i in range(QUANTIDADE_ALUNOS):
+            usuario = User.objects.create_user(f'aluno{i}', password='x', first_name=f'Aluno {i}')
+            aluno = Aluno.objects.create(user=usuario, telefone=f'2199999{i:04d}', nome_responsavel='Responsável' if i % 2 else None)
+            for curso in cursos:
+                matricula = Matricula.objects.create(aluno=aluno, curso=curso, dia_semana='SEG', hora_aula='08:00')
+                for dias in (0, 7, 14):
+                    Presenca.objects.create(matricula=matricula, data_aula=hoje - datetime.timedelta(days=dias), presente=bool(i % 3))
+            if i % 2:
+                Pagamento.objects.create(
+                    aluno=aluno, curso=cursos[0], mes=f'{hoje.month:02d}', ano=hoje.year,
+                    valor=Decimal('50'), data_pagamento=hoje, confirmado=True,
+                )
+
+        cls.usuarios = {'staff': cls.staff, 'professor': usuario_professor}
+        # Valores para os parâmetros das URLs (<int:curso_id> etc.)
+        cls.parametros = {
+            'curso_id': cursos[0].id,
+            'aluno_id': aluno.id,
+            'id': aluno.id,
+            'professor_id': cls.professor.id,
+            'matricula_id': matricula.id,
+        }
+
+    def _hoje_e_segunda(self, valor=None, fuso=None):
+        return self.segunda if valor is None else _localdate(valor, fuso)
+
+    @mock.patch('django.utils.timezone.localdate')
+    def test_views_dentro_do_orcamento(self, localdate):
+        localdate.side_effect = self._hoje_e_segunda
+        medidas = 0
+        for padrao in urls.urlpatterns:
+            maximo = orcamento_da_view(padrao.callback)
+            if maximo is None:
+                continue
+            medidas += 1
+            with self.subTest(view=padrao.name, rota=str(padrao.pattern)):
+                kwargs = {nome: self.parametros[nome] for nome in padrao.pattern.converters}
+                self.client.force_login(self.usuarios[padrao.callback.orcamento_consultas_como])
+                with ColetorConsultas() as coletor:
+                    resposta = self.client.get(reverse(padrao.name, kwargs=kwargs))
+                self.assertEqual(resposta.status_code, 200)
+                repetidas = '\n'.join(f'  {vezes}x {sql[:200]}' for sql, vezes in coletor.repetidas().items())
+                self.assertLessEqual(
+                    coletor.total, maximo,
+                    f'{padrao.name} fez {coletor.total} consultas (orçamento: {maximo}). Repetidas:\n{repetidas}',
+                )
+        self.assertGreater(medidas, 0)
+
+
+class ColetorConsultasTests(TestCase):
+
+    def test_conta_e_agrupa_consultas_repetidas(self):
+        with ColetorConsultas() as coletor:
+            for i in range(3):
+                list(Curso.objects.filter(id=i))
+            Aluno.objects.count()
+        self.assertEqual(coletor.total, 4)
+        self.assertEqual(list(coletor.repetidas().values()), [3])
+        self.assertEqual(len(coletor.mais_lentas(2)), 2)
+        self.assertEqual(coletor.resumo()['consultas'], 4)
+
+    def test_impressao_digital_ignora_valores(self):
+        self.assertEqual(
+            impressao_digital("SELECT * FROM t WHERE id = 3 AND nome = 'Ana' AND x IN (1, 2, 3)"),
+            impressao_digital("SELECT * FROM t WHERE id = 17 AND nome = 'Bia' AND x IN (4)"),
+        )
+
+    def test_fora_do_bloco_nao_registra(self):
+        with ColetorConsultas() as coletor:
+            pass
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        self.assertEqual(coletor.total, 0)
+
+
+class PainelProfessorTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        usuario = User.objects.create_user('professor', password='x')
+        cls.professor = Professor.objects.create(user=usuario)
+        cls.curso = Curso.objects.create(nome='Violão', professor=cls.professor)
+        cls.hoje = datetime.date.today()
+
+    def setUp(self):
+        cache.clear()
+
+    def _matricular(self, quantidade):
+        matriculas = []
+        for i in range(quantidade):
+            usuario = User.objects.create_user(f'aluno{Aluno.objects.count()}', first_name=f'Aluno {i}')
+            aluno = Aluno.objects.create(user=usuario, telefone='21999990000')
+            matriculas.append(Matricula.objects.create(aluno=aluno, curso=self.curso))
+        return matriculas
+
+    def _consultas_do_painel(self):
+        cache.clear()
+        with ColetorConsultas() as coletor:
+            painel_professor.carregar_painel(self.professor.id, self.hoje)
+        return coletor.total
+
+    def test_consultas_nao_crescem_com_os_alunos(self):
+        self._matricular(2)
+        poucos = self._consultas_do_painel()
+        self._matricular(10)
+        Curso.objects.create(nome='Teclado', professor=self.professor)
+        self.assertEqual(self._consultas_do_painel(), poucos)
+
+    def test_chamada_e_matricula_invalidam_o_cache(self):
+        matricula, = self._matricular(1)
+        painel = painel_professor.carregar_painel(self.professor.id, self.hoje)
+        self.assertIsNone(painel[0]['lista_alunos'][0]['status_hoje'])
+
+        # Guardado no cache: nenhuma consulta ao banco
+        with ColetorConsultas() as coletor:
+            painel_professor.carregar_painel(self.professor.id, self.hoje)
+        self.assertEqual(coletor.total, 0)
+
+        # Upsert em lote (sem signals)
+        chamada.registrar_chamada(self.curso, self.hoje, {matricula.id: True})
+        painel = painel_professor.carregar_painel(self.professor.id, self.hoje)
+        self.assertIs(painel[0]['lista_alunos'][0]['status_hoje'], True)
+
+        matricula.ativo = False
+        matricula.save()
+        painel = painel_professor.carregar_painel(self.professor.id, self.hoje)
+        self.assertEqual(painel[0]['lista_alunos'], [])
+
+    def test_troca_de_curso_invalida_o_professor_antigo(self):
+        outro = Professor.objects.create(user=User.objects.create_user('outro_professor'))
+        teclado = Curso.objects.create(nome='Teclado', professor=outro)
+        matricula, = self._matricular(1)
+        painel = painel_professor.carregar_painel(self.professor.id, self.hoje)
+        self.assertEqual(len(painel[0]['lista_alunos']), 1)
+
+        matricula.curso = teclado
+        matricula.save()
+        painel = painel_professor.carregar_painel(self.professor.id, self.hoje)
+        self.assertEqual(painel[0]['lista_alunos'], [])
+        painel = painel_professor.carregar_painel(outro.id, self.hoje)
+        self.assertEqual(len(painel[0]['lista_alunos']), 1)
+
+    def test_chamada_json_so_aceita_booleanos(self):
+        matricula, = self._matricular(1)
+        self.client.force_login(self.professor.user)
+        url = reverse('salvar_chamada', args=[self.curso.id])
+        for valor in ('false', 0, None):
+            dados = {'data_aula': self.hoje.isoformat(), 'presencas': {str(matricula.id): valor}}
+            resposta = self.client.post(url, dados, content_type='application/json')
+            self.assertEqual(resposta.status_code, 400)
+        self.assertFalse(Presenca.objects.exists())
+
+        dados = {'data_aula': self.hoje.isoformat(), 'presencas': {str(matricula.id): False}}
+        self.assertEqual(self.client.post(url, dados, content_type='application/json').json(), {'salvos': 1})
+        self.assertIs(Presenca.objects.get().presente, False)
+
+    def test_chamada_com_data_impossivel_volta_com_erro(self):
+        matricula, = self._matricular(1)
+        self.client.force_login(self.professor.user)
+        url = reverse('salvar_chamada', args=[self.curso.id])
+        resposta = self.client.post(url, {'data_aula': '2026-02-30', f'presenca_{matricula.id}': '1'})
+        self.assertRedirects(resposta, reverse('home'), fetch_redirect_response=False)
+        self.assertFalse(Presenca.objects.exists())
+
+
+class EnviadorQueFalha:
+    def enviar(self, mensagem):
+        raise mensageria.ErroEnvio('fora do ar')
+
+
+class MensageriaTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        curso = Curso.objects.create(nome='Violão')
+        for i, telefone in enumerate(['(21) 99999-0001', '(21) 99999-0002', '']):
+            usuario = User.objects.create_user(f'aluno{i}', first_name=f'Aluno {i}')
+            aluno = Aluno.objects.create(user=usuario, telefone=telefone, nome_responsavel='Mãe' if i == 0 else None)
+            Matricula.objects.create(aluno=aluno, curso=curso, dia_semana='SEG', hora_aula='08:00')
+        cls.modelo = MensagemPadrao.objects.create(titulo='Leve', texto='Oi [NOME], a mensalidade de {aluno} em [CURSO] está em aberto.')
+        cls.hoje = datetime.date.today()
+
+    def test_compila_e_personaliza(self):
+        compilada = mensageria.compilar(self.modelo.texto)
+        self.assertEqual(
+            compilada.renderizar({'nome': 'Mãe', 'aluno': 'Ana', 'curso': 'Violão'}),
+            'Oi Mãe, a mensalidade de Ana em Violão está em aberto.',
+        )
+        self.assertIs(mensageria.compilar(self.modelo.texto), compilada)
+
+    def test_enfileira_sem_duplicar(self):
+        novas, sem_telefone = mensageria.enfileirar_cobranca(self.hoje.year, self.hoje.month, self.modelo)
+        self.assertEqual((novas, sem_telefone), (2, 1))
+        self.assertEqual(
+            MensagemSaida.objects.get(aluno__user__username='aluno0').texto,
+            'Oi Mãe, a mensalidade de Aluno 0 em Violão está em aberto.',
+        )
+        self.assertEqual(mensageria.enfileirar_cobranca(self.hoje.year, self.hoje.month, self.modelo), (0, 1))
+
+    def test_envia_com_limite_e_tenta_de_novo(self):
+        mensageria.enfileirar_cobranca(self.hoje.year, self.hoje.month)
+
+        contagem = mensageria.processar_fila(EnviadorQueFalha(), dormir=lambda segundos: None)
+        self.assertEqual(contagem['falhas'], 2)
+        # Ainda não chegou a hora da nova tentativa
+        self.assertEqual(mensageria.processar_fila(EnviadorQueFalha(), dormir=lambda segundos: None), {})
+        MensagemSaida.objects.update(enviar_a_partir_de=datetime.datetime(2000, 1, 1, tzinfo=datetime.timezone.utc))
+
+        esperas = []
+        with tempfile.TemporaryDirectory() as pasta:
+            contagem = mensageria.processar_fila(mensageria.EnviadorArquivo(pasta), por_minuto=30, dormir=esperas.append)
+            linhas = open(f'{pasta}/{mensageria.nome_da_campanha(self.hoje.year, self.hoje.month)}.jsonl', encoding='utf-8').readlines()
+        self.assertEqual(contagem['enviadas'], 2)
+        self.assertEqual(len(linhas), 2)
+        self.assertEqual(json.loads(linhas[0])['texto'], mensageria.TEXTO_PADRAO)
+        self.assertEqual(len(esperas), 1)
+        self.assertAlmostEqual(esperas[0], 2, delta=0.5)
+        self.assertEqual(mensageria.situacao_da_fila()[MensagemSaida.ENVIADA], 2)
+
+
+class TarefasTests(TestCase):
+
+    def setUp(self):
+        self.tentativas = []
+
+        @tarefas.tarefa('teste_instavel', 'Teste', maximo_tentativas=2)
+        def instavel(progresso, falhas):
+            self.tentativas.append(progresso.tarefa.tentativas)
+            progresso(1, 2, 'metade', forcar=True)
+            if len(self.tentativas) <= falhas:
+                raise RuntimeError('falhou')
+            return {'mensagem': 'pronto'}
+
+    def tearDown(self):
+        tarefas.TIPOS.pop('teste_instavel', None)
+
+    def _liberar_novas_tentativas(self):
+        Tarefa.objects.update(executar_a_partir_de=datetime.datetime(2000, 1, 1, tzinfo=datetime.timezone.utc))
+
+    def test_tenta_de_novo_e_conclui(self):
+        tarefa = tarefas.enfileirar('teste_instavel', falhas=1)
+        self.assertEqual(tarefas.trabalhar(gerenciar_conexoes=False), 1)
+        tarefa.refresh_from_db()
+        self.assertEqual((tarefa.status, tarefa.progresso, tarefa.etapa), (Tarefa.PENDENTE, 50, 'metade'))
+        # Espera crescente: ainda não é hora da segunda tentativa
+        self.assertEqual(tarefas.trabalhar(gerenciar_conexoes=False), 0)
+
+        self._liberar_novas_tentativas()
+        tarefas.trabalhar(gerenciar_conexoes=False)
+        tarefa.refresh_from_db()
+        self.assertEqual((tarefa.status, tarefa.progresso, tarefa.resultado), (Tarefa.CONCLUIDA, 100, {'mensagem': 'pronto'}))
+        self.assertEqual(self.tentativas, [1, 2])
+
+    def test_desiste_depois_do_maximo(self):
+        tarefa = tarefas.enfileirar('teste_instavel', falhas=5)
+        tarefas.trabalhar(gerenciar_conexoes=False)
+        self._liberar_novas_tentativas()
+        tarefas.trabalhar(gerenciar_conexoes=False)
+        tarefa.refresh_from_db()
+        self.assertEqual((tarefa.status, tarefa.tentativas), (Tarefa.ERRO, 2))
+        self.assertIn('falhou', tarefa.erro)
+
+    def test_trabalhador_que_morre_conta_como_tentativa(self):
+        tarefa = tarefas.enfileirar('teste_instavel', falhas=0)
+        vencida = datetime.datetime(2000, 1, 1, tzinfo=datetime.timezone.utc)
+        for tentativa in (1, 2):
+            # Pegou e "morreu": nada além do pegar_proxima roda, e o prazo vence
+            self.assertEqual(tarefas.pegar_proxima().id, tarefa.id)
+            Tarefa.objects.filter(id=tarefa.id).update(travada_ate=vencida)
+            self.assertEqual(tarefas.liberar_travadas(), 1)
+            tarefa.refresh_from_db()
+            self.assertEqual(tarefa.tentativas, tentativa)
+
+        self.assertEqual((tarefa.status, tarefa.erro), (Tarefa.ERRO, tarefas.ERRO_TRABALHADOR_CAIU))
+        self.assertIsNone(tarefas.pegar_proxima())
+        self.assertEqual(self.tentativas, [])
+
+    def test_folha_vira_tarefa_e_a_tela_acompanha(self):
+        staff = User.objects.create_user('secretaria', is_staff=True)
+        self.client.force_login(staff)
+        resposta = self.client.get(reverse('gerar_folha') + '?mes=3&ano=2026')
+        tarefa = Tarefa.objects.get()
+        self.assertRedirects(resposta, reverse('ver_tarefa', args=[tarefa.id]))
+        self.assertEqual(self.client.get(reverse('status_tarefa', args=[tarefa.id])).json()['status'], Tarefa.PENDENTE)
+
+        tarefas.trabalhar(gerenciar_conexoes=False)
+        dados = self.client.get(reverse('status_tarefa', args=[tarefa.id])).json()
+        self.assertEqual(dados['status'], Tarefa.CONCLUIDA)
+        self.assertIn('03/2026', dados['mensagem'])
+
+
+class BancoSqliteTests(TestCase):
+
+    def setUp(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.caminho = f'{pasta.name}/teste.sqlite3'
+
+    def _abrir(self, apelido):
+        banco = medicao_sqlite.abrir('ajustado', self.caminho, apelido)
+        self.addCleanup(medicao_sqlite.fechar, banco)
+        return banco
+
+    def test_pragmas_de_producao(self):
+        with self._abrir('sqlite_pragmas').cursor() as cursor:
+            valores = {}
+            for pragma in ('journal_mode', 'synchronous', 'foreign_keys', 'busy_timeout'):
+                cursor.execute(f'PRAGMA {pragma}')
+                valores[pragma] = cursor.fetchone()[0]
+        self.assertEqual(valores, {'journal_mode': 'wal', 'synchronous': 1, 'foreign_keys': 1, 'busy_timeout': 20000})
+
+    def test_trava_serializa_escritores_sem_travar_leitores(self):
+        banco = self._abrir('sqlite_a')
+        with banco.cursor() as cursor:
+            cursor.execute('CREATE TABLE t (id INTEGER PRIMARY KEY)')
+        gravou, leu = threading.Event(), threading.Event()
+
+        def outra_thread():
+            outro = medicao_sqlite.abrir('ajustado', self.caminho, 'sqlite_b')
+            try:
+                with outro.cursor() as cursor:
+                    cursor.execute('SELECT COUNT(*) FROM t')
+                    leu.set()
+                    cursor.execute('INSERT INTO t (id) VALUES (2)')
+                    gravou.set()
+            finally:
+                medicao_sqlite.fechar(outro)
+
+        with transaction.atomic(using='sqlite_a'):
+            banco.cursor().execute('INSERT INTO t (id) VALUES (1)')
+            thread = threading.Thread(target=outra_thread)
+            thread.start()
+            # A leitura passa; a escrita espera a transação terminar
+            self.assertTrue(leu.wait(5))
+            self.assertFalse(gravou.wait(0.3))
+        self.assertTrue(gravou.wait(5))
+        thread.join()
+        self.assertFalse(banco.com_trava)
+
+
+class ReplicaTests(TestCase):
+
+    def setUp(self):
+        self.roteador = replica.RoteadorReplica()
+        self.sessao = {}
+
+    def _pedido(self, metodo):
+        request = getattr(RequestFactory(), metodo)('/')
+        request.session = self.sessao
+        return request
+
+    def _banco_da_leitura(self, request):
+        @replica.ler_da_replica
+        def view(request):
+            return HttpResponse(self.roteador.db_for_read(Aluno) or 'default')
+        return GrudarNoPrincipalMiddleware(view)(request).content.decode()
+
+    def test_sem_replica_le_do_principal(self):
+        # Nos testes a réplica (se houver) é espelho do próprio banco
+        self.assertFalse(replica.configurada())
+        self.assertEqual(self._banco_da_leitura(self._pedido('get')), 'default')
+
+    @mock.patch.object(replica, 'configurada', return_value=True)
+    def test_le_da_replica_ate_gravar_algo(self, _):
+        self.assertEqual(self._banco_da_leitura(self._pedido('get')), replica.ALIAS)
+        self.assertIsNone(self.roteador.db_for_read(Aluno))
+        self.assertEqual(self.roteador.db_for_write(Aluno), 'default')
+
+        # O POST lê e grava no principal, e a sessão fica presa nele por um tempo
+        self.assertEqual(self._banco_da_leitura(self._pedido('post')), 'default')
+        self.assertEqual(self._banco_da_leitura(self._pedido('get')), 'default')
+        self.sessao[replica.CHAVE_SESSAO] = 0
+        self.assertEqual(self._banco_da_leitura(self._pedido('get')), replica.ALIAS)
+
+    @mock.patch.object(replica, 'configurada', return_value=True)
+    def test_streaming_gera_as_linhas_na_replica(self, _):
+        @replica.ler_da_replica
+        def exportar(request):
+            return StreamingHttpResponse(self.roteador.db_for_read(Aluno) or 'default' for _ in range(2))
+        response = exportar(self._pedido('get'))
+        self.assertEqual(b''.join(response.streaming_content), replica.ALIAS.encode() * 2)
+
+
+class PapelTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario_professor = User.objects.create_user('professor')
+        cls.professor = Professor.objects.create(user=cls.usuario_professor)
+        cls.curso = Curso.objects.create(nome='Violão', professor=cls.professor)
+        outro = Professor.objects.create(user=User.objects.create_user('outro'))
+        cls.curso_de_outro = Curso.objects.create(nome='Teclado', professor=outro)
+        aluno = Aluno.objects.create(user=User.objects.create_user('aluno'), telefone='21999990000')
+        cls.matricula = Matricula.objects.create(aluno=aluno, curso=cls.curso)
+        cls.matricula_de_outro = Matricula.objects.create(aluno=aluno, curso=cls.curso_de_outro)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_resolve_uma_vez_e_guarda_no_cache(self):
+        with ColetorConsultas() as coletor:
+            role = papel.papel_do_usuario(self.usuario_professor)
+        self.assertEqual(coletor.total, 1)
+        self.assertEqual((role.professor_id, role.aluno_id, role.cursos), (self.professor.id, None, {self.curso.id}))
+
+        with ColetorConsultas() as coletor:
+            papel.papel_do_usuario(self.usuario_professor)
+        self.assertEqual(coletor.total, 0)
+
+        aluno = papel.papel_do_usuario(self.matricula.aluno.user)
+        self.assertEqual((aluno.aluno_id, aluno.professor_id, aluno.cursos), (self.matricula.aluno_id, None, frozenset()))
+
+    def test_curso_e_cadastro_novos_invalidam(self):
+        papel.papel_do_usuario(self.usuario_professor)
+        novo = Curso.objects.create(nome='Bateria', professor=self.professor)
+        self.assertEqual(papel.papel_do_usuario(self.usuario_professor).cursos, {self.curso.id, novo.id})
+
+        Aluno.objects.create(user=self.usuario_professor, telefone='21999990001')
+        self.assertIsNotNone(papel.papel_do_usuario(self.usuario_professor).aluno_id)
+
+    def test_professor_so_mexe_nas_proprias_turmas(self):
+        self.client.force_login(self.usuario_professor)
+        self.assertEqual(self.client.get(reverse('definir_horario', args=[self.matricula.id])).status_code, 200)
+        self.assertRedirects(
+            self.client.get(reverse('definir_horario', args=[self.matricula_de_outro.id])),
+            reverse('home'), fetch_redirect_response=False,
+        )
+
+    def test_autorizacao_nao_usa_o_cache(self):
+        role = papel.papel_do_usuario(self.usuario_professor)
+        self.assertTrue(role.pode_gerenciar_curso(self.curso.id))
+
+        # update() não dispara signals: o papel no cache continua velho, como
+        # num processo que não viu a invalidação
+        Curso.objects.filter(id=self.curso.id).update(professor=self.curso_de_outro.professor)
+        role = papel.papel_do_usuario(self.usuario_professor)
+        self.assertIn(self.curso.id, role.cursos)
+        self.assertFalse(role.pode_gerenciar_curso(self.curso.id))
+        self.assertFalse(role.eh_professor_do_curso(self.curso.id))
+
+
+class RiscoEvasaoTests(TestCase):
+
+    def test_conta_so_as_faltas_das_janelas(self):
+        professor = Professor.objects.create(user=User.objects.create_user('professor'))
+        curso = Curso.objects.create(nome='Violão', professor=professor)
+        aluno = Aluno.objects.create(user=User.objects.create_user('aluno'), telefone='21999990000')
+        matricula = Matricula.objects.create(aluno=aluno, curso=curso)
+        for dia, presente in [(2, False), (9, False), (16, True)]:
+            Presenca.objects.create(matricula=matricula, data_aula=datetime.date(2026, 3, dia), presente=presente)
+        Presenca.objects.create(matricula=matricula, data_aula=datetime.date(2026, 2, 2), presente=False)
+        Presenca.objects.create(matricula=matricula, data_aula=datetime.date(2025, 3, 2), presente=False)
+
+        item, = risco.alunos_em_risco(ano=2026, mes=3, limite=2)
+        self.assertEqual((item['qtd_faltas'], item['faltas_anterior'], item['tendencia']), (2, 1, risco.TENDENCIA_SUBINDO))
+        self.assertEqual(risco.alunos_em_risco(ano=2026, mes=4, limite=2), [])
+
+    def test_mes_invalido_cai_no_mes_atual(self):
+        self.client.force_login(User.objects.create_user('secretaria', is_staff=True))
+        for consulta in ('?mes=abc', '?mes=13', '?ano=x'):
+            self.assertEqual(self.client.get(reverse('relatorio_risco') + consulta).status_code, 200)
+
+    def test_ordena_e_fatia_no_banco(self):
+        professor = Professor.objects.create(user=User.objects.create_user('professor'))
+        curso = Curso.objects.create(nome='Violão', professor=professor)
+        # (first_name, faltas): empates de faltas desempatam pelo nome, sem
+        # diferenciar maiúsculas, e quem não tem first_name usa o username
+        for i, (nome, faltas) in enumerate([('bia', 2), ('Ana', 3), ('', 2), ('carla', 4), ('Bruno', 2)]):
+            usuario = User.objects.create_user(f'z{i}', first_name=nome)
+            aluno = Aluno.objects.create(user=usuario, telefone='21999990000')
+            matricula = Matricula.objects.create(aluno=aluno, curso=curso)
+            for dia in range(1, faltas + 1):
+                Presenca.objects.create(matricula=matricula, data_aula=datetime.date(2026, 3, dia), presente=False)
+
+        lista = risco.consultar_risco(ano=2026, mes=3, limite=2)
+        nomes = [item['nome_aluno'] for item in lista]
+        self.assertEqual(nomes, ['carla', 'Ana', 'bia', 'Bruno', 'z2'])
+        self.assertEqual([item['nome_aluno'] for item in risco._ordenar(list(lista))], nomes)
+
+        # Um COUNT e um LIMIT/OFFSET, sem carregar as outras matrículas
+        with ColetorConsultas() as coletor:
+            lista = risco.consultar_risco(ano=2026, mes=3, limite=2)
+            self.assertEqual(lista.count(), 5)
+            self.assertEqual([item['nome_aluno'] for item in lista[1:3]], ['Ana', 'bia'])
+        self.assertEqual(coletor.total, 2)
+
+        self.client.force_login(User.objects.create_user('secretaria', is_staff=True))
+        with mock.patch('academia.views.RISCO_NO_DASHBOARD', 2):
+            resposta = self.client.get(reverse('dashboard_adm') + '?mes=3&ano=2026')
+        self.assertEqual(resposta.context['total_risco'], 5)
+        self.assertEqual([item['nome_aluno'] for item in resposta.context['lista_risco']], ['carla', 'Ana'])
+
+
+class PeriodoTests(TestCase):
+
+    def test_ano_fora_do_date_e_recusado(self):
+        for ano in (0, 9999, -5):
+            with self.assertRaises(ValueError):
+                Periodo(ano, 12)
+        self.assertEqual(Periodo(9998, 12).fim, datetime.date(9999, 1, 1))
+
+    def test_periodo_invalido_na_url_cai_no_mes_atual(self):
+        self.client.force_login(User.objects.create_user('secretaria', is_staff=True))
+        paginas = ('relatorio_financeiro', 'relatorio_risco', 'dashboard_adm', 'financeiro_professores', 'area_cobranca')
+        for nome in paginas:
+            for consulta in ('?ano=0&mes=3', '?ano=9999&mes=12', '?ano=1&mes=1', '?mes=abc'):
+                resposta = self.client.get(reverse(nome) + consulta)
+                self.assertEqual(resposta.status_code, 200, f'{nome}{consulta}')
+
+
+class CobrancaTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        professor = Professor.objects.create(user=User.objects.create_user('professor'))
+        curso = Curso.objects.create(nome='Violão', professor=professor)
+        cls.aluno = Aluno.objects.create(user=User.objects.create_user('aluno'), telefone='21999990000')
+        Aluno.objects.filter(id=cls.aluno.id).update(data_matricula=datetime.date(2025, 1, 1))
+        Matricula.objects.create(aluno=cls.aluno, curso=curso, dia_semana='SEG')
+        Pagamento.objects.create(aluno=cls.aluno, curso=curso, valor=50, ano=2025, mes='11', confirmado=True)
+
+    def _devedores(self, ano, mes, atraso):
+        return list(cobranca.alunos_inadimplentes(ano, mes, meses_atraso=atraso).values_list('id', flat=True))
+
+    def test_janela_de_atraso_atravessa_o_ano(self):
+        # Pagou novembro/2025: em janeiro/2026 deve dez e jan, mas não nov-dez-jan
+        self.assertEqual(self._devedores(2026, 1, 2), [self.aluno.id])
+        self.assertEqual(self._devedores(2026, 1, 3), [])
+        self.assertEqual(self._devedores(2025, 11, 1), [])
+        self.assertEqual(self._devedores(2026, 10, 11), [self.aluno.id])
+        self.assertEqual(self._devedores(2026, 10, 12), [])
+
+    def test_atraso_enorme_na_url_fica_no_historico(self):
+        self.client.force_login(User.objects.create_user('secretaria', is_staff=True))
+        resposta = self.client.get(reverse('area_cobranca') + '?atraso=100000')
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.context['meses_atraso'], cobranca.MESES_HISTORICO)
+
+
+class AutocompletarTests(TestCase):
+
+    def test_login_nao_descarta_o_indice(self):
+        usuario = User.objects.create_user('ana', first_name='Ana Silva', password='x')
+        Aluno.objects.create(user=usuario, telefone='21999990000')
+        versao = cache.get(autocompletar.CHAVE_VERSAO)
+
+        self.client.login(username='ana', password='x')
+        self.assertEqual(cache.get(autocompletar.CHAVE_VERSAO), versao)
+
+        usuario.first_name = 'Ana Souza'
+        usuario.save()
+        self.assertNotEqual(cache.get(autocompletar.CHAVE_VERSAO), versao)
+
+    def test_invalidar_logo_depois_de_montar_nao_devolve_none(self):
+        # Simula outra thread invalidando no instante em que a montagem solta a trava
+        trava = threading.Lock()
+
+        class TravaQueInvalida:
+            def __enter__(self):
+                trava.acquire()
+
+            def __exit__(self, *erro):
+                trava.release()
+                if not invalidou:
+                    invalidou.append(True)
+                    autocompletar.invalidar_indice()
+
+        invalidou = []
+        montar = lambda: autocompletar.IndicePrefixos([], {})
+        with mock.patch.object(autocompletar, 'montar_indice', side_effect=montar), \
+                mock.patch.object(autocompletar, '_trava', TravaQueInvalida()), \
+                mock.patch.object(autocompletar, '_indice', None):
+            self.assertIsNotNone(autocompletar.obter_indice())
+        self.assertTrue(invalidou)
+
+
+class VariantesImagemTests(TestCase):
+
+    def setUp(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        configuracao = override_settings(MEDIA_ROOT=pasta.name)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        cache.clear()
+
+    def _foto_deitada(self):
+        # 400x200 com EXIF "girar 90°": na tela fica 200x400
+        from PIL import Image
+        from django.core.files.base import ContentFile
+        from django.core.files.storage import default_storage
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        buffer = io.BytesIO()
+        Image.new('RGB', (400, 200), 'red').save(buffer, 'JPEG', exif=exif)
+        nome = default_storage.save('fotos/deitada.jpg', ContentFile(buffer.getvalue()))
+        return Aluno(foto=nome).foto
+
+    def test_gera_uma_vez_e_nao_decodifica_de_novo(self):
+        from PIL import Image
+        foto = self._foto_deitada()
+        copias = imagens.variantes(foto)
+        self.assertEqual([largura for _, largura in copias['jpg']], [160, 200])
+
+        # Cache limpo, cópias já no disco: o original não é decodificado
+        cache.clear()
+        with mock.patch.object(Image.Image, 'load', side_effect=AssertionError('decodificou')):
+            self.assertEqual(imagens.variantes(foto), copias)
+
+
+class ArmazenamentoComprovantesTests(TestCase):
+
+    def setUp(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        configuracao = override_settings(MEDIA_ROOT=pasta.name)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        self.armazenamento = armazenamento_comprovantes()
+        # PDF não é imagem: passa pelo armazenamento sem ser comprimido
+        self.conteudo = b'%PDF-1.4 recibo de teste'
+
+    def _blob(self, nome):
+        return self.armazenamento.path(self.armazenamento.caminho_cas(sha256_dos_bytes(self.conteudo), nome))
+
+    def _inodes(self):
+        # {nome relativo: (inode, conteúdo)} de tudo que está no MEDIA_ROOT
+        raiz = self.armazenamento.location
+        arquivos = {}
+        for pasta, _, nomes in os.walk(raiz):
+            for nome in nomes:
+                caminho = os.path.join(pasta, nome)
+                with open(caminho, 'rb') as arquivo:
+                    arquivos[os.path.relpath(caminho, raiz)] = (os.stat(caminho).st_ino, arquivo.read())
+        return arquivos
+
+    def test_uploads_iguais_dividem_o_mesmo_inode(self):
+        primeiro = self.armazenamento.save('comprovantes/aluno.pdf', ContentFile(self.conteudo))
+        segundo = self.armazenamento.save('comprovantes/secretaria.pdf', ContentFile(self.conteudo))
+        inode = os.stat(self.armazenamento.path(primeiro)).st_ino
+        self.assertEqual(os.stat(self.armazenamento.path(segundo)).st_ino, inode)
+        self.assertEqual(os.stat(self._blob(primeiro)).st_ino, inode)
+        self.assertEqual(self.armazenamento.referencias(primeiro), 2)
+
+    def test_apagar_mantem_os_outros_e_o_ultimo_libera_o_conteudo(self):
+        primeiro = self.armazenamento.save('comprovantes/aluno.pdf', ContentFile(self.conteudo))
+        segundo = self.armazenamento.save('comprovantes/secretaria.pdf', ContentFile(self.conteudo))
+        blob = self._blob(primeiro)
+
+        self.armazenamento.delete(primeiro)
+        self.assertFalse(self.armazenamento.exists(primeiro))
+        with self.armazenamento.open(segundo) as arquivo:
+            self.assertEqual(arquivo.read(), self.conteudo)
+        self.assertTrue(os.path.exists(blob))
+
+        self.armazenamento.delete(segundo)
+        self.assertFalse(os.path.exists(blob))
+
+    def test_deduplicar_duas_vezes_da_o_mesmo_resultado(self):
+        # Comprovantes antigos, gravados como arquivos comuns antes do cas/
+        raiz = self.armazenamento.location
+        os.makedirs(os.path.join(raiz, 'comprovantes'))
+        nomes = ['comprovantes/jan.pdf', 'comprovantes/jan_copia.pdf']
+        for nome in nomes:
+            with open(os.path.join(raiz, nome), 'wb') as arquivo:
+                arquivo.write(self.conteudo)
+        aluno = Aluno.objects.create(user=User.objects.create_user('aluno'), telefone='21999990000')
+        for nome in nomes:
+            Pagamento.objects.create(aluno=aluno, valor=50, ano=2026, mes='01', comprovante=nome)
+
+        call_command('deduplicar_comprovantes', stdout=io.StringIO())
+        depois_da_primeira = self._inodes()
+        self.assertEqual(depois_da_primeira[nomes[0]], depois_da_primeira[nomes[1]])
+        self.assertEqual(len({inode for inode, _ in depois_da_primeira.values()}), 1)
+
+        saida = io.StringIO()
+        call_command('deduplicar_comprovantes', stdout=saida)
+        self.assertEqual(self._inodes(), depois_da_primeira)
+        self.assertIn('0 B de espaço liberado', saida.getvalue())
+
+
+class ImportacaoPlanilhaTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.professor = Professor.objects.create(user=User.objects.create_user('professor'))
+        cls.curso = Curso.objects.create(nome='Violão', professor=cls.professor)
+        usuario = User.objects.create_user('maria', first_name='Maria')
+        cls.aluna = Aluno.objects.create(user=usuario, telefone='21999990000')
+
+    def _alunos(self, *linhas, dry_run=False):
+        dados = tablib.Dataset(*linhas, headers=['username', 'first_name', 'telefone'])
+        return AlunoResource().import_data(dados, dry_run=dry_run)
+
+    def _matriculas(self, *linhas, dry_run=False):
+        dados = tablib.Dataset(*linhas, headers=['username', 'curso'])
+        return MatriculaResource().import_data(dados, dry_run=dry_run)
+
+    def test_linha_nova_cria_usuario_e_aluno(self):
+        resultado = self._alunos(['joao', 'João', '21988887777'])
+        self.assertFalse(resultado.has_errors() or resultado.has_validation_errors())
+        aluno = Aluno.objects.get(user__username='joao')
+        self.assertEqual((aluno.user.first_name, aluno.telefone), ('João', '21988887777'))
+        self.assertTrue(aluno.user.check_password(importacao.SENHA_PADRAO))
+        self.assertEqual(aluno.busca_normalizada, aluno.calcular_busca_normalizada())
+
+    def test_linha_existente_atualiza_sem_duplicar(self):
+        resultado = self._alunos(['maria', 'Maria', '21977776666'])
+        self.assertFalse(resultado.has_errors() or resultado.has_validation_errors())
+        self.assertEqual(Aluno.objects.filter(user__username='maria').count(), 1)
+        self.aluna.refresh_from_db()
+        self.assertEqual(self.aluna.telefone, '21977776666')
+
+        resultado = self._matriculas(['maria', 'violão'])
+        self.assertEqual(Matricula.objects.get(aluno=self.aluna).curso, self.curso)
+        Matricula.objects.filter(aluno=self.aluna).update(ativo=False)
+        self._matriculas(['maria', 'Violão'])
+        matricula, = Matricula.objects.filter(aluno=self.aluna)
+        self.assertTrue(matricula.ativo)
+
+    def test_username_inexistente_vira_erro_na_linha(self):
+        resultado = self._matriculas(['fantasma', 'Violão'], ['maria', 'Violão'], dry_run=True)
+        self.assertTrue(resultado.has_validation_errors())
+        linha_com_erro, = resultado.invalid_rows
+        self.assertEqual(linha_com_erro.number, 1)
+        self.assertIn("Aluno 'fantasma' não encontrado.", str(linha_com_erro.error_dict))
+
+    def test_tarefa_com_linha_invalida_nao_grava_nenhuma(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        entrada = os.path.join(pasta.name, 'entrada')
+        os.makedirs(entrada)
+        with open(os.path.join(entrada, 'matriculas.csv'), 'w', encoding='utf-8') as arquivo:
+            arquivo.write('username,curso\nfantasma,Violão\nmaria,Violão\n')
+
+        with mock.patch.object(tarefas, 'PASTA', tarefas.Path(pasta.name)):
+            tarefa = tarefas.enfileirar('importar_planilha', recurso='matriculas', arquivo='matriculas.csv')
+            tarefas.trabalhar(gerenciar_conexoes=False)
+        tarefa.refresh_from_db()
+        self.assertEqual(tarefa.status, Tarefa.CONCLUIDA)
+        self.assertIn('Nada foi importado', tarefa.resultado['mensagem'])
+        self.assertIn("Linha 1: username: Aluno 'fantasma' não encontrado.", tarefa.resultado['erros'])
+        self.assertFalse(Matricula.objects.exists())
+
+    def test_dry_run_nao_grava_nada(self):
+        usuarios, alunos = User.objects.count(), Aluno.objects.count()
+        resultado = self._alunos(['joao', 'João', '21988887777'], ['maria', 'Maria', '21977776666'], dry_run=True)
+        self.assertFalse(resultado.has_errors() or resultado.has_validation_errors())
+        self.assertEqual((User.objects.count(), Aluno.objects.count()), (usuarios, alunos))
+        self.aluna.refresh_from_db()
+        self.assertEqual(self.aluna.telefone, '21999990000')
+
+        self._matriculas(['maria', 'Teclado'], dry_run=True)
+        self.assertFalse(Matricula.objects.exists())
+        self.assertFalse(Curso.objects.filter(nome='Teclado').exists())
+
+
+class ResumoMensalTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.aluno = Aluno.objects.create(user=User.objects.create_user('aluno'), telefone='21999990000')
+
+    def _resumo(self):
+        # {(ano, mes): colunas} sem os meses zerados (o incremental deixa a
+        # linha com zero, a reconstrução nem cria)
+        colunas = [coluna for coluna, *_ in resumo.FONTES.values()]
+        linhas = {}
+        for linha in ResumoMensal.objects.values('ano', 'mes', *colunas):
+            valores = tuple(linha[coluna] for coluna in colunas)
+            if any(valores):
+                linhas[(linha['ano'], linha['mes'])] = valores
+        return linhas
+
+    def assertResumoIgualAoRecalculado(self):
+        incremental = self._resumo()
+        resumo.reconstruir_tudo()
+        self.assertEqual(incremental, self._resumo())
+        return incremental
+
+    def test_criar_editar_e_apagar_pagamento(self):
+        outro = Pagamento.objects.create(aluno=self.aluno, valor=30, ano=2026, mes='03', data_pagamento=datetime.date(2026, 3, 5), confirmado=True)
+        pagamento = Pagamento.objects.create(aluno=self.aluno, valor=50, ano=2026, mes='03', data_pagamento=datetime.date(2026, 3, 10), confirmado=True)
+        self.assertEqual(self.assertResumoIgualAoRecalculado()[(2026, 3)][0], Decimal('80'))
+
+        # Trocou de mês: sai de março e entra em abril
+        pagamento.data_pagamento = datetime.date(2026, 4, 2)
+        pagamento.save()
+        resultado = self.assertResumoIgualAoRecalculado()
+        self.assertEqual((resultado[(2026, 3)][0], resultado[(2026, 4)][0]), (Decimal('30'), Decimal('50')))
+
+        # Desconfirmado: não conta mais
+        pagamento.confirmado = False
+        pagamento.save()
+        self.assertNotIn((2026, 4), self.assertResumoIgualAoRecalculado())
+
+        pagamento.confirmado = True
+        pagamento.valor = 70
+        pagamento.save()
+        self.assertEqual(self.assertResumoIgualAoRecalculado()[(2026, 4)][0], Decimal('70'))
+
+        pagamento.delete()
+        outro.delete()
+        self.assertEqual(self.assertResumoIgualAoRecalculado(), {})
+
+
+class FolhaProfessoresTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.com_valor = Professor.objects.create(user=User.objects.create_user('ana'))
+        cls.sem_valor = Professor.objects.create(user=User.objects.create_user('bruno'))
+        cls.violao = Curso.objects.create(nome='Violão', professor=cls.com_valor, valor_por_aluno=Decimal('50.00'))
+        cls.teclado = Curso.objects.create(nome='Teclado', professor=cls.sem_valor)
+
+    def _presenca(self, curso, dia=3):
+        usuario = User.objects.create_user(f'aluno{User.objects.count()}')
+        aluno = Aluno.objects.create(user=usuario, telefone='21999990000')
+        matricula = Matricula.objects.create(aluno=aluno, curso=curso)
+        Presenca.objects.create(matricula=matricula, data_aula=datetime.date(2026, 3, dia), presente=True)
+
+    def _lancamentos(self):
+        return {
+            p.professor_id: (p.qtd_alunos, p.valor_total)
+            for p in PagamentoProfessor.objects.filter(ano=2026, mes=3)
+        }
+
+    def test_gerar_de_novo_atualiza_sem_duplicar(self):
+        self._presenca(self.violao)
+        self._presenca(self.teclado)
+        folha.gerar_folha(2026, 3)
+        self.assertEqual(self._lancamentos(), {
+            self.com_valor.id: (1, Decimal('50.00')),
+            self.sem_valor.id: (1, folha.VALOR_POR_ALUNO_PADRAO),
+        })
+
+        self._presenca(self.violao)
+        folha.gerar_folha(2026, 3)
+        self.assertEqual(PagamentoProfessor.objects.filter(ano=2026, mes=3).count(), 2)
+        self.assertEqual(self._lancamentos()[self.com_valor.id], (2, Decimal('100.00')))
+
+        # Lançamento já pago não muda mais
+        PagamentoProfessor.objects.filter(professor=self.com_valor).update(pago=True)
+        self._presenca(self.violao)
+        folha.gerar_folha(2026, 3)
+        self.assertEqual(self._lancamentos()[self.com_valor.id], (2, Decimal('100.00')))
+
+    def test_simular_nao_grava(self):
+        self._presenca(self.violao)
+        previa = folha.gerar_folha(2026, 3, simular=True)
+        self.assertFalse(PagamentoProfessor.objects.exists())
+        self.assertEqual({item['nome']: item['valor'] for item in previa}, {'ana': Decimal('50.00'), 'bruno': Decimal('0.00')})
+
+    def test_curso_sem_valor_usa_o_padrao(self):
+        self._presenca(self.teclado)
+        self._presenca(self.teclado, dia=10)
+        item, = [i for i in folha.calcular_folha(2026, 3) if i['professor'] == self.sem_valor]
+        self.assertEqual((item['qtd_alunos'], item['valor']), (2, (folha.VALOR_POR_ALUNO_PADRAO * 2).quantize(Decimal('0.01'))))
+        item, = [i for i in folha.calcular_folha(2026, 3, valor_padrao='20') if i['professor'] == self.sem_valor]
+        self.assertEqual(item['valor'], Decimal('40.00'))
+
+
+class ExportacaoCsvTests(TestCase):
+
+    def test_texto_que_vira_formula_sai_como_texto(self):
+        linhas = [('=HYPERLINK("http://x")', '+5521999990000', '-x', '@SOMA(A1)', 'Ana', Decimal('-5'), -3)]
+        resposta = exportacao.resposta_exportacao('alunos', 'csv', ['a', 'b', 'c', 'd', 'e', 'f', 'g'], linhas)
+        conteudo = b''.join(resposta.streaming_content).decode('utf-8-sig')
+        linha, = list(csv.reader(io.StringIO(conteudo), delimiter=';'))[1:]
+        self.assertEqual(linha, ["'=HYPERLINK(\"http://x\")", "'+5521999990000", "'-x", "'@SOMA(A1)", 'Ana', '-5,00', '-3'])
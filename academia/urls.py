@@ -8,12 +8,14 @@ urlpatterns = [
     path('registrar/', views.registrar_aluno, name='registrar'),
     path('dashboard/', views.dashboard_professor, name='dashboard_professor'),
     path('presenca/<int:matricula_id>/<int:status>/<str:data_aula>/', views.marcar_presenca, name='marcar_presenca'),
+    path('chamada/<int:curso_id>/salvar/', views.salvar_chamada, name='salvar_chamada'),
     path('relatorio/<int:curso_id>/', views.ver_relatorio, name='ver_relatorio'),
     path('pagamentos/', views.meus_pagamentos, name='meus_pagamentos'),
     path('pagamento/', views.registrar_pagamento, name='registrar_pagamento'),
     path('inscrever/<int:curso_id>/', views.inscrever_curso, name='inscrever_curso'),
     path('desligar/<int:curso_id>/', views.desligar_curso, name='desligar_curso'),
     path('admin-dashboard/', views.dashboard_adm, name='dashboard_adm'),
+    path('relatorios/risco/', views.relatorio_risco, name='relatorio_risco'),
     path('pagamento-manual/', views.pagamento_manual, name='pagamento_manual'),
     path('financeiro/aluno/<int:aluno_id>/', views.relatorio_financeiro_aluno, name='relatorio_financeiro_aluno'),
     path('cursos/adicionar/', views.adicionar_curso, name='adicionar_curso'),
@@ -36,6 +38,7 @@ urlpatterns = [
     path('desligar/<int:curso_id>/', views.desligar_curso, name='desligar_curso'),
     path('matricula/desligar-adm/<int:matricula_id>/', views.desligar_matricula_adm, name='desligar_matricula_adm'),
     path('financeiro/cobranca/', views.area_cobranca, name='area_cobranca'),
+    path('financeiro/cobranca/enfileirar/', views.enfileirar_cobranca, name='enfileirar_cobranca'),
     path('financeiro/mensagens/', views.gerenciar_mensagens, name='gerenciar_mensagens'),
     path('financeiro/mensagens/deletar/<int:mensagem_id>/', views.deletar_mensagem, name='deletar_mensagem'),
     path('agenda/', views.agenda_geral, name='agenda_geral'),
@@ -46,9 +49,22 @@ urlpatterns = [
     path('financeiro/doacao/', views.registrar_doacao, name='registrar_doacao'),
     path('financeiro/relatorio/', views.relatorio_financeiro, name='relatorio_financeiro'),
     path('alunos/', views.listar_alunos, name='listar_alunos'),
+    path('exportar/alunos/<str:formato>/', views.exportar_alunos, name='exportar_alunos'),
+    path('exportar/pagamentos/<str:formato>/', views.exportar_pagamentos, name='exportar_pagamentos'),
+    path('exportar/chamada/<int:curso_id>/<str:formato>/', views.exportar_presencas, name='exportar_presencas'),
+    path('tarefas/', views.listar_tarefas, name='listar_tarefas'),
+    path('tarefas/<int:tarefa_id>/', views.ver_tarefa, name='ver_tarefa'),
+    path('tarefas/<int:tarefa_id>/status/', views.status_tarefa, name='status_tarefa'),
+    path('tarefas/<int:tarefa_id>/arquivo/', views.baixar_resultado_tarefa, name='baixar_resultado_tarefa'),
+    path('tarefas/recalcular-resumo/', views.recalcular_resumo, name='recalcular_resumo'),
+    path('tarefas/importar-planilha/', views.importar_planilha, name='importar_planilha'),
+    path('desempenho/perfis/', views.listar_perfis, name='listar_perfis'),
+    path('desempenho/perfis/<str:nome>/<str:formato>/', views.baixar_perfil, name='baixar_perfil'),
     path('aluno/<int:aluno_id>/', views.ficha_aluno, name='ficha_aluno'),
     path('aluno/editar/<int:id>/', views.editar_aluno_adm, name='editar_aluno_adm'),
     path('ajax/verificar-usuario/', views.verificar_usuario_ajax, name='verificar_usuario_ajax'),
+    path('ajax/alunos/', views.autocompletar_alunos, name='autocompletar_alunos'),
+    path('ajax/matriculas/', views.autocompletar_matriculas, name='autocompletar_matriculas'),
     path('aluno/foto/<int:aluno_id>/', views.atualizar_foto_aluno, name='atualizar_foto_aluno'),
     path('adm/chamada/', views.gerenciar_chamada_adm, name='gerenciar_chamada_adm'),
     path('adm/chamada/marcar/<int:matricula_id>/<int:status>/<str:data_aula>/', views.marcar_presenca_adm_action, name='marcar_presenca_adm_action'),
@@ -1,42 +1,73 @@
 from django.shortcuts import render, redirect, get_object_or_404
 import datetime
+import json
+import os
+import uuid
 from django.utils import timezone # Import importante para o fuso horário
 from django.contrib.auth import login
-from django.db.models import Sum, Count, Q
+from django.db.models import Sum, Count, Q, Exists, OuterRef, Subquery, Prefetch, Value
+from django.db.models.functions import Coalesce
 from django.contrib.auth.decorators import login_required
 from django.contrib.admin.views.decorators import staff_member_required
-from django.http import JsonResponse
+from django.http import JsonResponse, Http404, FileResponse
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils.text import slugify
 from django.contrib.auth.models import User
 from unidecode import unidecode
 from django.utils.dateparse import parse_date
 from django.contrib import messages
 # IMPORTAÇÃO DOS MODELOS
-from .models import Curso, Presenca, Matricula, Pagamento, Aluno, Professor, PagamentoProfessor,Doacao, Despesa
+from .models import Curso, Presenca, Matricula, Pagamento, Aluno, Professor, PagamentoProfessor,Doacao, Despesa, Tarefa
 # IMPORTAÇÃO DOS FORMULÁRIOS
 from .forms import (
     UserForm, AlunoForm, PagamentoForm, PagamentoAdminForm, 
     CursoForm, AlunoAdminEditarForm, ProfessorForm, ProfessorEditarForm, 
-    RelatorioAlunoForm, HorarioForm, MensagemPadraoForm, NovoAgendamentoForm, MatriculaAvulsaForm,DoacaoForm, DespesaForm, AlunoSecretariaForm
+    RelatorioAlunoForm, HorarioForm, MensagemPadraoForm, NovoAgendamentoForm, MatriculaAvulsaForm,DoacaoForm, DespesaForm, AlunoSecretariaForm,
+    ImportarPlanilhaForm
 )
 from .models import MensagemPadrao # Importando MensagemPadrao que faltava na lista acima
+from .risco import consultar_risco, LIMITE_FALTAS_PADRAO, JANELA_MES, JANELA_DIAS, JANELA_AULAS
+from . import cobranca, folha, autocompletar, chamada, exportacao, perfilador, painel_professor, mensageria, tarefas
+from .resumo import resumo_do_mes, resumo_do_ano, MESES_LABEL
+from .paginacao import pagina_por_cursor, contar_aproximado
+from .busca import buscar_alunos
+from .periodo import Periodo, ANO_MINIMO
+from .consultas import orcamento_consultas
+from .replica import ler_da_replica
+from django.core.paginator import Paginator
+
+ALUNOS_POR_PAGINA = 50
+# Quantos alunos em risco o card do dashboard mostra (o resto fica no relatório)
+RISCO_NO_DASHBOARD = 10
+
+def _periodo_da_requisicao(request):
+    # Mês/ano vindos de ?mes=&ano= (ou o mês atual se faltarem ou vierem inválidos)
+    # O risco e a cobrança olham até 12 meses para trás, então o ano anterior
+    # também precisa caber no Periodo
+    hoje = timezone.localdate()
+    try:
+        periodo = Periodo(request.GET.get('ano', hoje.year), request.GET.get('mes', hoje.month))
+        if periodo.ano <= ANO_MINIMO:
+            raise ValueError(f"Ano inválido: {periodo.ano}")
+        return periodo
+    except (TypeError, ValueError):
+        return Periodo.da_data(hoje)
 
 # --- HOME ---
+@orcamento_consultas(12)
 def home(request):
     cursos = Curso.objects.filter(ativo=True)
     matriculas_aluno = []
     ids_cursos_matriculados = []
     
-    if request.user.is_authenticated:
-        # Se for professor, redireciona para o dashboard dele
-        if hasattr(request.user, 'professor'):
-             return redirect('dashboard_professor')
+    # Se for professor, redireciona para o dashboard dele
+    if request.role.eh_professor:
+        return redirect('dashboard_professor')
 
-        try:
-            aluno = request.user.aluno
-            matriculas_aluno = Matricula.objects.filter(aluno=aluno, ativo=True)
-            ids_cursos_matriculados = [m.curso.id for m in matriculas_aluno]
-        except:
-            pass 
+    if request.role.eh_aluno:
+        matriculas_aluno = Matricula.objects.filter(aluno_id=request.role.aluno_id, ativo=True)
+        ids_cursos_matriculados = [m.curso_id for m in matriculas_aluno]
 
     context = {
         'lista_de_cursos': cursos,
@@ -81,40 +112,59 @@ def verificar_usuario_ajax(request):
     }
     return JsonResponse(data)
 
+# =======================================================
+# AUTOCOMPLETAR (select2 via AJAX)
+# Os campos de aluno/matrícula pedem só os primeiros resultados ao índice em
+# memória, em vez de a página trazer todos como <option>.
+# =======================================================
+@staff_member_required
+def autocompletar_alunos(request):
+    resultados = autocompletar.buscar_alunos(request.GET.get('q', ''))
+    return JsonResponse({'results': [{'id': aluno_id, 'text': rotulo} for aluno_id, rotulo in resultados]})
+
+@staff_member_required
+def autocompletar_matriculas(request):
+    # Acha os alunos pelo índice e traz as matrículas ativas deles numa consulta só
+    alunos = autocompletar.buscar_alunos(request.GET.get('q', ''))
+    ordem = {aluno_id: i for i, (aluno_id, _) in enumerate(alunos)}
+    matriculas = Matricula.objects.filter(
+        aluno_id__in=ordem, ativo=True
+    ).select_related('aluno__user', 'curso')
+    matriculas = sorted(matriculas, key=lambda m: (ordem[m.aluno_id], m.curso.nome))
+    return JsonResponse({'results': [{'id': m.id, 'text': str(m)} for m in matriculas]})
+
 @login_required
 def meus_pagamentos(request):
-    try:
-        aluno = request.user.aluno
-    except:
+    aluno_id = request.role.aluno_id
+    if aluno_id is None:
         return redirect('home')
 
     if request.method == 'POST':
         form = PagamentoForm(request.POST, request.FILES)
         if form.is_valid():
             pagamento = form.save(commit=False)
-            pagamento.aluno = aluno
+            pagamento.aluno_id = aluno_id
             pagamento.save()
             return redirect('meus_pagamentos')
     else:
         form = PagamentoForm()
-        form.fields['curso'].queryset = Curso.objects.filter(matricula__aluno=aluno, matricula__ativo=True)
+        form.fields['curso'].queryset = Curso.objects.filter(matricula__aluno_id=aluno_id, matricula__ativo=True)
 
-    historico = Pagamento.objects.filter(aluno=aluno).order_by('-data_pagamento')
+    historico = Pagamento.objects.filter(aluno_id=aluno_id).order_by('-data_pagamento')
     return render(request, 'academia/meus_pagamentos.html', {'form': form, 'historico': historico})
 
 @login_required
 def registrar_pagamento(request):
     # 1. Verifica se é um ALUNO
-    try:
-        aluno = request.user.aluno
-    except:
+    aluno_id = request.role.aluno_id
+    if aluno_id is None:
         return redirect('home')
 
     if request.method == 'POST':
         form = PagamentoForm(request.POST, request.FILES)
         if form.is_valid():
             pagamento = form.save(commit=False)
-            pagamento.aluno = aluno
+            pagamento.aluno_id = aluno_id
             pagamento.save()
             return redirect('home')
     else:
@@ -127,16 +177,15 @@ def registrar_pagamento(request):
 
 @login_required
 def inscrever_curso(request, curso_id):
-    try:
-        aluno = request.user.aluno
-    except:
+    aluno_id = request.role.aluno_id
+    if aluno_id is None:
         return redirect('home')
         
     curso = get_object_or_404(Curso, id=curso_id)
     
     # Cria nova matrícula (Permite múltiplas)
     Matricula.objects.create(
-        aluno=aluno, 
+        aluno_id=aluno_id, 
         curso=curso, 
         ativo=True,
         hora_aula="A definir" # Valor padrão
@@ -146,14 +195,13 @@ def inscrever_curso(request, curso_id):
 
 @login_required
 def desligar_curso(request, curso_id):
-    try:
-        aluno = request.user.aluno
-    except:
+    aluno_id = request.role.aluno_id
+    if aluno_id is None:
         return redirect('home')
         
     curso = get_object_or_404(Curso, id=curso_id)
     
-    matricula = Matricula.objects.filter(aluno=aluno, curso=curso, ativo=True).first()
+    matricula = Matricula.objects.filter(aluno_id=aluno_id, curso=curso, ativo=True).first()
     
     if matricula:
         matricula.ativo = False
@@ -164,78 +212,108 @@ def desligar_curso(request, curso_id):
 
 # --- PROFESSOR ---
 @login_required
+@orcamento_consultas(5, como='professor')
 def dashboard_professor(request):
-    try:
-        professor = request.user.professor
-    except:
+    professor_id = request.role.professor_id
+    if professor_id is None:
         return redirect('home')
 
-    data_filtro = request.GET.get('data_filtro', timezone.localdate().strftime('%Y-%m-%d'))
-    cursos = Curso.objects.filter(professor=professor)
-    
-    # CORREÇÃO AQUI: O filtro agora funciona porque 'matricula' existe no model Presenca
-    presencas_do_dia = Presenca.objects.filter(
-        matricula__curso__in=cursos,
-        data_aula=data_filtro
-    ) 
-    
-    # Isso aqui cria um dicionário: ID DA MATRÍCULA -> STATUS (True/False)
-    # Como cada matrícula tem um ID único (mesmo que seja o mesmo aluno), 
-    # isso resolve o problema de marcar duplicado.
-    mapa_presenca = {p.matricula.id: p.presente for p in presencas_do_dia}
-
-    for curso in cursos:
-        curso.lista_alunos = curso.matricula_set.filter(ativo=True)
-        for matricula in curso.lista_alunos:
-            # Verifica o ID da matrícula específica
-            if matricula.id in mapa_presenca:
-                matricula.status_hoje = mapa_presenca[matricula.id]
-            else:
-                matricula.status_hoje = None
+    data_filtro = parse_date(request.GET.get('data_filtro', '')) or timezone.localdate()
 
-    context = {'professor': professor, 'cursos': cursos, 'data_filtro': data_filtro}
+    # Turmas, alunos ativos e presença do dia em número fixo de consultas,
+    # guardado no cache por (professor, data) (ver academia/painel_professor.py)
+    cursos = painel_professor.carregar_painel(professor_id, data_filtro)
+
+    context = {'cursos': cursos, 'data_filtro': data_filtro}
     return render(request, 'academia/dashboard_professor.html', context)
 
 @login_required
 def marcar_presenca(request, matricula_id, status, data_aula):
-    try:
-        request.user.professor
-    except:
+    if not request.role.eh_professor:
         return redirect('home')
 
     matricula = get_object_or_404(Matricula, id=matricula_id)
 
     # Segurança: só o professor da turma pode marcar
-    if matricula.curso.professor != request.user.professor:
+    if not request.role.eh_professor_do_curso(matricula.curso_id):
         return redirect('home')
 
     is_presente = True if status == 1 else False
 
-    # CORREÇÃO AQUI: Usamos 'matricula' em vez de 'aluno' e 'curso'
-    Presenca.objects.update_or_create(
-        matricula=matricula,  # <-- Mudança principal
-        data_aula=data_aula,
-        defaults={'presente': is_presente}
-    )
+    # Upsert na restrição única (matricula, data_aula): sem duplicar em cliques simultâneos
+    chamada.marcar_uma(matricula, data_aula, is_presente)
 
     return redirect(f'/dashboard/?data_filtro={data_aula}')
 
 @login_required
+def salvar_chamada(request, curso_id):
+    # Recebe a chamada inteira da turma num POST só:
+    #   - formulário: data_aula + presenca_<matricula_id> = 1 (presente) / 0 (falta)
+    #   - JSON: {"data_aula": "2026-03-02", "presencas": {"<matricula_id>": true, ...}}
+    # Quem não foi marcado fica como está.
+    if request.method != 'POST':
+        return redirect('home')
+
+    curso = get_object_or_404(Curso.objects.only('id', 'professor_id'), id=curso_id)
+
+    # Segurança (uma vez só): secretaria ou o professor da turma
+    if not request.role.pode_gerenciar_curso(curso.id):
+        return redirect('home')
+
+    eh_json = request.content_type == 'application/json'
+    if eh_json:
+        try:
+            dados = json.loads(request.body)
+            data_aula = parse_date(str(dados.get('data_aula', '')))
+            marcacoes = {int(k): v for k, v in dados.get('presencas', {}).items()}
+            # Só true/false de verdade: "false" ou 0 não podem virar presença
+            if any(not isinstance(v, bool) for v in marcacoes.values()):
+                raise ValueError
+        except (ValueError, TypeError, AttributeError):
+            return JsonResponse({'erro': 'Dados inválidos.'}, status=400)
+    else:
+        try:
+            data_aula = parse_date(request.POST.get('data_aula', ''))
+        except ValueError:
+            # Bem formada mas impossível (2026-02-30)
+            data_aula = None
+        marcacoes = {}
+        for chave, valor in request.POST.items():
+            if chave.startswith('presenca_') and chave[9:].isdigit() and valor in ('0', '1'):
+                marcacoes[int(chave[9:])] = valor == '1'
+
+    if data_aula is None:
+        if eh_json:
+            return JsonResponse({'erro': 'Data da aula inválida.'}, status=400)
+        messages.error(request, "Data da aula inválida.")
+        return redirect('home')
+
+    salvos = chamada.registrar_chamada(curso, data_aula, marcacoes)
+
+    if eh_json:
+        return JsonResponse({'salvos': salvos})
+
+    messages.success(request, f"Chamada salva: {salvos} aluno(s).")
+    if request.POST.get('origem') == 'adm' and request.user.is_staff:
+        return redirect(f"{reverse('gerenciar_chamada_adm')}?curso={curso.id}&data={data_aula:%Y-%m-%d}")
+    return redirect(f"{reverse('dashboard_professor')}?data_filtro={data_aula:%Y-%m-%d}")
+
+@login_required
+@orcamento_consultas(10, como='professor')
+@ler_da_replica
 def ver_relatorio(request, curso_id):
-    try:
-        professor = request.user.professor
-    except:
+    if not request.role.eh_professor:
         return redirect('home')
         
     curso = Curso.objects.get(id=curso_id)
-    hoje = timezone.localdate()
-    mes_filtro = int(request.GET.get('mes', hoje.month))
-    ano_filtro = int(request.GET.get('ano', hoje.year))
+    periodo = _periodo_da_requisicao(request)
+    ano_filtro, mes_filtro = periodo
 
+    # Intervalo [início, fim) do mês: usa o índice de data_aula
     presencas = Presenca.objects.filter(
         matricula__curso=curso,  # <-- Ajuste aqui: matricula__curso
-        data_aula__month=mes_filtro,
-        data_aula__year=ano_filtro
+    ).no_periodo(periodo).select_related(
+        'matricula__aluno__user'
     ).order_by('data_aula', 'matricula__aluno__user__username') # <-- Ajuste na ordenação
     
     context = {'curso': curso, 'presencas': presencas, 'mes_atual': mes_filtro, 'ano_atual': ano_filtro}
@@ -245,14 +323,7 @@ def ver_relatorio(request, curso_id):
 def definir_horario(request, matricula_id):
     matricula = get_object_or_404(Matricula, id=matricula_id)
     
-    autorizado = False
-    if request.user.is_staff:
-        autorizado = True
-    elif hasattr(request.user, 'professor'):
-        if matricula.curso.professor == request.user.professor:
-            autorizado = True
-            
-    if not autorizado:
+    if not request.role.pode_gerenciar_curso(matricula.curso_id):
         return redirect('home')
 
     if request.method == 'POST':
@@ -271,6 +342,7 @@ def definir_horario(request, matricula_id):
 
     return render(request, 'academia/definir_horario.html', {'form': form, 'matricula': matricula})
 @staff_member_required
+@orcamento_consultas(10)
 def gerenciar_chamada_adm(request):
     # 1. Filtros (Pega da URL ou usa padrão)
     hoje = timezone.localdate()
@@ -287,16 +359,16 @@ def gerenciar_chamada_adm(request):
         curso_selecionado = get_object_or_404(Curso, id=curso_id)
         
         # Busca alunos matriculados nesse curso
-        matriculas = Matricula.objects.filter(curso=curso_selecionado, ativo=True).order_by('aluno__user__first_name')
+        matriculas = Matricula.objects.filter(curso=curso_selecionado, ativo=True).select_related('aluno__user').order_by('aluno__user__first_name')
         
         # Busca as presenças já marcadas para essa data e curso
         presencas = Presenca.objects.filter(
             matricula__curso=curso_selecionado,
             data_aula=data_filtro
-        )
+        ).values_list('matricula_id', 'presente')
         
         # Cria um "Mapa" para saber quem veio (ID Matricula -> True/False)
-        mapa_presenca = {p.matricula.id: p.presente for p in presencas}
+        mapa_presenca = dict(presencas)
         
         # Cruza os dados: Preenche o objeto matrícula com o status atual
         for matricula in matriculas:
@@ -317,11 +389,7 @@ def marcar_presenca_adm_action(request, matricula_id, status, data_aula):
     matricula = get_object_or_404(Matricula, id=matricula_id)
     is_presente = True if status == 1 else False
 
-    Presenca.objects.update_or_create(
-        matricula=matricula,
-        data_aula=data_aula,
-        defaults={'presente': is_presente}
-    )
+    chamada.marcar_uma(matricula, data_aula, is_presente)
     
     # Redireciona mantendo os filtros (Data e Curso)
     return redirect(f'/adm/chamada/?curso={matricula.curso.id}&data={data_aula}')
@@ -331,138 +399,64 @@ def marcar_presenca_adm_action(request, matricula_id, status, data_aula):
 # Em academia/views.py
 
 @staff_member_required
+@orcamento_consultas(12)
+@ler_da_replica
 def dashboard_adm(request):
     # 1. Definição de Datas
     hoje = timezone.localdate()
-    mes_atual = int(request.GET.get('mes', hoje.month))
-    ano_atual = int(request.GET.get('ano', hoje.year))
+    ano_atual, mes_atual = _periodo_da_requisicao(request)
 
     # 2. Totais Básicos
     total_alunos_ativos = Matricula.objects.filter(ativo=True).count()
     
     # 3. Financeiro (Receita do Mês Selecionado)
-    receita_mensalidades = Pagamento.objects.filter(
-        confirmado=True, 
-        data_pagamento__month=mes_atual, 
-        data_pagamento__year=ano_atual
-    ).aggregate(Sum('valor'))['valor__sum'] or 0
-    
-    receita_doacoes = Doacao.objects.filter(
-        data_doacao__month=mes_atual,
-        data_doacao__year=ano_atual
-    ).aggregate(Sum('valor'))['valor__sum'] or 0
-
-    receita_mes = receita_mensalidades + receita_doacoes
+    # Os totais vêm prontos da tabela ResumoMensal (uma leitura para o ano todo)
+    resumos_ano = resumo_do_ano(ano_atual)
+    receita_mes = resumos_ano[mes_atual - 1].total_receitas
 
     # 4. Inadimplentes (Pendentes)
-    # Filtra alunos ativos que não pagaram o mês selecionado
-    # Lógica simplificada para performance
-    alunos_com_matricula = Aluno.objects.filter(matricula__ativo=True).distinct()
-    pagaram_este_mes = Pagamento.objects.filter(
-        mes=str(mes_atual).zfill(2), 
-        ano=ano_atual, 
-        confirmado=True
-    ).values_list('aluno_id', flat=True)
-    
-    total_inadimplentes = alunos_com_matricula.exclude(id__in=pagaram_este_mes).count()
+    # Mesma regra da Central de Cobrança (anti-join em academia/cobranca.py)
+    total_inadimplentes = cobranca.alunos_inadimplentes(ano_atual, mes_atual).count()
 
     # 5. Risco de Evasão (Alunos com 2 ou mais faltas no mês)
-    lista_risco = []
-    matriculas_ativas = Matricula.objects.filter(ativo=True).select_related('aluno', 'curso')
-    
-    for mat in matriculas_ativas:
-        # Conta faltas usando a nova relação com 'matricula'
-        qtd_faltas = Presenca.objects.filter(
-            matricula=mat,
-            presente=False,
-            data_aula__month=mes_atual,
-            data_aula__year=ano_atual
-        ).count()
-        
-        if qtd_faltas >= 2:
-            telefone_bruto = str(mat.aluno.telefone or "")
-            fone_limpo = ''.join(filter(str.isdigit, telefone_bruto))
-            
-            lista_risco.append({
-                'nome_aluno': mat.aluno.user.first_name or mat.aluno.user.username,
-                'nome_curso': mat.curso.nome,
-                'qtd_faltas': qtd_faltas,
-                'nome_responsavel': mat.aluno.nome_responsavel,
-                'link_zap': f"55{fone_limpo}" if fone_limpo else None
-            })
-    
-    total_risco = len(lista_risco)
-
-    # 6. Pagamento de Professores (CORRIGIDO com a nova lógica de Presença)
-    professores = Professor.objects.all()
-    lista_pagamento_prof = []
-    
-    for prof in professores:
-        cursos_prof = Curso.objects.filter(professor=prof)
-        
-        # AQUI estava o erro antigo: mudamos para matricula__curso__in
-        qtd_alunos_presentes = Presenca.objects.filter(
-            matricula__curso__in=cursos_prof, 
-            presente=True, 
-            data_aula__month=mes_atual, 
-            data_aula__year=ano_atual
-        ).values('matricula__aluno').distinct().count()
-        
-        if qtd_alunos_presentes > 0:
-            lista_pagamento_prof.append({
-                'nome': prof.user.username,
-                'valor': qtd_alunos_presentes * 35.00
-            })
-
-    # 7. Dados para os Gráficos (Iteramos 12 meses para gerar as listas)
-    grafico_receita = []
-    grafico_novos_alunos = []
-    meses_label = ['Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun', 'Jul', 'Ago', 'Set', 'Out', 'Nov', 'Dez']
-    
-    for m in range(1, 13):
-        # Gráfico 1: Receita por mês
-        val = Pagamento.objects.filter(
-            confirmado=True, 
-            data_pagamento__month=m, 
-            data_pagamento__year=ano_atual
-        ).aggregate(Sum('valor'))['valor__sum'] or 0
-        grafico_receita.append(float(val))
-        
-        # Gráfico 2: Novos Alunos (Protegido contra datas nulas)
-        # O filtro data_inicio__month=m ignora automaticamente campos NULL, evitando o erro NoneType
-        novos = Matricula.objects.filter(
-            data_inicio__month=m, 
-            data_inicio__year=ano_atual
-        ).count()
-        grafico_novos_alunos.append(novos)
+    # Calculado numa consulta agrupada (ver academia/risco.py). O card só
+    # precisa do total e dos primeiros: um COUNT e um LIMIT, não a lista toda
+    em_risco = consultar_risco(ano=ano_atual, mes=mes_atual)
+    total_risco = em_risco.count()
+    lista_risco = em_risco[:RISCO_NO_DASHBOARD] if total_risco else []
+
+    # 6. Pagamento de Professores (prévia da folha, calculada numa consulta agrupada)
+    lista_pagamento_prof = [
+        {'nome': item['nome'], 'valor': item['valor']}
+        for item in folha.calcular_folha(ano_atual, mes_atual)
+        if item['qtd_alunos'] > 0
+    ]
+
+    # 7. Dados para os Gráficos (saem do mesmo resumo anual lido no passo 3)
+    grafico_receita = [float(r.receita_mensalidades) for r in resumos_ano]
+    grafico_novos_alunos = [r.novas_matriculas for r in resumos_ano]
+    meses_label = MESES_LABEL
 
     # 8. Aulas de Hoje
     dias_semana = ['SEG', 'TER', 'QUA', 'QUI', 'SEX', 'SAB', 'DOM']
     dia_codigo = dias_semana[hoje.weekday()]
     
-    # Agrupamento manual para exibir bonito na tabela
-    aulas_hoje = Matricula.objects.filter(ativo=True, dia_semana=dia_codigo).values('curso__nome', 'hora_aula').distinct()
-    
-    # Processa para contar alunos por horário
-    lista_cursos_hoje = []
-    # Dicionário auxiliar para agrupar
-    aux_aulas = {} 
-    
-    mt_hoje = Matricula.objects.filter(ativo=True, dia_semana=dia_codigo)
-    for m in mt_hoje:
-        chave = (m.curso.nome, m.hora_aula)
-        if chave not in aux_aulas:
-            aux_aulas[chave] = 0
-        aux_aulas[chave] += 1
-        
-    # Transforma em lista ordenada
-    for (nome_curso, hora), qtd in aux_aulas.items():
-        lista_cursos_hoje.append({
-            'nome': nome_curso,
-            'inicio': hora,
-            'fim': hora, # Se quiser calcular fim, precisaria de lógica extra, deixei igual inicio
-            'total_alunos': qtd
-        })
+    # Alunos por (curso, horário) das aulas de hoje, já contados no banco
+    aulas_hoje = (
+        Matricula.objects.filter(ativo=True, dia_semana=dia_codigo)
+        .values('curso__nome', 'hora_aula')
+        .annotate(total_alunos=Count('id'))
+        .order_by()
+    )
+    lista_cursos_hoje = [
+        {
+            'nome': aula['curso__nome'],
+            'inicio': aula['hora_aula'],
+            'fim': aula['hora_aula'], # Se quiser calcular fim, precisaria de lógica extra, deixei igual inicio
+            'total_alunos': aula['total_alunos'],
+        }
+        for aula in aulas_hoje
+    ]
     
     # Ordena por horário
     lista_cursos_hoje.sort(key=lambda x: x['inicio'] or "23:59")
@@ -477,6 +471,7 @@ def dashboard_adm(request):
         # Novos campos para o HTML atualizado
         'total_risco': total_risco,
         'lista_risco': lista_risco,
+        'limite_faltas': LIMITE_FALTAS_PADRAO,
         'grafico_receita': grafico_receita,
         'grafico_novos_alunos': grafico_novos_alunos,
         'meses_label': meses_label,
@@ -485,6 +480,36 @@ def dashboard_adm(request):
     return render(request, 'academia/dashboard_adm.html', context)
 
 @staff_member_required
+@orcamento_consultas(6)
+def relatorio_risco(request):
+    # Mês/ano inválidos (?mes=abc, ?mes=13) caem no mês atual
+    ano_atual, mes_atual = _periodo_da_requisicao(request)
+    janela = request.GET.get('janela', JANELA_MES)
+    if janela not in (JANELA_MES, JANELA_DIAS, JANELA_AULAS):
+        janela = JANELA_MES
+
+    try:
+        limite = int(request.GET.get('limite', LIMITE_FALTAS_PADRAO))
+        qtd = int(request.GET.get('qtd', 0)) or None
+    except ValueError:
+        limite, qtd = LIMITE_FALTAS_PADRAO, None
+
+    # Ordenada e fatiada no banco: o Paginator faz um COUNT e busca só a página
+    lista_risco = consultar_risco(ano=ano_atual, mes=mes_atual, limite=limite, janela=janela, qtd=qtd)
+
+    paginator = Paginator(lista_risco, 25)
+    pagina = paginator.get_page(request.GET.get('page'))
+
+    context = {
+        'pagina': pagina,
+        'total_risco': paginator.count,
+        'mes_atual': mes_atual, 'ano_atual': ano_atual,
+        'janela': janela, 'limite': limite, 'qtd': qtd or '',
+    }
+    return render(request, 'academia/relatorio_risco.html', context)
+
+@staff_member_required
+@orcamento_consultas(6)
 def pagamento_manual(request):
     # Se for salvar (POST)
     if request.method == 'POST':
@@ -528,6 +553,8 @@ def pagamento_manual(request):
     return render(request, 'academia/lancamento_pagamento.html', {'form': form})
 
 @staff_member_required
+@orcamento_consultas(10)
+@ler_da_replica
 def relatorio_financeiro_aluno(request, aluno_id):
     aluno = get_object_or_404(Aluno, id=aluno_id)
     pagamentos = Pagamento.objects.filter(aluno=aluno).order_by('-ano', '-mes', '-data_pagamento')
@@ -535,35 +562,27 @@ def relatorio_financeiro_aluno(request, aluno_id):
     return render(request, 'academia/relatorio_financeiro_aluno.html', {'aluno': aluno, 'pagamentos': pagamentos, 'total_pago': total_pago})
 
 @staff_member_required
+@orcamento_consultas(6)
 def financeiro_professores(request):
-    hoje = timezone.localdate()
-    mes_atual = int(request.GET.get('mes', hoje.month))
-    ano_atual = int(request.GET.get('ano', hoje.year))
-    folha = PagamentoProfessor.objects.filter(mes=mes_atual, ano=ano_atual)
-    return render(request, 'academia/financeiro_professores.html', {'mes_atual': mes_atual, 'ano_atual': ano_atual, 'folha': folha})
+    ano_atual, mes_atual = _periodo_da_requisicao(request)
+    registros = PagamentoProfessor.objects.filter(mes=mes_atual, ano=ano_atual).select_related('professor__user')
+    return render(request, 'academia/financeiro_professores.html', {'mes_atual': mes_atual, 'ano_atual': ano_atual, 'folha': registros})
 
 @staff_member_required
 def gerar_folha(request):
-    mes = int(request.GET.get('mes'))
-    ano = int(request.GET.get('ano'))
-    professores = Professor.objects.all()
-    
-    for prof in professores:
-        cursos_prof = Curso.objects.filter(professor=prof)
-        qtd_alunos_presentes = Presenca.objects.filter(
-            matricula__curso__in=cursos_prof, presente=True, data_aula__month=mes, data_aula__year=ano
-        ).values('matricula__aluno').distinct().count()
-        
-        valor = qtd_alunos_presentes * 35.00
-        pgto, created = PagamentoProfessor.objects.get_or_create(
-            professor=prof, mes=mes, ano=ano,
-            defaults={'valor_total': valor, 'qtd_alunos': qtd_alunos_presentes}
-        )
-        if not pgto.pago:
-            pgto.valor_total = valor
-            pgto.qtd_alunos = qtd_alunos_presentes
-            pgto.save()
-    return redirect(f'/financeiro-professores/?mes={mes}&ano={ano}')
+    ano, mes = _periodo_da_requisicao(request)
+
+    # ?simular=1 mostra a prévia na tela sem gravar nada
+    if request.GET.get('simular'):
+        previa = folha.gerar_folha(ano, mes, simular=True)
+        registros = PagamentoProfessor.objects.filter(mes=mes, ano=ano).select_related('professor__user')
+        return render(request, 'academia/financeiro_professores.html', {
+            'mes_atual': mes, 'ano_atual': ano, 'folha': registros, 'previa': previa,
+        })
+
+    # Gravar a folha roda em segundo plano; a tela acompanha o progresso
+    tarefa = tarefas.enfileirar('gerar_folha', request.user, ano=ano, mes=mes)
+    return redirect('ver_tarefa', tarefa_id=tarefa.id)
 
 @staff_member_required
 def confirmar_pagamento_prof(request, pagamento_id):
@@ -576,65 +595,70 @@ def confirmar_pagamento_prof(request, pagamento_id):
 # --- CADASTROS E GESTÃO ---
 
 @staff_member_required
+@orcamento_consultas(9)
 def area_cobranca(request):
-    hoje = timezone.localdate()
-    mes_atual = int(request.GET.get('mes', hoje.month))
-    ano_atual = int(request.GET.get('ano', hoje.year))
-    
-    # Busca alunos ativos
-    alunos_ativos = Aluno.objects.filter(
-        matricula__ativo=True
-    ).exclude(
-        matricula__dia_semana__isnull=True
-    ).exclude(
-        matricula__dia_semana=''
-    ).distinct()
-    
-    lista_inadimplentes = []
-    
-    for aluno in alunos_ativos:
-        # Verifica se pagou
-        pagou = Pagamento.objects.filter(aluno=aluno, mes=str(mes_atual).zfill(2), ano=ano_atual, confirmado=True).exists()
-        
-        if not pagou:
-            # 1. Prepara telefone
-            telefone_bruto = str(aluno.telefone or "")
-            fone_limpo = ''.join(filter(str.isdigit, telefone_bruto))
-            link_zap = f"55{fone_limpo}" if fone_limpo else ""
-
-            # 2. Define o Nome de Tratamento ([NOME])
-            # Se tiver responsável, usa ele. Se não, usa o próprio aluno.
-            nome_tratamento = aluno.nome_responsavel if aluno.nome_responsavel else (aluno.user.first_name or aluno.user.username)
-            
-            # 3. Define o Nome do Aluno ([ALUNO])
-            nome_real_aluno = aluno.user.first_name or aluno.user.username
-
-            # 4. Define o Curso ([CURSO])
-            # Pega todos os cursos ativos desse aluno e junta com vírgula (Ex: "Violão, Bateria")
-            matriculas = Matricula.objects.filter(aluno=aluno, ativo=True)
-            lista_cursos = [m.curso.nome for m in matriculas]
-            nome_cursos = ", ".join(lista_cursos)
-
-            lista_inadimplentes.append({
-                'id': aluno.id,
-                'nome': nome_real_aluno,       # Nome para exibir na tabela
-                'nome_tratamento': nome_tratamento, # Para a variável [NOME]
-                'nome_aluno_msg': nome_real_aluno,  # Para a variável [ALUNO]
-                'nome_cursos': nome_cursos,         # Para a variável [CURSO]
-                'telefone': aluno.telefone,
-                'fone_link': link_zap,
-            })
+    ano_atual, mes_atual = _periodo_da_requisicao(request)
+
+    # Filtros extras: atraso mínimo ("deve 3 meses", até MESES_HISTORICO) e se bolsistas entram na lista
+    try:
+        meses_atraso = min(max(int(request.GET.get('atraso', 1)), 1), cobranca.MESES_HISTORICO)
+    except ValueError:
+        meses_atraso = 1
+    incluir_bolsistas = request.GET.get('bolsistas') == '1'
+
+    # Toda a lista (alunos, cursos e contatos) sai em número fixo de consultas
+    lista_inadimplentes = cobranca.lista_inadimplentes(
+        ano_atual, mes_atual,
+        meses_atraso=meses_atraso,
+        excluir_bolsistas=not incluir_bolsistas,
+    )
 
     mensagens = MensagemPadrao.objects.all()
     context = {
         'lista_inadimplentes': lista_inadimplentes, 
         'mensagens': mensagens, 
         'mes_atual': mes_atual, 
-        'ano_atual': ano_atual
+        'ano_atual': ano_atual,
+        'meses_atraso': meses_atraso,
+        'incluir_bolsistas': incluir_bolsistas,
+        'fila': mensageria.situacao_da_fila(),
     }
     return render(request, 'academia/area_cobranca.html', context)
 
 @staff_member_required
+def enfileirar_cobranca(request):
+    # Monta a campanha inteira no servidor (uma mensagem por família) e deixa
+    # o envio para o `manage.py enviar_mensagens` (ver academia/mensageria.py)
+    if request.method != 'POST':
+        return redirect('area_cobranca')
+    hoje = timezone.localdate()
+    try:
+        mes = int(request.POST.get('mes', hoje.month))
+        ano = int(request.POST.get('ano', hoje.year))
+        meses_atraso = min(max(int(request.POST.get('atraso', 1)), 1), cobranca.MESES_HISTORICO)
+    except ValueError:
+        return redirect('area_cobranca')
+    incluir_bolsistas = request.POST.get('bolsistas') == '1'
+    modelo = None
+    if request.POST.get('mensagem'):
+        modelo = get_object_or_404(MensagemPadrao, id=request.POST['mensagem'])
+
+    novas, sem_telefone = mensageria.enfileirar_cobranca(
+        ano, mes, modelo=modelo, meses_atraso=meses_atraso, excluir_bolsistas=not incluir_bolsistas,
+    )
+    messages.success(request, f"{novas} mensagens colocadas na fila de envio.")
+    if novas and not tarefas.pendente_do_tipo('enviar_mensagens'):
+        tarefas.enfileirar('enviar_mensagens', request.user)
+    if sem_telefone:
+        messages.warning(request, f"{sem_telefone} inadimplentes sem telefone ficaram de fora.")
+
+    url = f"{reverse('area_cobranca')}?mes={mes}&ano={ano}&atraso={meses_atraso}"
+    if incluir_bolsistas:
+        url += '&bolsistas=1'
+    return redirect(url)
+
+@staff_member_required
+@orcamento_consultas(6)
 def gerenciar_mensagens(request):
     if request.method == 'POST':
         form = MensagemPadraoForm(request.POST)
@@ -665,14 +689,19 @@ def deletar_mensagem(request, mensagem_id):
     return redirect('gerenciar_mensagens')
 
 @staff_member_required
+@orcamento_consultas(7)
 def agenda_geral(request):
     data_filtro = request.GET.get('data', timezone.localdate().strftime('%Y-%m-%d'))
     data_obj = datetime.datetime.strptime(data_filtro, '%Y-%m-%d').date()
     dias_semana = ['SEG', 'TER', 'QUA', 'QUI', 'SEX', 'SAB', 'DOM']
     dia_codigo = dias_semana[data_obj.weekday()]
     
-    aulas = Matricula.objects.filter(ativo=True, dia_semana=dia_codigo).order_by('hora_aula', 'curso__nome')
-    return render(request, 'academia/agenda_geral.html', {'data_filtro': data_filtro, 'dia_codigo': dia_codigo, 'aulas': aulas, 'total_aulas': aulas.count()})
+    aulas = list(
+        Matricula.objects.filter(ativo=True, dia_semana=dia_codigo)
+        .select_related('curso__professor__user', 'aluno__user')
+        .order_by('hora_aula', 'curso__nome')
+    )
+    return render(request, 'academia/agenda_geral.html', {'data_filtro': data_filtro, 'dia_codigo': dia_codigo, 'aulas': aulas, 'total_aulas': len(aulas)})
 
 @staff_member_required
 def novo_agendamento(request):
@@ -701,6 +730,7 @@ def adicionar_curso(request):
     return render(request, 'academia/adicionar_curso.html', {'form': form})
 
 @staff_member_required
+@orcamento_consultas(8)
 def editar_curso(request, curso_id):
     curso = get_object_or_404(Curso, id=curso_id)
     if request.method == 'POST':
@@ -712,40 +742,37 @@ def editar_curso(request, curso_id):
         form = CursoForm(instance=curso)
     return render(request, 'academia/editar_curso.html', {'form': form, 'curso': curso})
 
-@staff_member_required
-def listar_alunos(request):
+# Colunas que a linha da lista de alunos realmente usa
+CAMPOS_LINHA_ALUNO = (
+    'id', 'telefone', 'criado_por_admin', 'sexo', 'data_nascimento',
+    'nome_responsavel', 'contato_responsavel', 'membro_metodista', 'outra_igreja',
+    'user', 'user__first_name', 'user__username', 'user__is_active',
+)
+
+def _filtrar_alunos(request):
     termo_pesquisa = request.GET.get('q', '')
     filtro_curso = request.GET.get('curso', '')
     filtro_sexo = request.GET.get('sexo', '')
     filtro_igreja = request.GET.get('igreja', '')
-    ordem = request.GET.get('ordem', 'nome')
 
     alunos = Aluno.objects.all()
 
     if termo_pesquisa:
-        # 1. Remove espaços invisíveis do final e do começo
-        termo_limpo = termo_pesquisa.strip()
-        
-        # 2. SUBSTITUI O "ESPAÇO FANTASMA" (NBSP) POR ESPAÇO COMUM
-        # O Excel adora colocar esse caractere \xa0
-        termo_limpo = termo_limpo.replace('\xa0', ' ')
-        
-        # 3. Remove o %
-        termo_limpo = termo_limpo.replace('%', '')
-        
-        # 4. Normaliza (tira acento e põe minúsculo)
-        termo_limpo = unidecode(termo_limpo).lower()
-
-        alunos = alunos.filter(busca_normalizada__contains=termo_limpo)
-        #alunos = alunos.filter(Q(user__username__icontains=termo_pesquisa) | Q(telefone__icontains=termo_pesquisa) | Q(user__first_name__icontains=termo_pesquisa))
+        # Busca indexada com ranking (várias palavras, final de telefone, erro de digitação)
+        alunos = buscar_alunos(alunos, termo_pesquisa)
 
+    # Filtros de matrícula com EXISTS: não multiplicam as linhas, então não precisa de distinct()
     if filtro_curso:
+        matriculas_ativas = Matricula.objects.filter(aluno=OuterRef('pk'), ativo=True)
         if filtro_curso == 'ativos':
             # Se escolheu "Somente Ativos", filtra quem tem matrícula ativa em QUALQUER curso
-            alunos = alunos.filter(matricula__ativo=True)
+            alunos = alunos.filter(Exists(matriculas_ativas))
         else:
             # Se escolheu um curso específico (ID numérico)
-            alunos = alunos.filter(matricula__curso_id=filtro_curso, matricula__ativo=True)
+            try:
+                alunos = alunos.filter(Exists(matriculas_ativas.filter(curso_id=int(filtro_curso))))
+            except ValueError:
+                pass
     if filtro_sexo:
         alunos = alunos.filter(sexo=filtro_sexo)
     if filtro_igreja == 'metodista':
@@ -753,20 +780,50 @@ def listar_alunos(request):
     elif filtro_igreja == 'outra':
         alunos = alunos.filter(membro_metodista=False)
 
-    if ordem == 'curso':
-        alunos = alunos.order_by('matricula__curso__nome')
+    filtrado = any([termo_pesquisa, filtro_curso, filtro_sexo, filtro_igreja])
+    return alunos, filtrado
+
+def _pagina_de_alunos(request, alunos):
+    ordem = request.GET.get('ordem', 'nome')
+
+    # Só as colunas da linha + matrículas ativas (com o curso) numa consulta extra
+    alunos = alunos.select_related('user').only(*CAMPOS_LINHA_ALUNO).prefetch_related(
+        Prefetch(
+            'matricula_set',
+            queryset=Matricula.objects.filter(ativo=True).select_related('curso').only('aluno', 'curso', 'curso__nome'),
+            to_attr='matriculas_ativas',
+        )
+    )
+
+    if request.GET.get('q', '').strip() and ordem == 'nome':
+        # Com busca, os mais relevantes aparecem primeiro
+        campos = ['-relevancia', 'user__username']
+    elif ordem == 'curso':
+        # Ordena pelo primeiro curso (em ordem alfabética) de cada aluno
+        primeiro_curso = Matricula.objects.filter(aluno=OuterRef('pk')).order_by('curso__nome').values('curso__nome')[:1]
+        alunos = alunos.annotate(curso_ordem=Coalesce(Subquery(primeiro_curso), Value('')))
+        campos = ['curso_ordem', 'user__username']
     else:
-        alunos = alunos.order_by('user__username')
+        campos = ['user__username']
 
-    alunos = alunos.distinct()
-    total_encontrados = alunos.count()
+    return pagina_por_cursor(alunos, campos, cursor=request.GET.get('cursor'), tamanho=ALUNOS_POR_PAGINA)
 
+@staff_member_required
+@orcamento_consultas(9)
+def listar_alunos(request):
+    alunos, filtrado = _filtrar_alunos(request)
+    pagina, proximo_cursor = _pagina_de_alunos(request, alunos)
 
-    todos_cursos = Curso.objects.all()
-    
+    # Variante JSON para a rolagem infinita: só as linhas novas e o próximo cursor
+    if request.GET.get('formato') == 'json':
+        html = render_to_string('academia/_linhas_alunos.html', {'alunos': pagina, 'apenas_linhas': True}, request=request)
+        return JsonResponse({'html': html, 'proximo': proximo_cursor})
 
+    total_encontrados, total_exato = contar_aproximado(alunos, filtrado=filtrado)
+    todos_cursos = Curso.objects.only('id', 'nome')
     
-# Lógica para evitar o erro do int('ativos')
+    filtro_curso = request.GET.get('curso', '')
+    # Lógica para evitar o erro do int('ativos')
     valor_filtro_ctx = ''
     if filtro_curso:
         if filtro_curso == 'ativos':
@@ -777,21 +834,179 @@ def listar_alunos(request):
             except:
                 valor_filtro_ctx = ''
 
+    # Mesmos filtros na URL da próxima página (sem o cursor)
+    parametros = request.GET.copy()
+    parametros.pop('cursor', None)
+    parametros.pop('formato', None)
+
     context = {
-        'alunos': alunos, 
+        'alunos': pagina, 
+        'proximo_cursor': proximo_cursor,
+        'parametros_busca': parametros.urlencode(),
         'total_encontrados': total_encontrados,
+        'total_exato': total_exato,
         'todos_cursos': todos_cursos, 
-        'termo_pesquisa': termo_pesquisa, 
+        'termo_pesquisa': request.GET.get('q', ''), 
        # USE A VARIÁVEL QUE CRIAMOS ACIMA EM VEZ DE TENTAR CONVERTER DIRETO:
         'filtro_curso': valor_filtro_ctx, 
-        'filtro_sexo': filtro_sexo, 
-        'filtro_igreja': filtro_igreja, 
-        'ordem_atual': ordem
+        'filtro_sexo': request.GET.get('sexo', ''), 
+        'filtro_igreja': request.GET.get('igreja', ''), 
+        'ordem_atual': request.GET.get('ordem', 'nome')
     }
     
     return render(request, 'academia/listar_alunos.html', context)
 
+# =======================================================
+# EXPORTAÇÕES (CSV / XLSX EM STREAMING)
+# As linhas vão sendo enviadas enquanto saem do banco (ver academia/exportacao.py)
+# =======================================================
+@staff_member_required
+@ler_da_replica
+def exportar_alunos(request, formato):
+    if formato not in exportacao.FORMATOS:
+        raise Http404
+    # Mesmos filtros da lista de alunos (busca, curso, sexo, igreja)
+    alunos, _ = _filtrar_alunos(request)
+    cabecalho, linhas = exportacao.exportacao_alunos(alunos)
+    return exportacao.resposta_exportacao('alunos', formato, cabecalho, linhas)
+
 @staff_member_required
+@ler_da_replica
+def exportar_pagamentos(request, formato):
+    if formato not in exportacao.FORMATOS:
+        raise Http404
+    periodo = _periodo_da_requisicao(request)
+    pagamentos = Pagamento.objects.no_periodo(periodo)
+    if request.GET.get('confirmados') == '1':
+        pagamentos = pagamentos.filter(confirmado=True)
+    cabecalho, linhas = exportacao.exportacao_pagamentos(pagamentos)
+    return exportacao.resposta_exportacao(f'pagamentos_{periodo.ano}_{periodo.mes:02d}', formato, cabecalho, linhas)
+
+@login_required
+@ler_da_replica
+def exportar_presencas(request, curso_id, formato):
+    if formato not in exportacao.FORMATOS:
+        raise Http404
+    curso = get_object_or_404(Curso.objects.only('id', 'nome', 'professor_id'), id=curso_id)
+
+    # Secretaria ou o professor da turma
+    if not request.role.pode_gerenciar_curso(curso.id):
+        return redirect('home')
+
+    periodo = _periodo_da_requisicao(request)
+    presencas = Presenca.objects.filter(matricula__curso=curso).no_periodo(periodo)
+    cabecalho, linhas = exportacao.exportacao_presencas(presencas)
+    nome = f'chamada_{slugify(curso.nome)}_{periodo.ano}_{periodo.mes:02d}'
+    return exportacao.resposta_exportacao(nome, formato, cabecalho, linhas)
+
+# =======================================================
+# TAREFAS EM SEGUNDO PLANO
+# As operações pesadas só enfileiram a tarefa e mandam para ver_tarefa, que
+# pergunta o andamento a status_tarefa (JSON) até terminar.
+# Quem executa é o `manage.py rodar_tarefas` (ver academia/tarefas.py).
+# =======================================================
+
+@staff_member_required
+@orcamento_consultas(6)
+def listar_tarefas(request):
+    lista = list(Tarefa.objects.select_related('criada_por')[:50])
+    for tarefa in lista:
+        tarefa.rotulo = tarefas.rotulo(tarefa.tipo)
+    return render(request, 'academia/tarefas.html', {'tarefas': lista})
+
+@staff_member_required
+def ver_tarefa(request, tarefa_id):
+    tarefa = get_object_or_404(Tarefa, id=tarefa_id)
+    tarefa.rotulo = tarefas.rotulo(tarefa.tipo)
+    return render(request, 'academia/ver_tarefa.html', {'tarefa': tarefa})
+
+def _dados_da_tarefa(tarefa):
+    resultado = tarefa.resultado or {}
+    dados = {
+        'id': tarefa.id,
+        'status': tarefa.status,
+        'status_texto': tarefa.get_status_display(),
+        'progresso': tarefa.progresso,
+        'etapa': tarefa.etapa,
+        'tentativas': tarefa.tentativas,
+        'terminou': tarefa.terminou,
+        'mensagem': resultado.get('mensagem', ''),
+        'erros': resultado.get('erros', []),
+        'url': resultado.get('url'),
+        'download': reverse('baixar_resultado_tarefa', args=[tarefa.id]) if resultado.get('arquivo') else None,
+    }
+    if tarefa.status == Tarefa.ERRO:
+        # Só a última linha do traceback (a mensagem do erro)
+        dados['erro'] = tarefa.erro.strip().splitlines()[-1] if tarefa.erro.strip() else ''
+    return dados
+
+@staff_member_required
+def status_tarefa(request, tarefa_id):
+    tarefa = get_object_or_404(Tarefa, id=tarefa_id)
+    return JsonResponse(_dados_da_tarefa(tarefa))
+
+@staff_member_required
+def baixar_resultado_tarefa(request, tarefa_id):
+    tarefa = get_object_or_404(Tarefa, id=tarefa_id)
+    caminho = tarefas.caminho_do_arquivo(tarefa)
+    if caminho is None:
+        raise Http404
+    # Relatório HTML abre no navegador (para imprimir); o resto vai como download
+    return FileResponse(open(caminho, 'rb'), as_attachment=caminho.suffix != '.html', filename=caminho.name)
+
+@staff_member_required
+def recalcular_resumo(request):
+    # Fechamento financeiro: refaz a tabela ResumoMensal inteira em segundo plano
+    if request.method != 'POST':
+        return redirect('listar_tarefas')
+    tarefa = tarefas.pendente_do_tipo('recalcular_resumo') or tarefas.enfileirar('recalcular_resumo', request.user)
+    return redirect('ver_tarefa', tarefa_id=tarefa.id)
+
+@staff_member_required
+def importar_planilha(request):
+    # Mesma importação do admin (AlunoResource / MatriculaResource), mas fora da requisição
+    if request.method == 'POST':
+        form = ImportarPlanilhaForm(request.POST, request.FILES)
+        if form.is_valid():
+            arquivo = form.cleaned_data['arquivo']
+            pasta = tarefas.PASTA / 'entrada'
+            pasta.mkdir(parents=True, exist_ok=True)
+            nome = f"{uuid.uuid4().hex}{os.path.splitext(arquivo.name)[1].lower()}"
+            with open(pasta / nome, 'wb') as destino:
+                for pedaco in arquivo.chunks():
+                    destino.write(pedaco)
+            tarefa = tarefas.enfileirar('importar_planilha', request.user, recurso=form.cleaned_data['recurso'], arquivo=nome)
+            return redirect('ver_tarefa', tarefa_id=tarefa.id)
+    else:
+        form = ImportarPlanilhaForm()
+    return render(request, 'academia/importar_planilha.html', {'form': form})
+
+# =======================================================
+# PERFIS DE REQUISIÇÃO (?perfil=1)
+# Lista dos perfis guardados e download em pstats ou pilhas "collapsed"
+# (ver academia/perfilador.py)
+# =======================================================
+
+@staff_member_required
+def listar_perfis(request):
+    return render(request, 'academia/perfis.html', {
+        'perfis': perfilador.listar_perfis(),
+        'maximo': perfilador.MAXIMO,
+        'dias': perfilador.DIAS,
+    })
+
+@staff_member_required
+def baixar_perfil(request, nome, formato):
+    caminho = perfilador.caminho_do_perfil(nome, formato)
+    if caminho is None:
+        raise Http404
+    return FileResponse(
+        open(caminho, 'rb'), as_attachment=True, filename=caminho.name,
+        content_type=perfilador.FORMATOS[formato][1],
+    )
+
+@staff_member_required
+@orcamento_consultas(10)
 def editar_aluno_adm(request, aluno_id):
     aluno = get_object_or_404(Aluno, id=aluno_id)
     if request.method == 'POST':
@@ -805,6 +1020,7 @@ def editar_aluno_adm(request, aluno_id):
     return render(request, 'academia/editar_aluno.html', {'form': form, 'aluno': aluno})
 
 @staff_member_required
+@orcamento_consultas(7)
 def listar_professores(request):
     professores = Professor.objects.all().order_by('user__username')
     return render(request, 'academia/listar_professores.html', {'professores': professores})
@@ -856,22 +1072,17 @@ def adicionar_aluno_adm(request):
     return render(request, 'academia/adicionar_aluno_adm.html', {'user_form': user_form, 'aluno_form': aluno_form})
 
 @staff_member_required
+@orcamento_consultas(6)
+@ler_da_replica
 def gerar_relatorio_alunos(request):
     form = RelatorioAlunoForm(request.GET)
-    alunos = Aluno.objects.all().order_by('user__username')
-    if form.is_valid():
-        curso = form.cleaned_data.get('curso')
-        origem = form.cleaned_data.get('origem')
-        if curso:
-            alunos = alunos.filter(matricula__curso=curso, matricula__ativo=True)
-        if origem == 'secretaria':
-            alunos = alunos.filter(criado_por_admin=True)
-        elif origem == 'site':
-            alunos = alunos.filter(criado_por_admin=False)
-        
-        context = {'alunos': alunos.distinct(), 'form': form, 'modo_impressao': 'imprimir' in request.GET}
-        if 'imprimir' in request.GET:
-            return render(request, 'academia/relatorio_imprimir.html', context)
+    if form.is_valid() and 'imprimir' in request.GET:
+        # O relatório (filtros por curso/origem e colunas escolhidas) é montado
+        # em segundo plano e aberto para impressão quando ficar pronto
+        filtros = request.GET.dict()
+        filtros.pop('imprimir', None)
+        tarefa = tarefas.enfileirar('relatorio_alunos', request.user, filtros=filtros)
+        return redirect('ver_tarefa', tarefa_id=tarefa.id)
     return render(request, 'academia/relatorio_opcoes.html', {'form': form})
 
 @staff_member_required
@@ -912,6 +1123,7 @@ def desligar_matricula_adm(request, matricula_id):
     return redirect('detalhes_aluno', aluno_id=aluno_id)
 
 @staff_member_required
+@orcamento_consultas(11)
 def detalhes_aluno(request, aluno_id):
     # 1. Busca o Aluno
     aluno = get_object_or_404(Aluno, id=aluno_id)
@@ -939,6 +1151,7 @@ def retomar_matricula_adm(request, matricula_id):
     return redirect('detalhes_aluno', aluno_id=matricula.aluno.id)
 
 @staff_member_required
+@orcamento_consultas(8)
 def adicionar_matricula_extra(request, aluno_id):
     aluno = get_object_or_404(Aluno, id=aluno_id)
     
@@ -973,33 +1186,34 @@ def registrar_doacao(request):
     return render(request, 'academia/registrar_doacao.html', {'form': form})
 
 @staff_member_required
+@orcamento_consultas(10)
+@ler_da_replica
 def relatorio_financeiro(request):
-    hoje = timezone.localdate()
-    mes_atual = int(request.GET.get('mes', hoje.month))
-    ano_atual = int(request.GET.get('ano', hoje.year))
+    periodo = _periodo_da_requisicao(request)
+    ano_atual, mes_atual = periodo
 
     # --- ENTRADAS ---
-    entradas_alunos = Pagamento.objects.filter(confirmado=True, data_pagamento__month=mes_atual, data_pagamento__year=ano_atual)
-    total_alunos = entradas_alunos.aggregate(Sum('valor'))['valor__sum'] or 0
-
-    entradas_doacoes = Doacao.objects.filter(data_doacao__month=mes_atual, data_doacao__year=ano_atual)
-    total_doacoes = entradas_doacoes.aggregate(Sum('valor'))['valor__sum'] or 0
-    
-    total_receitas = total_alunos + total_doacoes
+    # no_periodo() filtra por intervalo de datas (usa os índices das colunas de data)
+    entradas_alunos = Pagamento.objects.filter(confirmado=True).no_periodo(periodo).select_related('aluno__user', 'curso')
+    entradas_doacoes = Doacao.objects.no_periodo(periodo)
 
     # --- SAÍDAS ---
     # 1. Pagamento de Professores (Só o que já foi pago/confirmado)
-    saidas_professores = PagamentoProfessor.objects.filter(pago=True, data_pagamento_realizado__month=mes_atual, data_pagamento_realizado__year=ano_atual)
-    total_professores = saidas_professores.aggregate(Sum('valor_total'))['valor_total__sum'] or 0
-
+    saidas_professores = PagamentoProfessor.objects.filter(pago=True).no_periodo(periodo).select_related('professor__user')
     # 2. Despesas Extras
-    saidas_despesas = Despesa.objects.filter(data_despesa__month=mes_atual, data_despesa__year=ano_atual)
-    total_despesas = saidas_despesas.aggregate(Sum('valor'))['valor__sum'] or 0
-
-    total_saidas = total_professores + total_despesas
-
-    # --- BALANÇO ---
-    saldo_final = total_receitas - total_saidas
+    saidas_despesas = Despesa.objects.no_periodo(periodo)
+
+    # --- TOTAIS E BALANÇO ---
+    # Vêm prontos da tabela ResumoMensal (mantida pelos signals)
+    resumo = resumo_do_mes(ano_atual, mes_atual)
+    total_alunos = resumo.receita_mensalidades
+    total_doacoes = resumo.receita_doacoes
+    total_receitas = resumo.total_receitas
+    total_professores = resumo.total_professores
+    total_despesas = resumo.total_despesas
+    total_saidas = resumo.total_saidas
+
+    saldo_final = resumo.saldo
     cor_saldo = "text-success" if saldo_final >= 0 else "text-danger"
 
     # Formulário para lançar despesa rápida nesta tela
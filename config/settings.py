@@ -52,12 +52,20 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Mede as consultas SQL de cada página (log 'academia.consultas')
+    'academia.middleware.MedidorConsultasMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    # Depois de gravar, a sessão lê do banco principal e não da réplica
+    'academia.middleware.GrudarNoPrincipalMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # request.role: aluno/professor/cursos do usuário, resolvidos uma vez (cache)
+    'academia.middleware.PapelMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Perfil da requisição sob demanda (?perfil=1, só staff)
+    'academia.middleware.PerfilRequisicaoMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -89,8 +97,16 @@ WSGI_APPLICATION = 'config.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        # sqlite3 do Django + WAL, PRAGMAs de produção e trava de escrita (academia/banco_sqlite/base.py)
+        'ENGINE': 'academia.banco_sqlite',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # A transação pega a vez de escrever já no BEGIN (evita "database is locked")
+            'transaction_mode': 'IMMEDIATE',
+        },
+        # Conexões persistentes: cada thread reaproveita a sua entre requisições
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 # Se o site encontrar uma variável chamada 'DATABASE_URL' (que a nuvem cria),
@@ -99,6 +115,28 @@ database_url = os.getenv('DATABASE_URL')
 if database_url:
     DATABASES['default'] = dj_database_url.config(default=database_url, conn_max_age=600)
 
+# Réplica só de leitura para os relatórios (academia/replica.py). Sem ela,
+# as views @ler_da_replica leem do 'default' mesmo.
+replica_url = os.getenv('DATABASE_REPLICA_URL')
+if replica_url:
+    DATABASES['replica'] = dj_database_url.parse(replica_url, conn_max_age=600)
+    # Nos testes, a réplica é o próprio banco de teste
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+DATABASE_ROUTERS = ['academia.replica.RoteadorReplica']
+
+# Cache compartilhado entre os processos do servidor (web e worker de
+# tarefas). O padrão do Django é um LocMemCache por processo: a versão que o
+# worker incrementa ao importar a planilha (autocompletar, painel do
+# professor, papéis) nunca chegaria ao processo web. Tudo roda numa máquina
+# só, então uma pasta no disco basta.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    }
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
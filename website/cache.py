@@ -0,0 +1,76 @@
+import time
+from django.conf import settings
+from django.core.cache import cache
+
+# =======================================================
+# CACHE DO SITE PÚBLICO (VERSÕES POR MODELO)
+# Cada modelo mostrado no site tem um número de versão no cache. Os signals
+# aumentam a versão quando algo é salvo/apagado, e a página guardada deixa de
+# bater com as versões atuais. Não é preciso saber quais chaves apagar.
+#
+# Página velha (passou do tempo ou um modelo mudou): uma requisição só refaz
+# e as outras continuam recebendo a versão antiga enquanto isso
+# (stale-while-revalidate). Funciona com qualquer backend de cache do Django
+# (memória local, arquivo, memcached...).
+# =======================================================
+
+PREFIXO = 'site'
+
+# Depois disso a página é refeita mesmo sem mudança (segundos)
+TEMPO_FRESCO = getattr(settings, 'SITE_CACHE_FRESCO', 300)
+# Até quanto tempo uma página velha ainda pode ser servida enquanto é refeita
+TEMPO_MAXIMO = getattr(settings, 'SITE_CACHE_MAXIMO', 60 * 60 * 24)
+# Se quem está refazendo a página cair, outro pode tentar depois disso
+TEMPO_TRAVA = 30
+
+
+def _chave_versao(modelo):
+    return f'{PREFIXO}:versao:{modelo._meta.label_lower}'
+
+
+def versoes(modelos):
+    # Tupla com a versão atual de cada modelo (começa em 1)
+    chaves = [_chave_versao(modelo) for modelo in modelos]
+    encontradas = cache.get_many(chaves)
+    for chave in chaves:
+        if chave not in encontradas:
+            cache.add(chave, 1, timeout=None)
+            encontradas[chave] = cache.get(chave, 1)
+    return tuple(encontradas[chave] for chave in chaves)
+
+
+def nova_versao(modelo):
+    chave = _chave_versao(modelo)
+    try:
+        cache.incr(chave)
+    except ValueError:
+        # Chave ainda não existe (ou o cache foi limpo): começa uma versão nova
+        cache.set(chave, 2, timeout=None)
+
+
+def pagina_em_cache(nome, modelos, gerar, fresco=None, maximo=None):
+    # Devolve o conteúdo guardado em `nome` ou chama gerar() para refazê-lo.
+    fresco = TEMPO_FRESCO if fresco is None else fresco
+    maximo = TEMPO_MAXIMO if maximo is None else maximo
+    chave = f'{PREFIXO}:pagina:{nome}'
+    trava = f'{PREFIXO}:refazendo:{nome}'
+
+    atuais = versoes(modelos)
+    guardado = cache.get(chave)
+    travou = False
+    if guardado:
+        versoes_guardadas, gerado_em, conteudo = guardado
+        if versoes_guardadas == atuais and time.time() - gerado_em < fresco:
+            return conteudo
+        travou = cache.add(trava, 1, timeout=TEMPO_TRAVA)
+        if not travou:
+            # Outra requisição já está refazendo: serve a versão antiga
+            return conteudo
+
+    try:
+        conteudo = gerar()
+        cache.set(chave, (atuais, time.time(), conteudo), timeout=maximo)
+    finally:
+        if travou:
+            cache.delete(trava)
+    return conteudo
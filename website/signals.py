@@ -0,0 +1,20 @@
+from django.db.models.signals import post_save, post_delete
+
+from academia.models import Curso
+from .models import Noticia, Evento
+from . import cache
+
+# =======================================================
+# Qualquer mudança em notícias, eventos ou cursos invalida a home do site
+# =======================================================
+
+MODELOS_DA_HOME = (Noticia, Evento, Curso)
+
+
+def _nova_versao(sender, **kwargs):
+    cache.nova_versao(sender)
+
+
+for _modelo in MODELOS_DA_HOME:
+    post_save.connect(_nova_versao, sender=_modelo, dispatch_uid=f'site_post_save_{_modelo.__name__}')
+    post_delete.connect(_nova_versao, sender=_modelo, dispatch_uid=f'site_post_delete_{_modelo.__name__}')
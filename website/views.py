@@ -1,20 +1,36 @@
+from django.http import HttpResponse
 from django.shortcuts import render
+from django.template.loader import render_to_string
 from .models import Noticia, Evento
+from .cache import pagina_em_cache
+from .signals import MODELOS_DA_HOME
 from academia.models import Curso # Importamos os cursos do outro app!
 
-def index(request):
+def _dados_index():
     # Pega as 3 últimas notícias e eventos
-    noticias = Noticia.objects.order_by('-data_publicacao')[:3]
-    eventos = Evento.objects.order_by('data_evento')[:3]
+    noticias = list(Noticia.objects.order_by('-data_publicacao')[:3])
+    eventos = list(Evento.objects.order_by('data_evento')[:3])
     
-    # Pega todos os cursos para mostrar na vitrine
-    cursos = Curso.objects.all()
+    # Pega todos os cursos para mostrar na vitrine (só o que o card usa)
+    cursos = list(Curso.objects.only('nome', 'descricao', 'imagem'))
 
-    return render(request, 'website/index.html', {
+    return {
         'noticias': noticias,
         'eventos': eventos,
         'cursos': cursos,
-    })
+    }
+
+def index(request):
+    if request.user.is_authenticated:
+        return render(request, 'website/index.html', _dados_index())
+
+    # Visitante anônimo: a página pronta vem do cache, sem consultar o banco
+    # (ver website/cache.py)
+    html = pagina_em_cache(
+        'index', MODELOS_DA_HOME,
+        lambda: render_to_string('website/index.html', _dados_index()),
+    )
+    return HttpResponse(html)
 
 def doacao(request):
-    return render(request, 'website/doacao.html')
\ No newline at end of file
+    return render(request, 'website/doacao.html')